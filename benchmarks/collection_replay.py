@@ -0,0 +1,81 @@
+"""
+Benchmark the tag strategies of the git collector on a synthetic repository, with and without git process costs.
+
+Each strategy is timed running git, then replayed from a trace recorded on the same repository. The replay runs the
+same collection logic without starting a process, so the difference between the two is the cost of git itself.
+
+Usage (from the repository root):
+    PYTHONPATH=src python benchmarks/collection_replay.py [--commits N] [--tags N] [--repeat N]
+"""
+
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from version_builder import utils, version_collector
+
+
+def _git(path: Path, *args: str) -> None:
+    subprocess.check_call(["git", *args], cwd=path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _create_repo(path: Path, *, commits: int, tags: int) -> Path:
+    path.mkdir(parents=True)
+    _git(path, "init")
+    _git(path, "config", "user.email", "bench@example.com")
+    _git(path, "config", "user.name", "Bench")
+    # fast-import creates the history in a single process
+    stream = []
+    for index in range(commits):
+        message = f"commit {index:d}"
+        stream.append(f"commit refs/heads/main\nmark :{index + 1:d}\n")
+        stream.append(f"committer Bench <bench@example.com> {1_600_000_000 + index:d} +0000\n")
+        stream.append(f"data {len(message):d}\n{message:s}\n")
+    # Tags are spread over the first half of the history, so the nearest one is far from HEAD
+    tag_interval = max(commits // 2 // max(tags, 1), 1)
+    stream.extend(f"reset refs/tags/v1.{index:d}.0\nfrom :{index * tag_interval + 1:d}\n" for index in range(tags))
+    subprocess.run(["git", "fast-import", "--quiet"], cwd=path, input="".join(stream).encode(), check=True)
+    _git(path, "checkout", "--quiet", "main")
+    return path
+
+
+def _time_collection(repo: Path, tag_strategy: str, repeat: int, trace: utils.GitTrace | None) -> float:
+    samples = []
+    for _ in range(repeat):
+        backend = utils.ReplayBackend(trace) if trace else None
+        start = time.perf_counter()
+        version_collector.from_git(repo, tag_strategy=tag_strategy, use_describe=False, backend=backend)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--commits", type=int, default=5000, help="number of commits in the history")
+    parser.add_argument("--tags", type=int, default=1000, help="number of SemVer tags")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per strategy; the median is reported")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        repo = _create_repo(Path(root) / "repo", commits=args.commits, tags=args.tags)
+        for tag_strategy in version_collector.TAG_STRATEGIES:
+            recorder = utils.RecordingBackend()
+            version_collector.from_git(repo, tag_strategy=tag_strategy, use_describe=False, backend=recorder)
+            recorder.close()
+            live = _time_collection(repo, tag_strategy, args.repeat, None)
+            replayed = _time_collection(repo, tag_strategy, args.repeat, recorder.trace)
+            results.append((tag_strategy, live, replayed, len(recorder.trace.answers)))
+
+    print(f"{'strategy':<12} {'queries':>8} {'git':>10} {'replayed':>10} {'logic share':>12}")
+    for tag_strategy, live, replayed, queries in results:
+        print(
+            f"{tag_strategy:<12} {queries:>8d} {live * 1000:>8.1f}ms {replayed * 1000:>8.1f}ms {replayed / live:>11.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
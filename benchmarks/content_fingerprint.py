@@ -0,0 +1,57 @@
+"""
+Benchmark the content fingerprint of a synthetic tree of small files.
+
+The tree is fingerprinted once with an empty hash cache, reading every file, and once more with the cache filled by
+the first run, reading none of them.
+
+Usage (from the repository root):
+    PYTHONPATH=src python benchmarks/content_fingerprint.py [--files N] [--files-per-directory N] [--file-size N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from version_builder import fingerprint
+
+
+def _create_tree(path: Path, *, files: int, files_per_directory: int, file_size: int) -> Path:
+    # Files are dated back, as recently modified files are never cached
+    settled = time.time() - 3600
+    for index in range(files):
+        directory = path / f"dir{index // files_per_directory:d}"
+        if index % files_per_directory == 0:
+            directory.mkdir(parents=True)
+        file = directory / f"file{index:d}.c"
+        file.write_bytes(f"{index:d}\n".encode().ljust(file_size, b"x"))
+        os.utime(file, (settled, settled))
+    (path / ".gitignore").write_text("*.o\nbuild/\n")
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=200_000, help="number of files in the tree")
+    parser.add_argument("--files-per-directory", type=int, default=100, help="files in each directory")
+    parser.add_argument("--file-size", type=int, default=4096, help="size of each file in bytes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        tree = _create_tree(
+            Path(root) / "tree",
+            files=args.files,
+            files_per_directory=args.files_per_directory,
+            file_size=args.file_size,
+        )
+        options = fingerprint.FingerprintOptions(tree, cache_path=Path(root) / "cache.txt")
+        for run in ("cold", "warm"):
+            start = time.perf_counter()
+            result = fingerprint.compute_fingerprint(options)
+            elapsed = time.perf_counter() - start
+            print(f"{run:s}: {result.file_count:d} files, {result.hashed_count:d} read in {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
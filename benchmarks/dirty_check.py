@@ -0,0 +1,104 @@
+"""
+Benchmark the dirty detection modes of `utils.Git.get_is_dirty` on a synthetic monorepo.
+
+The repository contains a small component, a large directory of untracked generated assets and a submodule with
+many tracked files. Each mode is timed against the default full working tree scan.
+
+Usage (from the repository root):
+    PYTHONPATH=src python benchmarks/dirty_check.py [--assets N] [--submodule-files N] [--repeat N]
+"""
+
+import argparse
+import statistics
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from version_builder import utils
+
+
+def _git(path: Path, *args: str) -> None:
+    subprocess.check_call(["git", *args], cwd=path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _init_repo(path: Path) -> None:
+    path.mkdir(parents=True)
+    _git(path, "init")
+    _git(path, "config", "user.email", "bench@example.com")
+    _git(path, "config", "user.name", "Bench")
+
+
+def _write_files(directory: Path, count: int, *, per_dir: int = 500) -> None:
+    for index in range(count):
+        subdir = directory / f"d{index // per_dir:04d}"
+        subdir.mkdir(parents=True, exist_ok=True)
+        (subdir / f"f{index:06d}.bin").write_text(str(index))
+
+
+def _create_monorepo(root: Path, *, assets: int, submodule_files: int) -> Path:
+    submodule = root / "third_party"
+    _init_repo(submodule)
+    _write_files(submodule, submodule_files)
+    _git(submodule, "add", ".")
+    _git(submodule, "commit", "-m", "vendor")
+
+    repo = root / "monorepo"
+    _init_repo(repo)
+    _write_files(repo / "component", 200)
+    _git(repo, "add", ".")
+    _git(repo, "-c", "protocol.file.allow=always", "submodule", "add", str(submodule), "third_party")
+    _git(repo, "commit", "-m", "initial")
+
+    # Generated assets are never committed and are not ignored, so every full scan has to visit them
+    _write_files(repo / "assets" / "generated", assets)
+    return repo
+
+
+def _time_dirty_check(repo: Path, options: utils.DirtyCheckOptions, repeat: int) -> float:
+    samples = []
+    with utils.Git(repo) as git:
+        git.get_is_dirty(options)  # warm the filesystem cache
+    for _ in range(repeat):
+        # A new session per run, as a session memoizes its answers
+        start = time.perf_counter()
+        with utils.Git(repo) as git:
+            git.get_is_dirty(options)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--assets", type=int, default=50000, help="number of untracked generated files")
+    parser.add_argument("--submodule-files", type=int, default=20000, help="number of files tracked in the submodule")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per mode; the median is reported")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        repo = _create_monorepo(Path(root), assets=args.assets, submodule_files=args.submodule_files)
+        modes = [
+            ("full working tree (default)", utils.DirtyCheckOptions()),
+            ("pathspec: component", utils.DirtyCheckOptions(pathspecs=("component",))),
+            ("no untracked files", utils.DirtyCheckOptions(include_untracked=False)),
+            ("no submodules", utils.DirtyCheckOptions(include_submodules=False)),
+            (
+                "no untracked files, no submodules",
+                utils.DirtyCheckOptions(include_untracked=False, include_submodules=False),
+            ),
+        ]
+        results = [(name, _time_dirty_check(repo, options, args.repeat)) for name, options in modes]
+
+        # The untracked cache is only consulted by `git status`, which the check switches to once it is enabled
+        _git(repo, "config", "core.untrackedCache", "true")
+        _git(repo, "update-index", "--untracked-cache")
+        results.append(("core.untrackedCache=true", _time_dirty_check(repo, utils.DirtyCheckOptions(), args.repeat)))
+
+    baseline = results[0][1]
+    print(f"{'mode':<36} {'median':>10} {'speedup':>8}")
+    for name, seconds in results:
+        print(f"{name:<36} {seconds * 1000:>8.1f}ms {baseline / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Benchmark the version history of a synthetic repository with merged topic branches.
+
+The history alternates commits on main with topic branches of a few commits that are merged back, and is tagged at
+regular intervals. The versions of all commits are collected in a single walk.
+
+Usage (from the repository root):
+    PYTHONPATH=src python benchmarks/version_history.py [--commits N] [--tags N] [--topic-length N]
+"""
+
+import argparse
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+from version_builder import utils, version_collector
+
+
+def _git(path: Path, *args: str) -> None:
+    subprocess.check_call(["git", *args], cwd=path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def _create_repo(path: Path, *, commits: int, tags: int, topic_length: int) -> Path:
+    path.mkdir(parents=True)
+    _git(path, "init")
+    # fast-import creates the history in a single process. In every cycle a topic branch forks off main and is merged
+    # back after main gained a commit of its own.
+    stream = []
+    cycle = topic_length + 3
+    main_mark = topic_mark = 0
+    for mark in range(1, commits + 1):
+        position = (mark - 1) % cycle
+        if position in {0, topic_length + 1}:
+            branch, parents = "main", [main_mark]
+        elif position == topic_length + 2:
+            branch, parents = "main", [main_mark, topic_mark]
+        else:
+            branch, parents = "topic", [topic_mark if position > 1 else main_mark]
+        message = f"commit {mark:d}"
+        stream.append(f"commit refs/heads/{branch:s}\nmark :{mark:d}\n")
+        stream.append(f"committer Bench <bench@example.com> {1_600_000_000 + mark:d} +0000\n")
+        stream.append(f"data {len(message):d}\n{message:s}\n")
+        parents = [parent for parent in parents if parent]
+        stream.extend(f"{'from' if index == 0 else 'merge'} :{parent:d}\n" for index, parent in enumerate(parents))
+        if branch == "main":
+            main_mark = mark
+        else:
+            topic_mark = mark
+    tag_interval = max(commits // max(tags, 1), 1)
+    stream.extend(f"reset refs/tags/v1.{index:d}.0\nfrom :{index * tag_interval + 1:d}\n" for index in range(tags))
+    subprocess.run(["git", "fast-import", "--quiet"], cwd=path, input="".join(stream).encode(), check=True)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--commits", type=int, default=100_000, help="number of commits in the history")
+    parser.add_argument("--tags", type=int, default=500, help="number of SemVer tags")
+    parser.add_argument("--topic-length", type=int, default=3, help="commits on each merged topic branch")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        repo = _create_repo(Path(root) / "repo", commits=args.commits, tags=args.tags, topic_length=args.topic_length)
+        stats = utils.GitCallStats()
+        start = time.perf_counter()
+        versions = sum(1 for _ in version_collector.history_from_git(repo, "main", stats=stats))
+        elapsed = time.perf_counter() - start
+
+    print(f"{versions:d} versions in {elapsed:.2f}s ({elapsed / versions * 1e6:.1f}us per commit)")
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
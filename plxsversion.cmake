@@ -4,8 +4,10 @@ find_package(Python COMPONENTS Interpreter REQUIRED)
 
 macro(_set_relative_out_file_path LANG CUSTOM_PATH)
   set(REL_OUT_PATH "plxs/${CUSTOM_PATH}/version.hpp")
-  if(${LANG} STREQUAL "c")
+  if(${LANG} STREQUAL "c" OR ${LANG} STREQUAL "stamp")
     set(REL_OUT_PATH "plxs/${CUSTOM_PATH}/version.h")
+  elseif(${LANG} STREQUAL "cpp20-module")
+    set(REL_OUT_PATH "plxs/${CUSTOM_PATH}/version.cppm")
   endif()
 endmacro(_set_relative_out_file_path)
 
@@ -45,9 +47,9 @@ endfunction(_set_version_cmake_variable)
 function(plxsversion_create_target)
   cmake_parse_arguments(
     VER
-    "PRINT;TIME"
-    "LANG;SOURCE;INPUT;TARGET_SUFFIX;NAMESPACE;INCLUDE_PREFIX"
-    ""
+    "PRINT;TIME;IGNORE_UNTRACKED;IGNORE_SUBMODULES"
+    "LANG;SOURCE;INPUT;TARGET_SUFFIX;NAMESPACE;INCLUDE_PREFIX;TAG_STRATEGY"
+    "DIRTY_PATHS"
     ${ARGN}
   )
 
@@ -65,6 +67,22 @@ function(plxsversion_create_target)
     
   endif()
 
+  if(VER_TAG_STRATEGY)
+    list(APPEND OPTIONS "--tag-strategy" ${VER_TAG_STRATEGY})
+  endif()
+
+  foreach(DIRTY_PATH ${VER_DIRTY_PATHS})
+    list(APPEND OPTIONS "--dirty-path" ${DIRTY_PATH})
+  endforeach()
+
+  if(VER_IGNORE_UNTRACKED)
+    list(APPEND OPTIONS "--no-dirty-untracked")
+  endif()
+
+  if(VER_IGNORE_SUBMODULES)
+    list(APPEND OPTIONS "--no-dirty-submodules")
+  endif()
+
   if(NOT VER_INCLUDE_PREFIX)
     set(VER_INCLUDE_PREFIX "plxsversion")
   endif()
@@ -73,6 +91,10 @@ function(plxsversion_create_target)
     set(VER_LANG cpp)
   endif()
 
+  if(VER_LANG STREQUAL "cpp20-module" AND CMAKE_VERSION VERSION_LESS 3.28)
+    message(FATAL_ERROR "Error configuring plxsversion tool. LANG cpp20-module requires CMake 3.28 or newer.")
+  endif()
+
   if(NOT VER_SOURCE AND VER_INPUT)
     message(FATAL_ERROR "Error configuring plxsversion tool. Provided INPUT but no SOURCE.")
   endif()
@@ -85,7 +107,11 @@ function(plxsversion_create_target)
     set(VER_SOURCE git)
   endif()
 
-  if(NOT VER_INPUT)
+  if(NOT VER_INPUT AND VER_SOURCE STREQUAL "env")
+    set(VER_INPUT auto)
+  elseif(NOT VER_INPUT AND VER_SOURCE STREQUAL "archive")
+    set(VER_INPUT ${CMAKE_CURRENT_SOURCE_DIR}/.git_archival.txt)
+  elseif(NOT VER_INPUT)
     set(VER_INPUT ${CMAKE_CURRENT_SOURCE_DIR})
   endif()
 
@@ -100,11 +126,50 @@ function(plxsversion_create_target)
 
   _create_version_file(${VER_LANG} ${VER_SOURCE} ${VER_INPUT} ${OUT_FILE} ADDITIONAL_OPTIONS ${OPTIONS})
 
-  add_library(${VERSION_LIBRARY} INTERFACE)
-  target_include_directories(${VERSION_LIBRARY}
-    INTERFACE
-      $<INSTALL_INTERFACE:${CMAKE_INSTALL_INCLUDEDIR}/plxs>
-      $<BUILD_INTERFACE:${CMAKE_CURRENT_BINARY_DIR}/plxs>)
+  if(VER_LANG STREQUAL "stamp")
+    # The placeholder record is defined by a single source file, compiled with whichever language is enabled
+    get_property(ENABLED_LANGUAGES GLOBAL PROPERTY ENABLED_LANGUAGES)
+    set(RECORD_FILE "${OUT_FILE}.c")
+    if(NOT "C" IN_LIST ENABLED_LANGUAGES)
+      set(RECORD_FILE "${OUT_FILE}.cpp")
+    endif()
+    file(WRITE "${RECORD_FILE}" "#define PLXSVERSION_DEFINE_RECORD\n#include \"${OUT_FILE}\"\n")
+
+    add_library(${VERSION_LIBRARY} STATIC "${RECORD_FILE}")
+    target_include_directories(${VERSION_LIBRARY}
+      PUBLIC
+        $<INSTALL_INTERFACE:${CMAKE_INSTALL_INCLUDEDIR}/plxs>
+        $<BUILD_INTERFACE:${CMAKE_CURRENT_BINARY_DIR}/plxs>)
+
+    # Everything needed to collect the version again when stamping a binary, see plxsversion_stamp
+    set(STAMP_ARGUMENTS --source ${VER_SOURCE} --input ${VER_INPUT} ${OPTIONS})
+    list(REMOVE_ITEM STAMP_ARGUMENTS "--print")
+    set_property(TARGET ${VERSION_LIBRARY} PROPERTY PLXSVERSION_STAMP_ARGUMENTS "${STAMP_ARGUMENTS}")
+    set_property(TARGET ${VERSION_LIBRARY} APPEND PROPERTY ADDITIONAL_CLEAN_FILES "${OUT_FILE}" "${RECORD_FILE}")
+
+    # The placeholder holds no version, so there are no version variables to set
+    message(STATUS "${VERSION_LIBRARY} created.")
+    return()
+  endif()
+
+  if(VER_LANG STREQUAL "cpp20-module")
+    # The module interface is compiled once, and targets linking the library import it instead of parsing a header.
+    # The module is always named plxsversion; NAMESPACE only selects the namespace its constants are exported in.
+    add_library(${VERSION_LIBRARY} STATIC)
+    target_sources(${VERSION_LIBRARY}
+      PUBLIC
+        FILE_SET CXX_MODULES
+        BASE_DIRS "${CMAKE_CURRENT_BINARY_DIR}/plxs"
+        FILES "${OUT_FILE}")
+    target_compile_features(${VERSION_LIBRARY} PUBLIC cxx_std_20)
+    set_property(TARGET ${VERSION_LIBRARY} PROPERTY CXX_SCAN_FOR_MODULES ON)
+  else()
+    add_library(${VERSION_LIBRARY} INTERFACE)
+    target_include_directories(${VERSION_LIBRARY}
+      INTERFACE
+        $<INSTALL_INTERFACE:${CMAKE_INSTALL_INCLUDEDIR}/plxs>
+        $<BUILD_INTERFACE:${CMAKE_CURRENT_BINARY_DIR}/plxs>)
+  endif()
 
   set_property(TARGET ${VERSION_LIBRARY} APPEND PROPERTY ADDITIONAL_CLEAN_FILES "${OUT_FILE}")
 
@@ -123,4 +188,44 @@ function(plxsversion_create_target)
   endif()
 
   message(STATUS "${VERSION_LIBRARY} created.")
-endfunction(plxsversion_create_target)
\ No newline at end of file
+endfunction(plxsversion_create_target)
+
+# This function should be called for every executable linking a version library created with LANG stamp. The version
+# is written into the linked binary after every link and on every build, so a new version costs a file patch instead
+# of compiling and linking.
+function(plxsversion_stamp)
+  cmake_parse_arguments(
+    STAMP
+    ""
+    "TARGET;VERSION_TARGET"
+    ""
+    ${ARGN}
+  )
+
+  if(NOT STAMP_TARGET)
+    message(FATAL_ERROR "Error configuring plxsversion stamping. No TARGET provided.")
+  endif()
+
+  if(NOT STAMP_VERSION_TARGET)
+    set(STAMP_VERSION_TARGET plxsversion)
+  endif()
+
+  get_target_property(STAMP_ARGUMENTS ${STAMP_VERSION_TARGET} PLXSVERSION_STAMP_ARGUMENTS)
+  if(NOT STAMP_ARGUMENTS)
+    message(FATAL_ERROR "Error configuring plxsversion stamping. ${STAMP_VERSION_TARGET} was not created with LANG stamp.")
+  endif()
+
+  set(STAMP_COMMAND
+    ${CMAKE_COMMAND} -E env "PYTHONPATH=${DIR_OF_PLXSVERSION}/src"
+    ${Python_EXECUTABLE} -m version_builder stamp ${STAMP_ARGUMENTS} $<TARGET_FILE:${STAMP_TARGET}>)
+
+  # Stamp right after linking, so the binary never carries the placeholder
+  add_custom_command(TARGET ${STAMP_TARGET} POST_BUILD COMMAND ${STAMP_COMMAND} VERBATIM)
+
+  # Stamp on every build, as the version may change without the binary being linked again
+  add_custom_target(${STAMP_TARGET}-plxsversion-stamp ALL
+    COMMAND ${STAMP_COMMAND}
+    COMMENT "Stamping version into ${STAMP_TARGET}"
+    VERBATIM)
+  add_dependencies(${STAMP_TARGET}-plxsversion-stamp ${STAMP_TARGET})
+endfunction(plxsversion_stamp)
@@ -1,9 +1,18 @@
+use std::collections::hash_map::DefaultHasher;
 use std::env;
-use std::path::PathBuf;
+use std::ffi::OsStr;
+use std::fs::{self, File};
+use std::hash::{Hash, Hasher};
+use std::path::{Path, PathBuf};
 use std::process::Command;
 
 /// Generates a rust file containing version information.
 ///
+/// All crates of a workspace that call this from their build script share one collection of the version: the first
+/// build script resolves it into a cache in the target directory and the others render from that cache. The cache is
+/// keyed by the state of the repository, so a commit, a checkout, a new tag or a change to the working tree is
+/// picked up by the next build.
+///
 /// # Arguments
 ///
 /// * `print_output` - Print version file contents to build log.
@@ -13,58 +22,258 @@ pub fn generate_version(print_output: bool, include_time: bool) {
     let generated_file = out_dir.join("version.rs");
     // The path to the folder containing the python module
     let src_dir = PathBuf::from(env!("CARGO_MANIFEST_DIR")).join("src");
+    // env::var syntax gets calling crate's location
+    let manifest_dir = PathBuf::from(env::var("CARGO_MANIFEST_DIR").unwrap());
+    let cargo_version = env::var("CARGO_PKG_VERSION").unwrap();
+
+    let builder = VersionBuilder {
+        src_dir: src_dir.clone(),
+    };
+
+    // A frozen version record provided by a parent build is already shared, so it is used directly
+    let repository = match env::var_os("PLXSVERSION_RESOLVED") {
+        Some(_) => None,
+        None => repository_state(&manifest_dir),
+    };
+
+    match repository {
+        Some((repo_dir, state_key)) => {
+            let cache = SharedCache::new(&out_dir, repo_dir, state_key);
+            cache.generate(&builder, &cargo_version, include_time, &generated_file);
+            if print_output {
+                print!("{}", fs::read_to_string(&generated_file).unwrap());
+            }
+        }
+        None => {
+            let mut args: Vec<&OsStr> = vec![
+                "--lang".as_ref(),
+                "rust".as_ref(),
+                "--source".as_ref(),
+                "git".as_ref(),
+                "--input".as_ref(),
+                manifest_dir.as_os_str(),
+                "--cargo".as_ref(),
+                cargo_version.as_ref(),
+            ];
+            if print_output {
+                args.push("--print".as_ref());
+            }
+            if include_time {
+                args.push("--time".as_ref());
+            }
+            // output file is last arg
+            args.push(generated_file.as_os_str());
+            builder.run(&args);
+        }
+    }
+
+    // Re-run if the environment changes
+    println!("cargo:rerun-if-env-changed=CARGO_FEATURE_PRINT_OUTPUT");
+    println!("cargo:rerun-if-env-changed=CARGO_FEATURE_INCLUDE_TIME");
+    println!("cargo:rerun-if-env-changed=PLXSVERSION_RESOLVED");
+
+    // Re-run if a frozen version record provided by a parent build changes
+    if let Ok(resolved_record) = env::var("PLXSVERSION_RESOLVED") {
+        println!("cargo:rerun-if-changed={}", resolved_record);
+    }
+
+    // Re-run if python module is modified
+    println!("cargo:rerun-if-changed={}", src_dir.display());
+
+    // Re-build calling crate if output file changes
+    println!("cargo:rerun-if-changed={}", generated_file.display());
+}
 
-    // Find the system Python
+/// Finds the system Python.
+fn find_python() -> &'static str {
     // We try 'python3' first (standard for Unix), then 'python' (common for Windows)
-    let python_exec = if Command::new("python3").arg("--version").status().is_ok() {
+    if Command::new("python3").arg("--version").status().is_ok() {
         "python3"
     } else if Command::new("python").arg("--version").status().is_ok() {
         "python"
     } else {
         panic!("Python was not found on the system path. Please install Python 3.");
-    };
-
-    // Configure command
-    let mut binding = Command::new(python_exec);
-    let cmd = binding
-        .env("PYTHONPATH", &src_dir)
-        .arg("-m")
-        .arg("version_builder")
-        .arg("--lang")
-        .arg("rust")
-        .arg("--source")
-        .arg("git")
-        .arg("--input")
-        // env::var syntax gets calling crate's location
-        .arg(PathBuf::from(env::var("CARGO_MANIFEST_DIR").unwrap()))
-        .arg("--cargo")
-        .arg(PathBuf::from(env::var("CARGO_PKG_VERSION").unwrap()));
-
-    if print_output {
-        cmd.arg("--print");
     }
+}
+
+/// Runs the python module of this crate. Python is only looked for when it is needed, as build scripts served from
+/// the shared cache do not run it.
+struct VersionBuilder {
+    src_dir: PathBuf,
+}
+
+impl VersionBuilder {
+    fn run(&self, args: &[&OsStr]) {
+        let status = Command::new(find_python())
+            .env("PYTHONPATH", &self.src_dir)
+            .arg("-m")
+            .arg("version_builder")
+            .args(args)
+            .status()
+            .expect("Failed to execute python script");
 
-    if include_time {
-        cmd.arg("--time");
+        if !status.success() {
+            panic!("Python script failed with a non-zero exit code.");
+        }
     }
+}
+
+/// Returns the root of the repository containing a crate and a key identifying everything its version is derived
+/// from, or None outside of a git repository.
+///
+/// The key covers the checked out commit and branch, the tags and the changes in the working tree. These git queries
+/// are much cheaper than collecting the version, so every build script can afford them.
+fn repository_state(manifest_dir: &Path) -> Option<(PathBuf, String)> {
+    let git = |dir: &Path, args: &[&str]| -> Option<Vec<u8>> {
+        let output = Command::new("git")
+            .current_dir(dir)
+            .args(args)
+            .output()
+            .ok()?;
+        output.status.success().then_some(output.stdout)
+    };
 
-    // output file is last arg
-    cmd.arg(&generated_file);
+    let head = git(manifest_dir, &["rev-parse", "--show-toplevel", "HEAD"])?;
+    let repo_dir = PathBuf::from(String::from_utf8_lossy(&head).lines().next()?);
+    // Paths in porcelain output are relative to the repository root, so the key does not depend on the crate
+    let status = git(
+        &repo_dir,
+        &[
+            "status",
+            "--porcelain",
+            "--branch",
+            "--untracked-files=normal",
+        ],
+    )?;
+    let tags = git(
+        &repo_dir,
+        &[
+            "for-each-ref",
+            "--format=%(refname) %(objectname)",
+            "refs/tags",
+        ],
+    )?;
 
-    // Execute the script
-    let status = cmd.status().expect("Failed to execute python script");
+    let mut hasher = DefaultHasher::new();
+    (head, status, tags).hash(&mut hasher);
+    Some((repo_dir, format!("{:016x}", hasher.finish())))
+}
+
+/// Version information shared by all build scripts of a workspace, stored next to the build directories of a profile.
+///
+/// The cache holds a frozen version record per repository state and the version files rendered from it. The record
+/// is collected at the root of the repository, so every crate sees the same dirty state. All access
+/// happens while holding an exclusive lock on the cache, so a single build script collects the version while the
+/// others wait for it. Entries of previous repository states are removed when a new state is recorded.
+struct SharedCache {
+    dir: PathBuf,
+    repo_dir: PathBuf,
+    state_key: String,
+}
 
-    if !status.success() {
-        panic!("Python script failed with a non-zero exit code.");
+impl SharedCache {
+    fn new(out_dir: &Path, repo_dir: PathBuf, state_key: String) -> Self {
+        // OUT_DIR is <target>/[<triple>/]<profile>/build/<crate>-<hash>/out
+        let profile_dir = out_dir.ancestors().nth(3).unwrap_or(out_dir);
+        SharedCache {
+            dir: profile_dir.join("plxsversion"),
+            repo_dir,
+            state_key,
+        }
     }
 
-    // Re-run if the environment changes
-    println!("cargo:rerun-if-env-changed=CARGO_FEATURE_PRINT_OUTPUT");
-    println!("cargo:rerun-if-env-changed=CARGO_FEATURE_INCLUDE_TIME");
+    fn generate(
+        &self,
+        builder: &VersionBuilder,
+        cargo_version: &str,
+        include_time: bool,
+        generated_file: &Path,
+    ) {
+        fs::create_dir_all(&self.dir).expect("Failed to create the plxsversion cache directory");
+        let lock = File::create(self.dir.join("lock"))
+            .expect("Failed to create the plxsversion cache lock");
+        // The lock is released when the file is dropped, also if the build script panics
+        lock.lock().expect("Failed to lock the plxsversion cache");
 
-    // Re-run if python module is modified
-    println!("cargo:rerun-if-changed={}", src_dir.display());
+        let record = self.dir.join(format!("{}.json", self.state_key));
+        if !record.exists() {
+            self.remove_stale_entries();
+            let partial_record = self.dir.join(format!("{}-partial.json", self.state_key));
+            builder.run(&[
+                "freeze".as_ref(),
+                "--source".as_ref(),
+                "git".as_ref(),
+                "--input".as_ref(),
+                self.repo_dir.as_os_str(),
+                partial_record.as_os_str(),
+            ]);
+            fs::rename(&partial_record, &record).expect("Failed to store the version record");
+        }
 
-    // Re-build calling crate if output file changes
-    println!("cargo:rerun-if-changed={}", generated_file.display());
+        if include_time {
+            // The time is that of the build of this crate, so the rendered file cannot be shared
+            Self::render(
+                builder,
+                &record,
+                cargo_version,
+                include_time,
+                generated_file,
+            );
+            return;
+        }
+
+        // Crates of a workspace usually share their version, in which case they also share the rendered file
+        let mut hasher = DefaultHasher::new();
+        cargo_version.hash(&mut hasher);
+        let rendered = self
+            .dir
+            .join(format!("{}-{:016x}.rs", self.state_key, hasher.finish()));
+        if !rendered.exists() {
+            let partial_rendered = self.dir.join(format!("{}-partial.rs", self.state_key));
+            Self::render(builder, &record, cargo_version, false, &partial_rendered);
+            fs::rename(&partial_rendered, &rendered)
+                .expect("Failed to store the rendered version file");
+        }
+
+        // An unchanged file is left alone, so crates including it are not rebuilt
+        let contents = fs::read(&rendered).expect("Failed to read the rendered version file");
+        if fs::read(generated_file).ok().as_ref() != Some(&contents) {
+            fs::write(generated_file, contents).expect("Failed to write the version file");
+        }
+    }
+
+    fn render(
+        builder: &VersionBuilder,
+        record: &Path,
+        cargo_version: &str,
+        include_time: bool,
+        output: &Path,
+    ) {
+        let mut args: Vec<&OsStr> = vec![
+            "--lang".as_ref(),
+            "rust".as_ref(),
+            "--source".as_ref(),
+            "frozen".as_ref(),
+            "--input".as_ref(),
+            record.as_os_str(),
+            "--cargo".as_ref(),
+            cargo_version.as_ref(),
+        ];
+        if include_time {
+            args.push("--time".as_ref());
+        }
+        args.push(output.as_os_str());
+        builder.run(&args);
+    }
+
+    fn remove_stale_entries(&self) {
+        for entry in fs::read_dir(&self.dir).into_iter().flatten().flatten() {
+            let name = entry.file_name();
+            let name = name.to_string_lossy();
+            if name != "lock" && !name.starts_with(&self.state_key) {
+                // Another state may be recorded again later, so failing to remove an entry is harmless
+                let _ = fs::remove_file(entry.path());
+            }
+        }
+    }
 }
@@ -0,0 +1,114 @@
+import runpy
+import tarfile
+from pathlib import Path
+
+import pytest
+
+from tests.utils import GitDir
+from version_builder import build_meta
+from version_builder.version_collector import VersionCollectError
+
+# A PEP 517 backend offering the mandatory hooks only, which reports the version module it finds
+_FAKE_BACKEND = """
+from pathlib import Path
+
+
+def build_wheel(wheel_directory, config_settings=None, metadata_directory=None):
+    return Path("pkg/_version.py").read_text()
+
+
+def build_sdist(sdist_directory, config_settings=None):
+    return "sdist"
+"""
+
+
+def _create_project(path: Path, configuration: str, *, backend: str = "fake_backend") -> Path:
+    (path / "pkg").mkdir()
+    (path / "pkg" / "__init__.py").write_text("")
+    (path / ".gitignore").write_text("pkg/_version.py\n")
+    (path / f"{backend:s}.py").write_text(_FAKE_BACKEND)
+    (path / "pyproject.toml").write_text(f'[tool.plxsversion]\nbackend = "{backend:s}"\n{configuration:s}')
+    return path
+
+
+@pytest.fixture
+def project(tmp_path: Path, monkeypatch) -> Path:
+    # Each test needs its own backend module, as modules are imported once per process
+    backend = f"fake_backend_{tmp_path.name:s}"
+    _create_project(tmp_path, 'version-file = "pkg/_version.py"\n', backend=backend)
+    git_dir = GitDir(tmp_path)
+    git_dir.commit()
+    git_dir.tag("v1.4.0")
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    return tmp_path
+
+
+class TestBuildBackend:
+    def test_version_module_is_written_before_hooks(self, project: Path) -> None:
+        version_module = build_meta.build_wheel(str(project / "dist"))
+        assert "VERSION = '1.4.0+sha." in version_module
+        version = runpy.run_path(str(project / "pkg" / "_version.py"))
+        assert version["__version__"].startswith("1.4.0+sha.")
+        assert not version["DIRTY_BUILD"]
+        assert build_meta.build_sdist(str(project / "dist")) == "sdist"
+
+    def test_optional_hooks_follow_the_backend(self, project: Path) -> None:  # noqa: ARG002 - changes directory
+        assert hasattr(build_meta, "build_wheel")
+        assert not hasattr(build_meta, "build_editable")
+        assert not hasattr(build_meta, "prepare_metadata_for_build_wheel")
+        assert not hasattr(build_meta, "not_a_hook")
+
+    def test_version_module_is_kept_without_repository(self, tmp_path: Path, capsys) -> None:
+        project = _create_project(tmp_path, 'version-file = "pkg/_version.py"\n')
+        (project / "pkg" / "_version.py").write_text("__version__ = '1.0.0'\n")
+        build_meta.write_version_file(build_meta.BuildConfiguration.load(project))
+        assert (project / "pkg" / "_version.py").read_text() == "__version__ = '1.0.0'\n"
+        assert "Keeping" in capsys.readouterr().out
+
+        (project / "pkg" / "_version.py").unlink()
+        with pytest.raises(VersionCollectError):
+            build_meta.write_version_file(build_meta.BuildConfiguration.load(project))
+
+
+class TestBuildConfiguration:
+    def test_load(self, tmp_path: Path) -> None:
+        project = _create_project(
+            tmp_path, 'version-file = "pkg/_version.py"\ntag-strategy = "highest"\ndescribe = false\ntime = true\n'
+        )
+        configuration = build_meta.BuildConfiguration.load(project)
+        assert configuration.version_file == str(project / "pkg" / "_version.py")
+        assert configuration.source_input == str(project)
+        assert configuration.backend == "fake_backend"
+        assert configuration.tag_strategy == "highest"
+        assert not configuration.use_describe
+        assert configuration.include_time
+
+    def test_missing_version_file(self, tmp_path: Path) -> None:
+        project = _create_project(tmp_path, "")
+        with pytest.raises(ValueError, match="does not name a version-file"):
+            build_meta.BuildConfiguration.load(project)
+
+    def test_unknown_option(self, tmp_path: Path) -> None:
+        project = _create_project(tmp_path, 'version-file = "pkg/_version.py"\nversion_file = "typo"\n')
+        with pytest.raises(ValueError, match=r"Unknown \[tool\.plxsversion\] option: version_file"):
+            build_meta.BuildConfiguration.load(project)
+
+
+class TestSetuptoolsBuild:
+    def test_sdist_contains_version_module(self, tmp_path: Path, monkeypatch) -> None:
+        project = _create_project(tmp_path, 'version-file = "pkg/_version.py"\n')
+        (project / "pyproject.toml").write_text(
+            '[project]\nname = "pkg"\nversion = "1.4.0"\n\n'
+            '[tool.setuptools]\npackages = ["pkg"]\n\n'
+            '[tool.plxsversion]\nversion-file = "pkg/_version.py"\n'
+        )
+        git_dir = GitDir(project)
+        git_dir.commit()
+        git_dir.tag("v1.4.0")
+        monkeypatch.chdir(project)
+
+        sdist_name = build_meta.build_sdist(str(tmp_path / "dist"))
+        with tarfile.open(tmp_path / "dist" / sdist_name) as sdist:
+            version_module = sdist.extractfile("pkg-1.4.0/pkg/_version.py").read().decode()
+        assert "TAG = '1.4.0'" in version_module
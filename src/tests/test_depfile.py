@@ -0,0 +1,83 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from tests.utils import GitDir
+from version_builder import depfile
+
+
+@pytest.fixture
+def git_dir(tmp_path: Path) -> GitDir:
+    git_dir = GitDir(tmp_path)
+    git_dir.create_branch("main")
+    (tmp_path / "main.c").write_text("int main() {}")
+    git_dir.commit()
+    git_dir.tag("v1.0.0")
+    git_dir.tag("release/v0.9.0")
+    return git_dir
+
+
+class TestGitDependencies:
+    def test_loose_refs(self, git_dir: GitDir) -> None:
+        git = git_dir.path / ".git"
+        assert depfile.git_dependencies(git_dir.path, tag="1.0.0") == [
+            git / "HEAD",
+            git / "refs" / "heads" / "main",
+            git / "refs",
+            git / "refs" / "heads",
+            git / "refs" / "tags" / "v1.0.0",
+            git / "refs" / "tags",
+            git / "refs" / "tags" / "release",
+            git / "index",
+        ]
+
+    def test_packed_refs(self, git_dir: GitDir) -> None:
+        subprocess.check_call(["git", "pack-refs", "--all"], cwd=git_dir.path)
+        git = git_dir.path / ".git"
+        assert depfile.git_dependencies(git_dir.path, tag="1.0.0", include_index=False) == [
+            git / "HEAD",
+            git / "refs",
+            git / "refs" / "heads",
+            git / "packed-refs",
+            git / "refs" / "tags",
+        ]
+
+    def test_packed_branch(self, git_dir: GitDir) -> None:
+        git_dir.create_branch("feature/packed")
+        subprocess.check_call(["git", "pack-refs", "--all"], cwd=git_dir.path)
+        git = git_dir.path / ".git"
+        dependencies = depfile.git_dependencies(git_dir.path, include_tags=False, include_index=False)
+        assert dependencies == [git / "HEAD", git / "refs", git / "refs" / "heads", git / "packed-refs"]
+        # Updating the packed branch creates its loose file below a listed directory
+        git_dir.commit()
+        assert (git / "refs" / "heads" / "feature" / "packed").exists()
+        assert depfile.git_dependencies(git_dir.path, include_tags=False, include_index=False) == [
+            git / "HEAD",
+            git / "refs" / "heads" / "feature" / "packed",
+            git / "refs",
+            git / "refs" / "heads",
+            git / "refs" / "heads" / "feature",
+            git / "packed-refs",
+        ]
+
+    def test_revision(self, git_dir: GitDir) -> None:
+        git = git_dir.path / ".git"
+        assert depfile.git_dependencies(git_dir.path, revision="v1.0.0", include_tags=False, include_index=False) == [
+            git / "refs" / "tags" / "v1.0.0",
+            git / "refs",
+            git / "refs" / "tags",
+        ]
+        # A detached HEAD depends on no branch
+        git_dir.checkout("v1.0.0")
+        assert depfile.git_dependencies(git_dir.path, include_tags=False, include_index=False) == [git / "HEAD"]
+
+
+class TestFormatDepfile:
+    def test_format(self) -> None:
+        assert depfile.format_depfile("version.h", ["/repo/.git/HEAD", "/my repo/#1/$x"]) == (
+            "version.h: \\\n  /repo/.git/HEAD \\\n  /my\\ repo/\\#1/$$x\n\n/repo/.git/HEAD:\n\n/my\\ repo/\\#1/$$x:\n"
+        )
+
+    def test_no_dependencies(self) -> None:
+        assert depfile.format_depfile("version.h", []) == "version.h:\n"
@@ -0,0 +1,136 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+from tests.utils import GitDir
+from version_builder import doctor, utils
+
+
+def _git(git_dir: GitDir, *args: str) -> None:
+    subprocess.check_call(["git", *args], cwd=git_dir.path, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def git_dir(tmp_path: Path) -> GitDir:
+    git_dir = GitDir(tmp_path)
+    (tmp_path / "main.c").write_text("int main() {}")
+    git_dir.commit(date="1700000000 +0000")
+    git_dir.tag("v1.0.0")
+    git_dir.commit(date="1700000001 +0000")
+    git_dir.tag("v1.1.0")
+    git_dir.commit()
+    return git_dir
+
+
+class TestRepositoryFacts:
+    def test_facts(self, git_dir: GitDir) -> None:
+        with utils.Git(git_dir.path) as git:
+            facts = doctor.RepositoryFacts(git)
+        assert facts.commit_count == 3
+        assert facts.tag_count == 2
+        assert facts.loose_tag_count == 2
+        assert facts.packed_ref_count == 0
+        assert facts.tracked_file_count == 1
+        assert facts.submodule_count == 0
+        assert not facts.is_shallow
+        assert not facts.has_commit_graph
+        assert not facts.has_untracked_cache
+
+    def test_maintained_repository(self, git_dir: GitDir) -> None:
+        _git(git_dir, "pack-refs", "--all")
+        _git(git_dir, "commit-graph", "write", "--reachable")
+        _git(git_dir, "config", "core.untrackedCache", "true")
+        with utils.Git(git_dir.path) as git:
+            facts = doctor.RepositoryFacts(git)
+        assert facts.loose_tag_count == 0
+        assert facts.packed_ref_count == 3
+        assert facts.has_commit_graph
+        assert facts.has_untracked_cache
+
+    @pytest.mark.parametrize(
+        ("value", "expected"), [("yes", True), ("1", True), ("off", False), ("0", False), ("keep", False)]
+    )
+    def test_untracked_cache_setting(self, git_dir: GitDir, value: str, expected: bool) -> None:  # noqa: FBT001
+        _git(git_dir, "config", "core.untrackedCache", value)
+        with utils.Git(git_dir.path) as git:
+            assert doctor.RepositoryFacts(git).has_untracked_cache == expected
+
+    def test_untracked_cache_kept_in_index(self, git_dir: GitDir) -> None:
+        # Without the setting, git keeps the cache the index has
+        _git(git_dir, "update-index", "--untracked-cache")
+        _git(git_dir, "status")
+        with utils.Git(git_dir.path) as git:
+            assert doctor.RepositoryFacts(git).has_untracked_cache
+
+    def test_fsmonitor_setting(self, git_dir: GitDir) -> None:
+        _git(git_dir, "config", "core.fsmonitor", "off")
+        with utils.Git(git_dir.path) as git:
+            assert not doctor.RepositoryFacts(git).has_fsmonitor
+        _git(git_dir, "config", "core.fsmonitor", ".git/hooks/query-watchman")
+        with utils.Git(git_dir.path) as git:
+            assert doctor.RepositoryFacts(git).has_fsmonitor
+
+
+class TestDiagnosis:
+    def test_measurements(self, git_dir: GitDir) -> None:
+        diagnosis = doctor.Diagnosis(git_dir.path)
+        assert set(diagnosis.cold.stage_seconds) == {"head", "tag", "dirty"}
+        assert set(diagnosis.warm.stage_seconds) == {"head", "tag", "dirty"}
+        assert (diagnosis.cold.tag, diagnosis.cold.commits_since_tag) == ("1.1.0", 1)
+        # Other strategies are only collected up to the tag stage
+        assert [measurement.label for measurement in diagnosis.strategies] == [
+            "creatordate without describe",
+            "highest",
+            "nearest",
+        ]
+        assert all("dirty" not in measurement.stage_seconds for measurement in diagnosis.strategies)
+        assert set(diagnosis.dirty_seconds) == {"configured", "no untracked"}
+
+    def test_recommendations(self, git_dir: GitDir, monkeypatch) -> None:
+        monkeypatch.setattr(doctor, "MIN_SAVING_SECONDS", 0.0)
+        monkeypatch.setattr(doctor, "LOOSE_REFS_THRESHOLD", 1)
+        monkeypatch.setattr(doctor, "COMMIT_GRAPH_COMMITS_THRESHOLD", 1)
+        monkeypatch.setattr(doctor, "FSMONITOR_FILES_THRESHOLD", 1)
+        diagnosis = doctor.Diagnosis(git_dir.path, dirty_options=utils.DirtyCheckOptions(include_untracked=False))
+        actions = [recommendation.action for recommendation in diagnosis.recommendations]
+        assert "git pack-refs --all" in actions
+        assert "git commit-graph write --reachable && git config fetch.writeCommitGraph true" in actions
+        assert "git config core.fsmonitor true" in actions
+        assert "--dirty-path PATH" in actions
+        # Untracked files are not part of dirty detection, so nothing is gained by caching them
+        assert "git config core.untrackedCache true" not in actions
+        savings = [recommendation.saving_seconds for recommendation in diagnosis.recommendations]
+        assert savings == sorted(savings, reverse=True)
+
+    def test_no_recommendations_for_maintained_repository(self, git_dir: GitDir, monkeypatch) -> None:
+        monkeypatch.setattr(doctor, "LOOSE_REFS_THRESHOLD", 1)
+        monkeypatch.setattr(doctor, "COMMIT_GRAPH_COMMITS_THRESHOLD", 1)
+        _git(git_dir, "pack-refs", "--all")
+        _git(git_dir, "commit-graph", "write", "--reachable")
+        actions = [recommendation.action for recommendation in doctor.Diagnosis(git_dir.path).recommendations]
+        assert "git pack-refs --all" not in actions
+        assert not any(action.startswith("git commit-graph") for action in actions)
+
+    def test_report(self, git_dir: GitDir) -> None:
+        report = doctor.Diagnosis(git_dir.path, tag_strategy="highest").report()
+        assert "commits: 3, shallow: no" in report
+        assert "Collection stages (--tag-strategy highest):" in report
+        assert "--tag-strategy creatordate --no-describe" in report
+        assert "1.1.0, 1 commits since" in report
+        assert "Recommendations, by the time they could save at most:" in report
+
+    def test_no_commits(self, tmp_path: Path) -> None:
+        GitDir(tmp_path)
+        diagnosis = doctor.Diagnosis(tmp_path)
+        assert diagnosis.findings == ["Could not get version because no commits exist."]
+        assert diagnosis.cold is None
+        assert diagnosis.recommendations == []
+        report = diagnosis.report()
+        assert "commits: 0, shallow: no" in report
+        assert "Findings:\n  Could not get version because no commits exist." in report
+        assert "Collection stages" not in report
+
+    def test_not_a_repository(self, tmp_path: Path) -> None:
+        with pytest.raises(subprocess.CalledProcessError):
+            doctor.Diagnosis(tmp_path)
@@ -0,0 +1,187 @@
+import os
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from version_builder.fingerprint import FingerprintError, FingerprintOptions, compute_fingerprint
+
+# A modification time well before the cache is written, so files are not considered racy
+_SETTLED_TIME = time.time() - 3600
+
+
+def _create_tree(root: Path, files: dict[str, str]) -> Path:
+    for relative_path, content in files.items():
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        os.utime(path, (_SETTLED_TIME, _SETTLED_TIME))
+    return root
+
+
+def _fingerprint(root: Path, **options: object) -> str:
+    return compute_fingerprint(FingerprintOptions(root, use_cache=False, **options)).digest
+
+
+def _fingerprinted_files(root: Path, files: dict[str, str], **options: object) -> set[str]:
+    """Return which of the files change the fingerprint of a tree when they are changed."""
+    _create_tree(root, files)
+    original = _fingerprint(root, **options)
+    fingerprinted = set()
+    for relative_path, content in files.items():
+        (root / relative_path).write_text(content + "changed")
+        if _fingerprint(root, **options) != original:
+            fingerprinted.add(relative_path)
+        (root / relative_path).write_text(content)
+    return fingerprinted
+
+
+class TestFingerprintContent:
+    _FILES = {"readme.md": "readme", "src/main.c": "int main() {}", "src/lib/util.c": "void util() {}"}  # noqa: RUF012
+
+    def test_stable_across_copies(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path / "tree", self._FILES)
+        copy = tmp_path / "copy"
+        shutil.copytree(tree, copy)
+        os.utime(copy / "readme.md", (0, 0))
+        (copy / "empty").mkdir()
+        result = compute_fingerprint(FingerprintOptions(copy, use_cache=False))
+        assert result.digest == _fingerprint(tree)
+        assert result.file_count == len(self._FILES)
+        assert len(result.digest) == 64
+
+    def test_content_change(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path, self._FILES)
+        original = _fingerprint(tree)
+        (tree / "src/lib/util.c").write_text("void util() { }")
+        assert _fingerprint(tree) != original
+
+    def test_rename(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path, self._FILES)
+        original = _fingerprint(tree)
+        (tree / "src/main.c").rename(tree / "src/lib/main.c")
+        assert _fingerprint(tree) != original
+
+    def test_executable_bit(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path, self._FILES)
+        original = _fingerprint(tree)
+        (tree / "src/main.c").chmod(0o755)
+        assert _fingerprint(tree) != original
+
+    def test_symbolic_link(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path, self._FILES)
+        (tree / "link").symlink_to("readme.md")
+        original = _fingerprint(tree)
+        # The link is not followed, so only its target path counts
+        (tree / "readme.md").write_text("changed")
+        (tree / "src/main.c").write_text("changed")
+        changed_files = _fingerprint(tree)
+        (tree / "link").unlink()
+        (tree / "link").symlink_to("src/main.c")
+        assert len({original, changed_files, _fingerprint(tree)}) == 3
+        (tree / "src/main.c").unlink()
+        assert _fingerprint(tree)
+
+    def test_git_directory_is_ignored(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path, self._FILES)
+        original = _fingerprint(tree)
+        _create_tree(tree, {".git/HEAD": "ref: refs/heads/main"})
+        assert _fingerprint(tree) == original
+
+    def test_missing_directory(self, tmp_path: Path) -> None:
+        with pytest.raises(FingerprintError, match="is not a directory"):
+            _fingerprint(tmp_path / "missing")
+
+
+class TestFingerprintIgnoreRules:
+    def test_gitignore(self, tmp_path: Path) -> None:
+        files = {
+            ".gitignore": "*.o\n/build/\n# comment\n\ncache/\n!keep.o\n",
+            "main.c": "",
+            "main.o": "",
+            "keep.o": "",
+            "build/out": "",
+            "src/build/generated.c": "",
+            "src/cache/entry": "",
+        }
+        assert _fingerprinted_files(tmp_path, files) == {".gitignore", "main.c", "keep.o", "src/build/generated.c"}
+
+    def test_nested_ignore_files(self, tmp_path: Path) -> None:
+        files = {
+            ".gitignore": "*.log\n",
+            "a.log": "",
+            "sub/.plxsversionignore": "!important.log\ndata/**\n",
+            "sub/important.log": "",
+            "sub/other.log": "",
+            "sub/data/deep/file": "",
+            "sub/data.txt": "",
+            "other/important.log": "",
+        }
+        assert _fingerprinted_files(tmp_path, files) == {
+            ".gitignore",
+            "sub/.plxsversionignore",
+            "sub/important.log",
+            "sub/data.txt",
+        }
+
+    def test_anchored_patterns(self, tmp_path: Path) -> None:
+        files = {
+            ".gitignore": "docs/*.html\n**/tmp\nsrc/**/gen_*\n",
+            "docs/index.html": "",
+            "docs/api/index.html": "",
+            "a/b/tmp": "",
+            "src/gen_a.c": "",
+            "src/x/y/gen_b.c": "",
+            "src/keep.c": "",
+        }
+        assert _fingerprinted_files(tmp_path, files) == {".gitignore", "docs/api/index.html", "src/keep.c"}
+
+    def test_directory_only_pattern_keeps_files(self, tmp_path: Path) -> None:
+        files = {".gitignore": "out/\n", "out": "", "sub/out/file": ""}
+        assert _fingerprinted_files(tmp_path, files) == {".gitignore", "out"}
+
+    def test_extra_patterns(self, tmp_path: Path) -> None:
+        files = {"main.c": "", "main.o": "", "vendor/lib.c": ""}
+        ignore_patterns = ("*.o", "vendor/")
+        assert _fingerprinted_files(tmp_path, files, ignore_patterns=ignore_patterns) == {"main.c"}
+
+
+class TestFingerprintCache:
+    def test_unchanged_files_are_not_read(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path / "tree", {"a.txt": "a", "b/c.txt": "c"})
+        options = FingerprintOptions(tree, cache_path=tmp_path / "cache.txt")
+        first = compute_fingerprint(options)
+        assert first.hashed_count == 2
+        second = compute_fingerprint(options)
+        assert second.hashed_count == 0
+        assert second.digest == first.digest
+
+        (tree / "a.txt").write_text("changed")
+        os.utime(tree / "a.txt", (_SETTLED_TIME + 1, _SETTLED_TIME + 1))
+        third = compute_fingerprint(options)
+        assert third.hashed_count == 1
+        assert third.digest == _fingerprint(tree)
+        assert third.digest != first.digest
+
+    def test_recently_modified_files_are_not_cached(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path / "tree", {"a.txt": "a"})
+        (tree / "recent.txt").write_text("recent")
+        options = FingerprintOptions(tree, cache_path=tmp_path / "cache.txt")
+        compute_fingerprint(options)
+        assert compute_fingerprint(options).hashed_count == 1
+
+    def test_corrupt_cache(self, tmp_path: Path) -> None:
+        tree = _create_tree(tmp_path / "tree", {"a.txt": "a"})
+        cache_path = tmp_path / "cache.txt"
+        cache_path.write_text("not a cache\n")
+        options = FingerprintOptions(tree, cache_path=cache_path)
+        assert compute_fingerprint(options).digest == _fingerprint(tree)
+        assert compute_fingerprint(options).hashed_count == 0
+
+    def test_default_cache_location(self, tmp_path: Path, monkeypatch) -> None:
+        monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+        tree = _create_tree(tmp_path / "tree", {"a.txt": "a"})
+        compute_fingerprint(FingerprintOptions(tree))
+        assert len(list((tmp_path / "cache" / "plxsversion" / "fingerprints").glob("*.txt"))) == 1
+        assert compute_fingerprint(FingerprintOptions(tree)).hashed_count == 0
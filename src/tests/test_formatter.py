@@ -1,6 +1,7 @@
 import re
 
-from version_builder.formatter import to_c, to_cpp, to_cpp11, to_rust
+from version_builder import stamp
+from version_builder.formatter import to_c, to_cpp, to_cpp11, to_cpp20_module, to_python, to_rust, to_stamp
 from version_builder.version_data import VersionData
 
 
@@ -41,6 +42,7 @@ inline constexpr unsigned int COMMITS_SINCE_TAG { 3 };
 inline constexpr std::string_view COMMIT_ID { "abcd1234" };
 inline constexpr std::string_view BRANCH { "test-branch" };
 inline constexpr bool DIRTY_BUILD { false };
+inline constexpr bool DIRTY_APPLICABLE { true };
 inline constexpr bool DEVELOPMENT_BUILD { true };
 inline constexpr std::string_view BUILD_METADATA { "dev.3.sha.abcd1234" };
 
@@ -75,6 +77,7 @@ constexpr unsigned int COMMITS_SINCE_TAG { 3 };
 constexpr const char *COMMIT_ID { "abcd1234" };
 constexpr const char *BRANCH { "test-branch" };
 constexpr bool DIRTY_BUILD { false };
+constexpr bool DIRTY_APPLICABLE { true };
 constexpr bool DEVELOPMENT_BUILD { true };
 constexpr const char *BUILD_METADATA { "dev.3.sha.abcd1234" };
 
@@ -109,6 +112,7 @@ constexpr unsigned int COMMITS_SINCE_TAG { 3 };
 constexpr const char *COMMIT_ID { "abcd1234" };
 constexpr const char *BRANCH { "test-branch" };
 constexpr bool DIRTY_BUILD { false };
+constexpr bool DIRTY_APPLICABLE { true };
 constexpr bool DEVELOPMENT_BUILD { true };
 constexpr const char *BUILD_METADATA { "dev.3.sha.abcd1234" };
 
@@ -118,6 +122,40 @@ constexpr const char *BUILD_METADATA { "dev.3.sha.abcd1234" };
 """
         assert expected_output == to_cpp11(_CommonVersionData.version_data, namespace="foo::bar::version")
 
+    def test_cpp20_module_formatter(self):
+        expected_output = """
+// ---------------------------------------------------
+// This file is autogenerated.
+// DO NOT MODIFY!
+// ---------------------------------------------------
+
+module;
+
+#include <string_view>
+
+export module plxsversion;
+
+export namespace foo::bar {
+
+inline constexpr std::string_view BASE_VERSION { "1.2.3" };
+inline constexpr std::string_view VERSION { "1.2.3-rc.2+dev.3.sha.abcd1234" };
+inline constexpr unsigned int MAJOR { 1 };
+inline constexpr unsigned int MINOR { 2 };
+inline constexpr unsigned int PATCH { 3 };
+inline constexpr std::string_view PRE_RELEASE { "rc.2" };
+inline constexpr std::string_view TAG { "1.2.3-rc.2" };
+inline constexpr unsigned int COMMITS_SINCE_TAG { 3 };
+inline constexpr std::string_view COMMIT_ID { "abcd1234" };
+inline constexpr std::string_view BRANCH { "test-branch" };
+inline constexpr bool DIRTY_BUILD { false };
+inline constexpr bool DIRTY_APPLICABLE { true };
+inline constexpr bool DEVELOPMENT_BUILD { true };
+inline constexpr std::string_view BUILD_METADATA { "dev.3.sha.abcd1234" };
+
+} // namespace foo::bar
+"""
+        assert expected_output == to_cpp20_module(_CommonVersionData.version_data, namespace="foo::bar")
+
     def test_c_formatter(self):
         expected_output = """
 // ---------------------------------------------------
@@ -146,6 +184,7 @@ static const unsigned int COMMITS_SINCE_TAG = 3;
 static const char *COMMIT_ID = "abcd1234";
 static const char *BRANCH = "test-branch";
 static bool DIRTY_BUILD = false;
+static bool DIRTY_APPLICABLE = true;
 static bool DEVELOPMENT_BUILD = true;
 static const char *BUILD_METADATA = "dev.3.sha.abcd1234";
 
@@ -177,6 +216,7 @@ pub mod plxsversion {
     pub const COMMIT_ID: &str = "abcd1234";
     pub const BRANCH: &str = "test-branch";
     pub const DIRTY_BUILD: bool = false;
+    pub const DIRTY_APPLICABLE: bool = true;
     pub const DEVELOPMENT_BUILD: bool = true;
     pub const BUILD_METADATA: &str = "dev.3.sha.abcd1234";
 
@@ -184,34 +224,118 @@ pub mod plxsversion {
 """
         assert expected_output == to_rust(_CommonVersionData.version_data)
 
+    def test_python_formatter(self):
+        expected_output = """# ---------------------------------------------------
+# This file is autogenerated.
+# DO NOT MODIFY!
+# ---------------------------------------------------
+
+BASE_VERSION = '1.2.3'
+VERSION = '1.2.3-rc.2+dev.3.sha.abcd1234'
+MAJOR = 1
+MINOR = 2
+PATCH = 3
+PRE_RELEASE = 'rc.2'
+TAG = '1.2.3-rc.2'
+COMMITS_SINCE_TAG = 3
+COMMIT_ID = 'abcd1234'
+BRANCH = 'test-branch'
+DIRTY_BUILD = False
+DIRTY_APPLICABLE = True
+DEVELOPMENT_BUILD = True
+BUILD_METADATA = 'dev.3.sha.abcd1234'
+
+__version__ = VERSION
+"""
+        assert expected_output == to_python(_CommonVersionData.version_data)
+
+    def test_python_formatter_escapes_strings(self):
+        version_data = VersionData(tag="1.0.0", commit_id="abcd1234", branch_name='it\'s-\\"quoted"')
+        namespace = {}
+        exec(to_python(version_data), namespace)  # noqa: S102 - the generated module is the subject of the test
+        assert namespace["BRANCH"] == 'it\'s-\\"quoted"'
+        assert namespace["__version__"] == "1.0.0+sha.abcd1234"
+
+
+class TestDirtyNotApplicableOutput:
+    # A revision collected without checking it out has no working tree, which is told apart from a clean one
+    version_data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="HEAD", is_dirty_applicable=False)
+
+    def test_cpp_formatter(self):
+        output = to_cpp(self.version_data, namespace="plxsversion")
+        assert "inline constexpr bool DIRTY_BUILD { false };" in output
+        assert "inline constexpr bool DIRTY_APPLICABLE { false };" in output
+
+    def test_cpp11_formatter(self):
+        assert "constexpr bool DIRTY_APPLICABLE { false };" in to_cpp11(self.version_data, namespace="plxsversion")
+
+    def test_cpp20_module_formatter(self):
+        output = to_cpp20_module(self.version_data, namespace="plxsversion")
+        assert "inline constexpr bool DIRTY_APPLICABLE { false };" in output
+
+    def test_c_formatter(self):
+        assert "static bool DIRTY_APPLICABLE = false;" in to_c(self.version_data)
+
+    def test_rust_formatter(self):
+        assert "pub const DIRTY_APPLICABLE: bool = false;" in to_rust(self.version_data)
+
+    def test_python_formatter(self):
+        assert "DIRTY_APPLICABLE = False" in to_python(self.version_data)
+
 
 class TestTimeOutput(_CommonVersionData):
     def test_cpp_formatter(self):
-        _CommonVersionData.version_data.set_time()
+        version_data = _CommonVersionData.version_data.with_time()
         expected_pattern = (
             r"inline constexpr std::string_view UTC_TIME \{ \"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}\" \};"
         )
-        assert re.search(expected_pattern, to_cpp(_CommonVersionData.version_data, namespace="plxsversion"))
+        assert re.search(expected_pattern, to_cpp(version_data, namespace="plxsversion"))
 
     def test_cpp11_formatter(self):
-        _CommonVersionData.version_data.set_time()
+        version_data = _CommonVersionData.version_data.with_time()
         expected_pattern = r"constexpr const char \*UTC_TIME \{ \"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}\" \};"
-        assert re.search(expected_pattern, to_cpp11(_CommonVersionData.version_data, namespace="plxsversion"))
+        assert re.search(expected_pattern, to_cpp11(version_data, namespace="plxsversion"))
+
+    def test_cpp20_module_formatter(self):
+        version_data = _CommonVersionData.version_data.with_time()
+        expected_pattern = (
+            r"inline constexpr std::string_view UTC_TIME \{ \"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}\" \};"
+        )
+        assert re.search(expected_pattern, to_cpp20_module(version_data, namespace="plxsversion"))
 
     def test_c_formatter(self):
-        _CommonVersionData.version_data.set_time()
+        version_data = _CommonVersionData.version_data.with_time()
         expected_pattern = r"static const char \*UTC_TIME = \"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}\";"
-        assert re.search(expected_pattern, to_c(_CommonVersionData.version_data))
+        assert re.search(expected_pattern, to_c(version_data))
 
     def test_rust_formatter(self):
-        _CommonVersionData.version_data.set_time()
+        version_data = _CommonVersionData.version_data.with_time()
         expected_pattern = r"pub const UTC_TIME: &str = \"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}\";"
-        assert re.search(expected_pattern, to_rust(_CommonVersionData.version_data))
+        assert re.search(expected_pattern, to_rust(version_data))
+
+    def test_python_formatter(self):
+        version_data = _CommonVersionData.version_data.with_time()
+        expected_pattern = r"UTC_TIME = '[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}'"
+        assert re.search(expected_pattern, to_python(version_data))
 
 
 class TestCargoVersionOutput(_CommonVersionData):
     def test_rust_formatter(self):
         cargo_ver = "0.0.1"
-        _CommonVersionData.version_data.set_cargo_version(cargo_ver)
+        version_data = _CommonVersionData.version_data.with_cargo_version(cargo_ver)
         expected_pattern = f'pub const CARGO_VERSION: &str = "{cargo_ver:s}"'
-        assert re.search(expected_pattern, to_rust(_CommonVersionData.version_data))
+        assert re.search(expected_pattern, to_rust(version_data))
+
+
+class TestStampOutput:
+    def test_record_matches_layout(self):
+        output = to_stamp()
+        for field, c_type, size in stamp.RECORD_LAYOUT:
+            member = f"{c_type} {field}[{size}];" if c_type == "char" else f"{c_type} {field};"
+            assert member in output
+        assert f'__attribute__((section("{stamp.SECTION_NAME}"), used))' in output
+        assert f'"{stamp.RECORD_MAGIC.decode()}",' in output
+
+    def test_placeholder_is_version_independent(self):
+        assert to_stamp() == to_stamp()
+        assert "UNSTAMPED" in to_stamp()
@@ -1,3 +1,6 @@
+import io
+import json
+import os
 import subprocess
 import sys
 from pathlib import Path
@@ -5,7 +8,7 @@ from pathlib import Path
 import pytest
 
 from tests.utils import GitDir
-from version_builder import main
+from version_builder import fingerprint, main, utils
 
 
 class TestMain:
@@ -38,6 +41,62 @@ class TestMain:
         assert (git_dir.path / "version.hpp").exists()
         assert Path.stat(git_dir.path / "version.hpp").st_size != 0
 
+    def test_cpp_source_env(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("GITLAB_CI", "true")
+        monkeypatch.setenv("CI_COMMIT_SHA", "0123456789abcdef0123456789abcdef01234567")
+        monkeypatch.setenv("CI_COMMIT_TAG", "v1.3.0")
+        main.create_version_file(
+            source="env",
+            source_input="auto",
+            output_file=tmp_path / "version.hpp",
+            lang="cpp",
+        )
+        assert 'VERSION { "1.3.0+sha.0123456" }' in (tmp_path / "version.hpp").read_text()
+
+    def test_python_source_env(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("GITLAB_CI", "true")
+        monkeypatch.setenv("CI_COMMIT_SHA", "0123456789abcdef0123456789abcdef01234567")
+        monkeypatch.setenv("CI_COMMIT_TAG", "v1.3.0")
+        main.create_version_file(
+            source="env",
+            source_input="auto",
+            output_file=tmp_path / "_version.py",
+            lang="python",
+        )
+        assert "VERSION = '1.3.0+sha.0123456'" in (tmp_path / "_version.py").read_text()
+
+    def test_freeze_and_render(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.4.0")
+        record = tmp_path / "version.json"
+        main.freeze_version(source="git", source_input=git_dir.path, output_file=record)
+        git_dir.commit()  # the record keeps the version resolved at freeze time
+        main.create_version_file(
+            source="frozen",
+            source_input=record,
+            output_file=tmp_path / "version.h",
+            lang="c",
+        )
+        assert 'VERSION = "1.4.0+sha.' in (tmp_path / "version.h").read_text()
+
+    def test_resolved_environment_overrides_source(self, tmp_path, monkeypatch):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v2.1.0")
+        record = tmp_path / "version.json"
+        main.freeze_version(source="git", source_input=git_dir.path, output_file=record)
+        monkeypatch.setenv("PLXSVERSION_RESOLVED", str(record))
+        not_a_repo = tmp_path / "elsewhere"
+        not_a_repo.mkdir()
+        main.create_version_file(
+            source="git",
+            source_input=not_a_repo,
+            output_file=tmp_path / "version.hpp",
+            lang="cpp",
+        )
+        assert 'BASE_VERSION { "2.1.0" }' in (tmp_path / "version.hpp").read_text()
+
     def test_print_file(self, tmp_path, capsys):
         git_dir = GitDir(tmp_path)
         git_dir.commit()
@@ -53,6 +112,144 @@ class TestMain:
         captured = capsys.readouterr()
         assert "This file is autogenerated." in captured.out
 
+    def test_git_stats(self, tmp_path, capsys):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v0.2.0")
+        optional_config = main.OptionalConfiguration(git_stats=utils.GitCallStats())
+        main.create_version_file(
+            source="git",
+            source_input=git_dir.path,
+            output_file=git_dir.path / "version.hpp",
+            lang="cpp",
+            optional_config=optional_config,
+        )
+        assert optional_config.git_stats.processes > 0
+        assert "git queries:" in capsys.readouterr().out
+
+    def test_diagnose_repository(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        output = io.StringIO()
+        diagnosis = main.diagnose_repository(git_dir.path, output, tag_strategy="nearest")
+        assert diagnosis.cold.tag == "1.0.0"
+        assert output.getvalue() == diagnosis.report() + "\n"
+
+    def test_diagnose_repository_without_commits(self, tmp_path):
+        GitDir(tmp_path)
+        output = io.StringIO()
+        diagnosis = main.diagnose_repository(tmp_path, output)
+        assert diagnosis.findings
+        assert "no commits exist" in output.getvalue()
+
+    def test_content_fingerprint(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        (git_dir.path / "main.c").write_text("int main() {}")
+        options = fingerprint.FingerprintOptions(git_dir.path, ignore_patterns=("version.hpp",), use_cache=False)
+        digest = fingerprint.compute_fingerprint(options).digest
+        main.create_version_file(
+            source="git",
+            source_input=git_dir.path,
+            output_file=git_dir.path / "version.hpp",
+            lang="cpp",
+            optional_config=main.OptionalConfiguration(fingerprint_options=options),
+        )
+        assert f".content.{digest[:12]:s}.dirty" in (git_dir.path / "version.hpp").read_text()
+
+    def test_depfile(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        file = git_dir.path / "version.txt"
+        file.write_text("1.2.0")
+        git_dir.commit()
+        main.create_version_file(
+            source="file",
+            source_input=file,
+            output_file=git_dir.path / "version.h",
+            lang="c",
+            optional_config=main.OptionalConfiguration(depfile_path=str(git_dir.path / "version.d")),
+        )
+        rule = (git_dir.path / "version.d").read_text().split("\n\n")[0]
+        assert rule.startswith(f"{git_dir.path / 'version.h'!s}: ")
+        assert f"{file!s}" in rule
+        assert f"{git_dir.path / '.git' / 'index'!s}" in rule
+        # The tag comes from the file, so no tag refs are involved
+        assert "refs/tags" not in rule
+
+    def test_unchanged_output_is_rewritten(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        for lang, output_file in (("c", tmp_path / "version.h"), ("stamp", tmp_path / "stamp.h")):
+            main.create_version_file(source="git", source_input=git_dir.path, output_file=output_file, lang=lang)
+            os.utime(output_file, (0, 0))
+            main.create_version_file(source="git", source_input=git_dir.path, output_file=output_file, lang=lang)
+            # Only the placeholder, which does not depend on the version, keeps its modification time
+            assert (output_file.stat().st_mtime == 0) == (lang == "stamp")
+
+    def test_depfile_env_source(self, tmp_path, monkeypatch):
+        monkeypatch.setenv("GITLAB_CI", "true")
+        monkeypatch.setenv("CI_COMMIT_SHA", "0123456789abcdef0123456789abcdef01234567")
+        monkeypatch.setenv("CI_COMMIT_TAG", "v1.0.0")
+        # Nothing a build system could watch would tell it that the variables changed
+        with pytest.raises(ValueError, match="Cannot write a dependency file for source env"):
+            main.create_version_file(
+                source="env",
+                source_input="auto",
+                output_file=tmp_path / "version.h",
+                lang="c",
+                optional_config=main.OptionalConfiguration(depfile_path=str(tmp_path / "version.d")),
+            )
+        assert not (tmp_path / "version.d").exists()
+
+    def test_depfile_stamp(self, tmp_path):
+        main.create_version_file(
+            source="git",
+            source_input=tmp_path,
+            output_file=tmp_path / "version.h",
+            lang="stamp",
+            optional_config=main.OptionalConfiguration(depfile_path=str(tmp_path / "version.d")),
+        )
+        assert (tmp_path / "version.d").read_text() == f"{tmp_path / 'version.h'!s}:\n"
+
+    def test_version_history(self, tmp_path, capsys):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("1.0.0")
+        git_dir.tag("v1.0.0")
+        git_dir.commit()
+        output = io.StringIO()
+        failures = main.write_version_history(git_dir.path, "HEAD", output, git_stats=utils.GitCallStats())
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert failures == 2
+        assert [set(record) for record in records] == [{"commit", "error"}] * 2
+        assert "multiple valid SemVer tags" in records[0]["error"]
+        assert "git queries:" in capsys.readouterr().err
+
+    def test_watch_updates_on_change(self, tmp_path):
+        (tmp_path / "repo").mkdir()
+        git_dir = GitDir(tmp_path / "repo")
+        git_dir.commit(date="1700000000 +0000")
+        git_dir.tag("v1.0.0")
+        output_file = tmp_path / "version.h"
+        updater = main.VersionFileUpdater("git", git_dir.path, output_file, "c", main.OptionalConfiguration())
+        assert updater.update()
+        assert 'VERSION = "1.0.0+sha.' in output_file.read_text()
+        # Collecting the same version again leaves the file alone
+        assert not updater.update()
+        git_dir.tag("v1.1.0")
+        assert not updater.update()  # two tags on one commit cannot be collected
+        git_dir.commit(date="1700000001 +0000")
+        git_dir.tag("v1.1.0-rc.1")
+        assert updater.update()
+        assert 'VERSION = "1.1.0-rc.1+sha.' in output_file.read_text()
+
+    def test_watch_unsupported_source(self, tmp_path):
+        with pytest.raises(ValueError, match="Cannot watch source env"):
+            main.watch_version_file("env", "auto", tmp_path / "version.h", "c")
+
     def test_cpp(self, tmp_path):
         git_dir = GitDir(tmp_path)
         git_dir.commit()
@@ -108,6 +305,26 @@ class TestMain:
         assert (git_dir.path / "version.hpp").exists()
         assert Path.stat(git_dir.path / "version.hpp").st_size != 0
 
+    def test_cpp20_module(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        with pytest.raises(ValueError, match="Unexpected file ending for lang"):
+            # A module interface unit is not a header
+            main.create_version_file(
+                source="git",
+                source_input=git_dir.path,
+                output_file=git_dir.path / "version.hpp",
+                lang="cpp20-module",
+            )
+        main.create_version_file(
+            source="git",
+            source_input=git_dir.path,
+            output_file=git_dir.path / "version.cppm",
+            lang="cpp20-module",
+        )
+        assert "export module plxsversion;" in (git_dir.path / "version.cppm").read_text()
+
     def test_rust(self, tmp_path):
         git_dir = GitDir(tmp_path)
         git_dir.commit()
@@ -155,6 +372,96 @@ class TestModuleInterface:
         assert Path.exists(git_dir.path / "version.hpp")
         assert Path.stat(git_dir.path / "version.hpp").st_size != 0
 
+    def test_history_command(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.commit()
+        output = subprocess.check_output(
+            [sys.executable, "-m", "version_builder", "history", "--input", git_dir.path, "HEAD~1..HEAD"],
+            env={"PYTHONPATH": Path.cwd() / "src"},
+        )
+        records = [json.loads(line) for line in output.decode().splitlines()]
+        assert len(records) == 1
+        assert records[0]["version"].startswith("1.0.0+dev.1.sha.")
+        assert records[0]["commits_since_tag"] == 1
+
+    def test_doctor_command(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        output = subprocess.check_output(
+            [sys.executable, "-m", "version_builder", "doctor", "--input", git_dir.path, "--no-dirty-untracked"],
+            env={"PYTHONPATH": Path.cwd() / "src"},
+        ).decode()
+        assert "Collection stages (--tag-strategy creatordate):" in output
+        assert "no untracked" not in output
+        assert "Recommendations" in output
+
+    def test_depfile_command(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.create_branch("main")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        subprocess.check_call(
+            [
+                sys.executable,
+                "-m",
+                "version_builder",
+                "--lang",
+                "c",
+                "--source",
+                "git",
+                "--input",
+                git_dir.path,
+                "--depfile",
+                git_dir.path / "version.d",
+                "version.h",
+            ],
+            env={"PYTHONPATH": Path.cwd() / "src"},
+            cwd=git_dir.path,
+        )
+        rule = (git_dir.path / "version.d").read_text().split("\n\n")[0]
+        assert rule.startswith("version.h: ")
+        for dependency in ("HEAD", "refs/heads/main", "refs/tags/v1.0.0", "index"):
+            assert f"{git_dir.path / '.git' / dependency!s}" in rule
+
+    def test_freeze_command(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v3.0.0")
+        record = git_dir.path / "version.json"
+        subprocess.check_call(
+            [
+                sys.executable,
+                "-m",
+                "version_builder",
+                "freeze",
+                "--source",
+                "git",
+                "--input",
+                git_dir.path,
+                record,
+            ],
+            env={"PYTHONPATH": Path.cwd() / "src"},
+        )
+        subprocess.check_call(
+            [
+                sys.executable,
+                "-m",
+                "version_builder",
+                "--lang",
+                "rust",
+                "--source",
+                "git",
+                "--input",
+                tmp_path / "does-not-exist",
+                git_dir.path / "version.rs",
+            ],
+            env={"PYTHONPATH": Path.cwd() / "src", "PLXSVERSION_RESOLVED": record},
+        )
+        assert 'BASE_VERSION: &str = "3.0.0"' in (git_dir.path / "version.rs").read_text()
+
     def test_cargo_version_rust(self, tmp_path):
         git_dir = GitDir(tmp_path)
         git_dir.commit()
@@ -202,6 +509,105 @@ class TestModuleInterface:
                 env={"PYTHONPATH": Path.cwd() / "src"},
             )
 
+    def test_rev(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v2.0.0")
+        git_dir.commit()
+        (git_dir.path / "untracked.txt").write_text("")
+        subprocess.check_call(
+            [
+                sys.executable,
+                "-m",
+                "version_builder",
+                "--lang",
+                "rust",
+                "--source",
+                "git",
+                "--input",
+                git_dir.path,
+                "--rev",
+                "v2.0.0",
+                git_dir.path / "version.rs",
+            ],
+            env={"PYTHONPATH": Path.cwd() / "src"},
+        )
+        contents = (git_dir.path / "version.rs").read_text()
+        assert "COMMITS_SINCE_TAG: u32 = 0;" in contents
+        assert "DIRTY_BUILD: bool = false;" in contents
+
+    def test_rev_requires_git(self, tmp_path):
+        (tmp_path / "version.txt").write_text("1.0.0")
+        with pytest.raises(subprocess.CalledProcessError):
+            subprocess.check_call(
+                [
+                    sys.executable,
+                    "-m",
+                    "version_builder",
+                    "--lang",
+                    "c",
+                    "--source",
+                    "file",
+                    "--input",
+                    tmp_path / "version.txt",
+                    "--rev",
+                    "HEAD",
+                    tmp_path / "version.h",
+                ],
+                env={"PYTHONPATH": Path.cwd() / "src"},
+            )
+
+    def test_fingerprint(self, tmp_path):
+        (tmp_path / "repo").mkdir()
+        git_dir = GitDir(tmp_path / "repo")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        (tmp_path / "sources").mkdir()
+        (tmp_path / "sources" / "main.c").write_text("int main() {}")
+        (tmp_path / "sources" / "main.o").write_text("")
+        subprocess.check_call(
+            [
+                sys.executable,
+                "-m",
+                "version_builder",
+                "--lang",
+                "c",
+                "--source",
+                "git",
+                "--input",
+                git_dir.path,
+                "--fingerprint",
+                tmp_path / "sources",
+                "--fingerprint-ignore",
+                "*.o",
+                "--no-fingerprint-cache",
+                tmp_path / "version.h",
+            ],
+            env={"PYTHONPATH": Path.cwd() / "src"},
+        )
+        assert ".content." in (tmp_path / "version.h").read_text()
+
+    def test_fingerprint_ignore_requires_fingerprint(self, tmp_path):
+        (tmp_path / "version.txt").write_text("1.0.0")
+        with pytest.raises(subprocess.CalledProcessError):
+            subprocess.check_call(
+                [
+                    sys.executable,
+                    "-m",
+                    "version_builder",
+                    "--lang",
+                    "c",
+                    "--source",
+                    "file",
+                    "--input",
+                    tmp_path / "version.txt",
+                    "--fingerprint-ignore",
+                    "*.o",
+                    tmp_path / "version.h",
+                ],
+                env={"PYTHONPATH": Path.cwd() / "src"},
+            )
+
     def test_namespace_requires_cpp(self, tmp_path):
         git_dir = GitDir(tmp_path)
         git_dir.commit()
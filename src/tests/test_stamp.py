@@ -0,0 +1,114 @@
+import shutil
+import struct
+import subprocess
+
+import pytest
+
+from tests.utils import GitDir
+from version_builder import main, stamp
+from version_builder.version_data import VersionData
+
+_SECTION_NAMES = b"\0.plxsversion\0.shstrtab\0"
+
+
+def _write_elf(path, *, elf_class=2, byte_order="<", section_name_offset=1):
+    """Write a minimal ELF file holding a placeholder version record, as a linker would."""
+    record = stamp.RECORD_MAGIC.ljust(stamp.RECORD_SIZE, b"\0")
+    if elf_class == 2:
+        header_format, section_format = "HHIQQQIHHHHHH", "IIQQQQIIQQ"
+    else:
+        header_format, section_format = "HHIIIIIHHHHHH", "IIIIIIIIII"
+    header_size = 16 + struct.calcsize(byte_order + header_format)
+    section_size = struct.calcsize(byte_order + section_format)
+    record_offset = header_size
+    names_offset = record_offset + len(record)
+    sections_offset = names_offset + len(_SECTION_NAMES)
+
+    identification = b"\x7fELF" + bytes([elf_class, 1 if byte_order == "<" else 2, 1]) + bytes(9)
+    header = struct.pack(
+        byte_order + header_format, 2, 62, 1, 0, 0, sections_offset, 0, header_size, 0, 0, section_size, 3, 2
+    )
+    sections = [
+        struct.pack(byte_order + section_format, *[0] * 10),
+        struct.pack(byte_order + section_format, section_name_offset, 1, 2, 0, record_offset, len(record), 0, 0, 8, 0),
+        struct.pack(byte_order + section_format, 14, 3, 0, 0, names_offset, len(_SECTION_NAMES), 0, 0, 1, 0),
+    ]
+    path.write_bytes(identification + header + record + _SECTION_NAMES + b"".join(sections))
+
+
+class TestStampBinary:
+    version_data = VersionData(tag="1.2.3-rc.2", commit_id="abcd123", branch_name="main", commits_since_tag=4)
+
+    @pytest.mark.parametrize(("elf_class", "byte_order"), [(2, "<"), (2, ">"), (1, "<"), (1, ">")])
+    def test_stamp(self, tmp_path, elf_class, byte_order):
+        binary = tmp_path / "app"
+        _write_elf(binary, elf_class=elf_class, byte_order=byte_order)
+        size = binary.stat().st_size
+        assert stamp.read_stamp(binary)["stamped"] == 0
+
+        assert stamp.stamp_binary(binary, self.version_data)
+        record = stamp.read_stamp(binary)
+        assert record["stamped"] == 1
+        assert record["version"] == "1.2.3-rc.2+dev.4.sha.abcd123"
+        assert record["major"] == 1
+        assert record["patch"] == 3
+        assert record["commits_since_tag"] == 4
+        assert record["development_build"] == 1
+        assert record["branch"] == "main"
+        assert record["dirty_applicable"] == 1
+        assert binary.stat().st_size == size
+
+    def test_dirty_not_applicable(self, tmp_path):
+        binary = tmp_path / "app"
+        _write_elf(binary)
+        version_data = VersionData(tag="1.2.3", commit_id="abcd123", branch_name="HEAD", is_dirty_applicable=False)
+        stamp.stamp_binary(binary, version_data)
+        record = stamp.read_stamp(binary)
+        assert (record["dirty_build"], record["dirty_applicable"]) == (0, 0)
+
+    def test_unchanged_binary_is_not_written(self, tmp_path):
+        binary = tmp_path / "app"
+        _write_elf(binary)
+        assert stamp.stamp_binary(binary, self.version_data)
+        assert not stamp.stamp_binary(binary, self.version_data)
+        assert stamp.stamp_binary(binary, self.version_data.with_time())
+
+    def test_not_an_elf_binary(self, tmp_path):
+        binary = tmp_path / "app"
+        binary.write_text("#!/bin/sh\n")
+        with pytest.raises(stamp.StampError, match="not an ELF binary"):
+            stamp.stamp_binary(binary, self.version_data)
+
+    def test_missing_section(self, tmp_path):
+        binary = tmp_path / "app"
+        _write_elf(binary, section_name_offset=14)  # both sections are named .shstrtab
+        with pytest.raises(stamp.StampError, match=r"has no \.plxsversion section"):
+            stamp.stamp_binary(binary, self.version_data)
+
+    def test_field_too_long(self, tmp_path):
+        binary = tmp_path / "app"
+        _write_elf(binary)
+        version_data = VersionData(tag="1.0.0", commit_id="abcd123", branch_name="b" * 200)
+        with pytest.raises(stamp.StampError, match="branch"):
+            stamp.stamp_binary(binary, version_data)
+        assert stamp.read_stamp(binary)["stamped"] == 0
+
+    @pytest.mark.skipif(shutil.which("cc") is None, reason="requires a C compiler")
+    def test_compiled_placeholder(self, tmp_path):
+        (tmp_path / "repo").mkdir()
+        git_dir = GitDir(tmp_path / "repo")
+        git_dir.commit()
+        git_dir.tag("v2.0.1")
+        main.create_version_file("git", git_dir.path, tmp_path / "version.h", "stamp")
+        (tmp_path / "record.c").write_text('#define PLXSVERSION_DEFINE_RECORD\n#include "version.h"\n')
+        (tmp_path / "main.c").write_text(
+            '#include <stdio.h>\n#include "version.h"\n'
+            'int main(void) { printf("%s %u\\n", plxsversion_version(), plxsversion_patch()); return 0; }\n'
+        )
+        binary = tmp_path / "app"
+        subprocess.check_call(["cc", "-O2", "-o", binary, tmp_path / "main.c", tmp_path / "record.c"])
+        assert subprocess.check_output([binary]).decode() == "UNSTAMPED 0\n"
+
+        main.stamp_version("git", git_dir.path, binary)
+        assert subprocess.check_output([binary]).decode().startswith("2.0.1+sha.")
+        assert subprocess.check_output([binary]).decode().endswith(" 1\n")
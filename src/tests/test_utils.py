@@ -1,5 +1,12 @@
+import os
+import subprocess
+import sys
+import threading
+import time
 from pathlib import Path
 
+import pytest
+
 from tests.utils import GitDir
 from version_builder import utils
 
@@ -12,56 +19,687 @@ class TestDirectoryManagement:
         assert Path.cwd() == current_dir
 
 
+class TestEqualityByValue:
+    def test_deprecated(self):
+        with pytest.deprecated_call():
+
+            class Point(utils.EqualityByValue):
+                def __init__(self, x: int) -> None:
+                    self.x = x
+
+        assert Point(1) == Point(1)
+        assert Point(1) != Point(2)
+
+
+class TestAtomicWrite:
+    def test_write(self, tmp_path):
+        output_file = tmp_path / "version.hpp"
+        assert utils.write_file_atomic(output_file, "first")
+        assert output_file.read_text() == "first"
+        assert utils.write_file_atomic(output_file, "second")
+        assert output_file.read_text() == "second"
+        # Only the output and its lock file remain
+        assert sorted(path.name for path in tmp_path.iterdir()) == [".version.hpp.lock", "version.hpp"]
+
+    def test_unchanged_file_is_left_alone(self, tmp_path):
+        output_file = tmp_path / "version.hpp"
+        utils.write_file_atomic(output_file, "content")
+        inode = output_file.stat().st_ino
+        assert not utils.write_file_atomic(output_file, "content")
+        assert output_file.stat().st_ino == inode
+
+    def test_unchanged_file_is_replaced_on_request(self, tmp_path):
+        output_file = tmp_path / "version.hpp"
+        utils.write_file_atomic(output_file, "content")
+        inode = output_file.stat().st_ino
+        assert utils.write_file_atomic(output_file, "content", keep_unchanged=False)
+        assert output_file.stat().st_ino != inode
+
+    def test_failed_write_keeps_previous_content(self, tmp_path, monkeypatch):
+        output_file = tmp_path / "version.hpp"
+        utils.write_file_atomic(output_file, "previous")
+
+        def fail_replace(*_args):
+            raise OSError
+
+        monkeypatch.setattr(Path, "replace", fail_replace)
+        with pytest.raises(OSError):  # noqa: PT011 - the error raised by the replaced function carries no message
+            utils.write_file_atomic(output_file, "new")
+        assert output_file.read_text() == "previous"
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_parallel_writers(self, tmp_path):
+        output_file = tmp_path / "version.hpp"
+        contents = [str(index) * 100_000 for index in range(8)]
+        utils.write_file_atomic(output_file, contents[0])
+        seen = set()
+        writing = True
+
+        def read() -> None:
+            while writing:
+                seen.add(output_file.read_text())
+
+        reader = threading.Thread(target=read)
+        reader.start()
+        writers = [
+            threading.Thread(target=utils.write_file_atomic, args=(output_file, content)) for content in contents
+        ]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        writing = False
+        reader.join()
+        # Readers only ever see complete contents
+        assert seen <= set(contents)
+        assert output_file.read_text() in contents
+
+
 class TestGitWrapper:
     def test_commit_count_no_commits(self, tmp_path):
         git_dir = GitDir(tmp_path)
         with utils.change_dir(git_dir.path):
-            assert utils.Git.get_commit_count() == 0
+            assert utils.Git().get_commit_count() == 0
 
     def test_commit_count(self, tmp_path):
         git_dir = GitDir(tmp_path)
         with utils.change_dir(git_dir.path):
             for commit_num in range(1, 5):
                 git_dir.commit()
-                assert commit_num == utils.Git.get_commit_count()
+                assert commit_num == utils.Git().get_commit_count()
 
     def test_get_commit_id(self, tmp_path: Path) -> None:
         git_dir = GitDir(tmp_path)
         with utils.change_dir(git_dir.path):
             short_id_from_helper = git_dir.commit()
 
+        with utils.Git(git_dir.path) as git:
             # Test default (short=True)
-            short_id_from_util = utils.Git.get_commit_id()
+            short_id_from_util = git.get_commit_id()
             assert short_id_from_util == short_id_from_helper
             assert len(short_id_from_util) == 7
 
             # Test short=False
-            full_id_from_util = utils.Git.get_commit_id(short=False)
+            full_id_from_util = git.get_commit_id(short=False)
             assert len(full_id_from_util) == 40
             assert full_id_from_util.startswith(short_id_from_util)
 
             # Test short=True explicitly
-            assert utils.Git.get_commit_id(short=True) == short_id_from_util
+            assert git.get_commit_id(short=True) == short_id_from_util
 
     def test_cwd_not_empty(self, tmp_path):
         git_dir = GitDir(tmp_path)
         with utils.change_dir(git_dir.path):
-            assert not utils.Git.get_cwd_is_not_empty()
+            assert not utils.Git().get_cwd_is_not_empty()
             file = git_dir.path / "my-file.txt"
             file.write_text("")
-            assert utils.Git.get_cwd_is_not_empty()
+            assert utils.Git().get_cwd_is_not_empty()
 
     def test_dirty_detection(self, tmp_path):
         git_dir = GitDir(tmp_path)
         with utils.change_dir(git_dir.path):
             git_dir.commit()
-            assert not utils.Git.get_is_dirty()  # empty repo
+            assert not utils.Git().get_is_dirty()  # empty repo
             file = git_dir.path / "my-file.txt"
             file.write_text("")
-            assert utils.Git.get_is_dirty()  # untracked change
+            assert utils.Git().get_is_dirty()  # untracked change
             git_dir.add_all()
-            assert utils.Git.get_is_dirty()  # staged change
+            assert utils.Git().get_is_dirty()  # staged change
             git_dir.commit()
-            assert not utils.Git.get_is_dirty()  # no changes
+            assert not utils.Git().get_is_dirty()  # no changes
             file.write_text("hello")
-            assert utils.Git.get_is_dirty()  # unstaged changes
+            assert utils.Git().get_is_dirty()  # unstaged changes
+
+    def test_dirty_detection_pathspecs(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        (git_dir.path / "component").mkdir()
+        (git_dir.path / "component" / "source.c").write_text("")
+        (git_dir.path / "assets").mkdir()
+        (git_dir.path / "assets" / "image.bin").write_text("")
+        git_dir.commit()
+        options = utils.DirtyCheckOptions(pathspecs=("component",))
+        with utils.change_dir(git_dir.path):
+            (git_dir.path / "assets" / "generated.bin").write_text("")
+            (git_dir.path / "assets" / "image.bin").write_text("changed")
+            assert utils.Git().get_is_dirty()
+            assert not utils.Git().get_is_dirty(options)
+            (git_dir.path / "component" / "source.c").write_text("changed")
+            assert utils.Git().get_is_dirty(options)
+
+    def test_dirty_detection_ignore_untracked(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        options = utils.DirtyCheckOptions(include_untracked=False)
+        with utils.change_dir(git_dir.path):
+            file = git_dir.path / "my-file.txt"
+            file.write_text("")
+            assert utils.Git().get_is_dirty()
+            assert not utils.Git().get_is_dirty(options)
+            git_dir.add_all()
+            assert utils.Git().get_is_dirty(options)  # staged change
+
+    def test_dirty_detection_ignore_submodules(self, tmp_path):
+        (tmp_path / "sub").mkdir()
+        (tmp_path / "super").mkdir()
+        submodule_dir = GitDir(tmp_path / "sub")
+        (submodule_dir.path / "file.txt").write_text("")
+        submodule_dir.commit()
+        git_dir = GitDir(tmp_path / "super")
+        with utils.change_dir(git_dir.path):
+            subprocess.check_call(
+                ["git", "-c", "protocol.file.allow=always", "submodule", "add", str(submodule_dir.path), "sub"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+        git_dir.commit()
+        options = utils.DirtyCheckOptions(include_submodules=False)
+        with utils.change_dir(git_dir.path):
+            assert not utils.Git().get_is_dirty()
+            (git_dir.path / "sub" / "file.txt").write_text("changed")
+            assert utils.Git().get_is_dirty()
+            assert not utils.Git().get_is_dirty(options)
+
+    @pytest.mark.parametrize(("setting", "value"), [("core.untrackedCache", "true"), ("feature.manyFiles", "true")])
+    def test_dirty_detection_status_cache(self, tmp_path, setting, value):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with utils.change_dir(git_dir.path):
+            assert not utils.Git().get_uses_status_cache()
+            subprocess.check_call(["git", "config", setting, value])
+            assert utils.Git().get_uses_status_cache()
+            assert not utils.Git().get_is_dirty()
+            file = git_dir.path / "my-file.txt"
+            file.write_text("")
+            assert utils.Git().get_is_dirty()  # untracked change
+            assert not utils.Git().get_is_dirty(utils.DirtyCheckOptions(include_untracked=False))
+            git_dir.add_all()
+            assert utils.Git().get_is_dirty()  # staged change
+            git_dir.commit()
+            assert not utils.Git().get_is_dirty()  # no changes
+            file.write_text("hello")
+            assert utils.Git().get_is_dirty()  # unstaged changes
+            assert not utils.Git().get_is_dirty(utils.DirtyCheckOptions(pathspecs=("other",)))
+
+    def test_status_cache_disabled(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with utils.change_dir(git_dir.path):
+            subprocess.check_call(["git", "config", "core.untrackedCache", "false"])
+            assert not utils.Git().get_uses_status_cache()
+
+
+class TestGitSession:
+    def test_queries_are_memoized(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        stats = utils.GitCallStats()
+        with utils.Git(git_dir.path, stats=stats) as git:
+            for _ in range(3):
+                assert git.get_branch_name() != ""
+                assert git.get_commit_count() == 1
+                assert not git.get_is_dirty()
+        assert stats.queries["rev-parse"] == 1
+        assert stats.queries["rev-list"] == 1
+        assert stats.cache_hits >= 6
+
+    def test_answers_do_not_change_within_session(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with utils.Git(git_dir.path) as git:
+            assert git.get_commit_count() == 1
+            git_dir.commit()
+            assert git.get_commit_count() == 1
+        with utils.Git(git_dir.path) as git:
+            assert git.get_commit_count() == 2
+
+    def test_short_commit_id_is_derived(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        stats = utils.GitCallStats()
+        with utils.Git(git_dir.path, stats=stats) as git:
+            full_id = git.get_commit_id(short=False)
+            assert git.get_commit_id() == full_id[:7]
+        assert stats.processes == 1
+        assert stats.queries == {"cat-file --batch": 1}
+
+    def test_runs_in_repository_directory(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        short_id = git_dir.commit()
+        with utils.change_dir("/"), utils.Git(git_dir.path) as git:
+            assert git.get_commit_id() == short_id
+            assert git.get_commit_count() == 1
+
+    def test_failed_query(self, tmp_path):
+        with utils.Git(tmp_path) as git:
+            with pytest.raises(subprocess.CalledProcessError):
+                git.get_branch_name()
+            assert git.get_commit_count() == 0
+
+    def test_stream(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        for index in range(3):
+            (tmp_path / "file.txt").write_text(str(index))
+            git_dir.commit()
+        stats = utils.GitCallStats()
+        with utils.Git(git_dir.path, stats=stats) as git:
+            assert len(list(git.stream("rev-list", "HEAD"))) == 3
+            walk = git.stream("rev-list", "HEAD")
+            assert next(walk) == git.get_commit_id(short=False)
+            # Abandoning the walk stops git
+            walk.close()
+            with pytest.raises(subprocess.CalledProcessError):
+                list(git.stream("rev-list", "no-such-revision"))
+        assert stats.queries["rev-list"] == 3
+
+    def test_stats_summary(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        stats = utils.GitCallStats()
+        with utils.Git(git_dir.path, stats=stats) as git:
+            git.get_commit_id()
+            git.get_branch_name()
+            git.get_branch_name()
+        summary = stats.summary()
+        assert summary.startswith("git queries: 2, processes started: 2, answered from cache: 1")
+        assert "rev-parse" in summary
+        assert "cat-file --batch" in summary
+
+
+def _count_since(repo_path, base_commit, stats=None):
+    with utils.Git(repo_path, stats=stats) as git:
+        head_commit = git.get_commit_id(short=False)
+        return utils.CommitCountCache(git).count(base_commit, head_commit)
+
+
+def _full_id(repo_path, revision):
+    return subprocess.check_output(["git", "rev-parse", revision], cwd=repo_path).decode().strip()
+
+
+def _commit_at(repo_path, seconds, *parents):
+    """Create an empty commit with the given parents, committed the given number of seconds into the history."""
+    date = f"{1700000000 + seconds:d} +0000"
+    parent_arguments = [argument for parent in parents for argument in ("-p", parent)]
+    return subprocess.check_output(
+        ["git", "commit-tree", "4b825dc642cb6eb9a060e54bf8d69288fbee4904", "-m", "message", *parent_arguments],
+        cwd=repo_path,
+        env={**os.environ, "GIT_AUTHOR_DATE": date, "GIT_COMMITTER_DATE": date},
+        text=True,
+    ).strip()
+
+
+class TestCommitCountCache:
+    def test_incremental_count(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        base_commit = _full_id(tmp_path, "HEAD")
+        for _ in range(3):
+            git_dir.commit()
+        assert _count_since(tmp_path, base_commit) == 3
+
+        for _ in range(2):
+            git_dir.commit()
+        stats = utils.GitCallStats()
+        assert _count_since(tmp_path, base_commit, stats) == 5
+        # Only the commits added since the last count were walked, and the oldest of them checked against the last one
+        assert stats.queries["merge-base"] == 3
+        assert stats.queries["rev-list"] == 1
+
+        stats = utils.GitCallStats()
+        assert _count_since(tmp_path, base_commit, stats) == 5
+        assert "rev-list" not in stats.queries
+
+    def test_count_without_base(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        assert _count_since(tmp_path, None) == 1
+        git_dir.commit()
+        assert _count_since(tmp_path, None) == 2
+
+    def test_merge_of_commits_older_than_last_head(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        base_commit = _full_id(tmp_path, "HEAD")
+        git_dir.create_branch("feature")
+        (tmp_path / "feature.txt").write_text("feature")
+        git_dir.commit()
+        git_dir.commit()
+        git_dir.checkout("-")
+        (tmp_path / "main.txt").write_text("main")
+        git_dir.commit()
+        assert _count_since(tmp_path, base_commit) == 1
+        with utils.change_dir(tmp_path):
+            subprocess.check_call(["git", "merge", "--no-edit", "--quiet", "feature"])
+        # The merge commit and the two feature commits
+        assert _count_since(tmp_path, base_commit) == 4
+
+    def test_skewed_commit_dates(self, tmp_path):
+        GitDir(tmp_path)
+        # The base reaches an old commit only through commits dated before it
+        old_commit = _commit_at(tmp_path, 500)
+        base_commit = _commit_at(tmp_path, 1000, _commit_at(tmp_path, 10, _commit_at(tmp_path, 5, old_commit)))
+        # Commits that HEAD shares with the last counted HEAD, but not with the base, keep git walking back in time
+        side_commit = _commit_at(tmp_path, 105)
+        for seconds in (110, 120, 150, 200, 300, 400):
+            side_commit = _commit_at(tmp_path, seconds, side_commit)
+        last_head = _commit_at(tmp_path, 1100, base_commit, side_commit)
+        for seconds in (1200, 1300, 1400, 1500, 1600):
+            last_head = _commit_at(tmp_path, seconds, last_head)
+        subprocess.check_call(["git", "reset", "--quiet", "--hard", last_head], cwd=tmp_path)
+        assert _count_since(tmp_path, base_commit) == 13
+
+        # git stops before finding that the last HEAD reaches the old commit, and lists it as added
+        head = _commit_at(tmp_path, 2000, last_head, _commit_at(tmp_path, 1900, old_commit))
+        listed = subprocess.check_output(["git", "rev-list", "--count", head, f"^{last_head:s}"], cwd=tmp_path)
+        assert int(listed) == 3
+        subprocess.check_call(["git", "reset", "--quiet", "--hard", head], cwd=tmp_path)
+        assert _count_since(tmp_path, base_commit) == 15
+        assert _count_since(tmp_path, base_commit) == int(
+            subprocess.check_output(["git", "rev-list", "--count", head, f"^{base_commit:s}"], cwd=tmp_path)
+        )
+
+    def test_full_count_after_reset(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        base_commit = _full_id(tmp_path, "HEAD")
+        git_dir.commit()
+        git_dir.commit()
+        assert _count_since(tmp_path, base_commit) == 2
+        with utils.change_dir(tmp_path):
+            subprocess.check_call(["git", "reset", "--quiet", "--hard", "HEAD~2"])
+        (tmp_path / "file.txt").write_text("rewritten")
+        git_dir.commit()
+        assert _count_since(tmp_path, base_commit) == 1
+
+    def test_unreadable_store(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        cache_dir = tmp_path / ".git" / utils.SHARED_CACHE_DIRECTORY
+        cache_dir.mkdir()
+        (cache_dir / utils.CommitCountCache.FILE_NAME).write_text("{not json")
+        assert _count_since(tmp_path, None) == 1
+        git_dir.commit()
+        assert _count_since(tmp_path, None) == 2
+
+
+def _add_worktree(repo_path, worktree_path, *args):
+    subprocess.check_call(
+        ["git", "worktree", "add", "--quiet", *args, str(worktree_path)], cwd=repo_path, stderr=subprocess.DEVNULL
+    )
+
+
+class TestSharedCaches:
+    def test_counts_shared_by_worktrees(self, tmp_path):
+        (tmp_path / "repo").mkdir()
+        git_dir = GitDir(tmp_path / "repo")
+        git_dir.commit()
+        base_commit = _full_id(git_dir.path, "HEAD")
+        for index in range(3):
+            (git_dir.path / "file.txt").write_text(str(index))
+            git_dir.commit()
+        assert _count_since(git_dir.path, base_commit) == 3
+
+        _add_worktree(git_dir.path, tmp_path / "worktree", "--detach")
+        stats = utils.GitCallStats()
+        assert _count_since(tmp_path / "worktree", base_commit, stats) == 3
+        assert "rev-list" not in stats.queries
+
+        # A new commit in the worktree is counted from the count of its sibling
+        (tmp_path / "worktree" / "file.txt").write_text("worktree")
+        subprocess.check_call(["git", "commit", "--quiet", "--all", "-m", "message"], cwd=tmp_path / "worktree")
+        stats = utils.GitCallStats()
+        assert _count_since(tmp_path / "worktree", base_commit, stats) == 4
+        assert stats.queries["merge-base"] == 3
+        assert (git_dir.path / ".git" / utils.SHARED_CACHE_DIRECTORY / utils.CommitCountCache.FILE_NAME).exists()
+        assert not (git_dir.path / ".git" / "worktrees" / "worktree" / utils.SHARED_CACHE_DIRECTORY).exists()
+
+    def test_tag_queries_shared_by_worktrees(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(utils.TagQueryCache, "SETTLE_SECONDS", -1.0)
+        (tmp_path / "repo").mkdir()
+        git_dir = GitDir(tmp_path / "repo")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.commit()
+        head_commit = _full_id(git_dir.path, "HEAD")
+        _add_worktree(git_dir.path, tmp_path / "worktree", "--detach")
+
+        describe = utils.Git.describe_arguments()
+        with utils.Git(git_dir.path) as git:
+            description = utils.TagQueryCache(git).run(*describe, head_commit=head_commit)
+        stats = utils.GitCallStats()
+        with utils.Git(tmp_path / "worktree", stats=stats) as git:
+            assert utils.TagQueryCache(git).run(*describe, head_commit=head_commit) == description
+        assert "describe" not in stats.queries
+
+        # A new tag changes the fingerprint of the refs, so the stored description is not used
+        git_dir.tag("v1.1.0")
+        with utils.Git(tmp_path / "worktree") as git:
+            assert utils.TagQueryCache(git).run(*describe, head_commit=head_commit).startswith("v1.1.0-0-")
+
+    def test_failed_tag_queries_are_stored(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(utils.TagQueryCache, "SETTLE_SECONDS", -1.0)
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        head_commit = _full_id(tmp_path, "HEAD")
+        for expected_queries in (1, 0):
+            stats = utils.GitCallStats()
+            with utils.Git(git_dir.path, stats=stats) as git, pytest.raises(subprocess.CalledProcessError):
+                utils.TagQueryCache(git).run(*utils.Git.describe_arguments(), head_commit=head_commit)
+            assert stats.queries.get("describe", 0) == expected_queries
+
+    def test_recent_ref_changes_are_not_stored(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        with utils.Git(git_dir.path) as git:
+            utils.TagQueryCache(git).run("tag", "--list")
+        # The tag was created too recently to tell a later change from it by modification time
+        assert not (tmp_path / ".git" / utils.SHARED_CACHE_DIRECTORY / utils.TagQueryCache.FILE_NAME).exists()
+
+    def test_concurrent_updates(self, tmp_path):
+        store = utils._SharedStore(tmp_path / "store.json", 1)  # noqa: SLF001 - the store is shared by the caches
+
+        def add(key: str) -> None:
+            store.update(lambda document: document.setdefault("keys", []).append(key))
+
+        threads = [threading.Thread(target=add, args=(str(index),)) for index in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # No update was lost to a concurrent one
+        assert sorted(store.load()["keys"], key=int) == [str(index) for index in range(16)]
+
+
+class TestGitBackends:
+    def test_backend_shared_by_sessions(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        backend = utils.SubprocessBackend()
+        stats = utils.GitCallStats()
+        for _ in range(2):
+            with utils.Git(git_dir.path, stats=stats, backend=backend) as git:
+                git.get_commit_id()
+        backend.close()
+        # The batch process outlives the first session, as the backend belongs to the caller
+        assert stats.queries["cat-file --batch"] == 2
+        assert stats.processes == 1
+
+    def test_record_and_replay(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        recorder = utils.RecordingBackend()
+        with utils.Git(git_dir.path, backend=recorder) as git:
+            commit_id = git.get_commit_id(short=False)
+            branch_name = git.get_branch_name()
+            is_dirty = git.get_is_dirty()
+            assert list(git.stream("rev-list", "HEAD")) == [commit_id]
+        recorder.close()
+        recorder.trace.save(tmp_path / "trace.json")
+
+        stats = utils.GitCallStats()
+        replay = utils.ReplayBackend(utils.GitTrace.load(tmp_path / "trace.json"))
+        with utils.Git(git_dir.path, stats=stats, backend=replay) as git:
+            assert git.get_commit_id(short=False) == commit_id
+            assert git.get_branch_name() == branch_name
+            assert git.get_is_dirty() == is_dirty
+            assert list(git.stream("rev-list", "HEAD")) == [commit_id]
+            with pytest.raises(LookupError):
+                git.run("log")
+        assert stats.processes == 0
+
+    def test_replay_abandoned_stream(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        for index in range(3):
+            (tmp_path / "file.txt").write_text(str(index))
+            git_dir.commit()
+        recorder = utils.RecordingBackend()
+        with utils.Git(git_dir.path, backend=recorder) as git:
+            walk = git.stream("rev-list", "HEAD")
+            first_commit = next(walk)
+            walk.close()
+            with pytest.raises(subprocess.CalledProcessError):
+                list(git.stream("rev-list", "no-such-revision"))
+        recorder.close()
+
+        with utils.Git(git_dir.path, backend=utils.ReplayBackend(recorder.trace)) as git:
+            walk = git.stream("rev-list", "HEAD")
+            assert next(walk) == first_commit
+            # The recording ends where the stream was abandoned
+            with pytest.raises(LookupError, match="trace ends before"):
+                next(walk)
+            with pytest.raises(subprocess.CalledProcessError):
+                list(git.stream("rev-list", "no-such-revision"))
+
+    def test_recording_bypasses_repository_caches(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with utils.Git(git_dir.path, backend=utils.RecordingBackend()) as git:
+            assert utils.CommitCountCache(git).count(None, git.get_commit_id(short=False)) == 1
+        assert not (tmp_path / ".git" / utils.SHARED_CACHE_DIRECTORY).exists()
+
+
+@pytest.fixture
+def hanging_git(tmp_path, monkeypatch):
+    """Replace git on the PATH by a command that never answers."""
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "git").write_text("#!/bin/sh\nexec sleep 30\n")
+    (bin_dir / "git").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+
+class TestDeadline:
+    def test_unlimited(self):
+        deadline = utils.Deadline()
+        assert deadline.remaining() is None
+        with deadline.stage("tag"):
+            assert deadline.remaining() is None
+            assert deadline.stage_name == "tag"
+        assert deadline.stage_name == "collection"
+
+    def test_stage_limit(self):
+        deadline = utils.Deadline(10, stage_limits={"dirty": 1})
+        assert 9 < deadline.remaining() <= 10
+        with deadline.stage("dirty"):
+            assert 0 < deadline.remaining() <= 1
+        assert deadline.remaining() > 1
+
+    def test_invalid_arguments(self):
+        with pytest.raises(ValueError, match="Unknown deadline stage: build"):
+            utils.Deadline(stage_limits={"build": 1})
+        with pytest.raises(ValueError, match="Unknown deadline policy"):
+            utils.Deadline(policy="ignore")
+
+    def test_no_query_after_deadline(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        stats = utils.GitCallStats()
+        with utils.Git(git_dir.path, stats=stats, deadline=utils.Deadline(0)) as git:
+            with pytest.raises(utils.DeadlineExceeded, match="git rev-parse did not finish before the deadline"):
+                git.get_branch_name()
+            with pytest.raises(utils.DeadlineExceeded, match="collection stage"):
+                list(git.stream("rev-list", "HEAD"))
+        assert stats.processes == 0
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="replaces git by a shell script")
+    @pytest.mark.usefixtures("hanging_git")
+    def test_overrunning_git_is_killed(self, tmp_path):
+        deadline = utils.Deadline(stage_limits={"head": 0.2})
+        start = time.monotonic()
+        with utils.Git(tmp_path, deadline=deadline) as git, deadline.stage("head"):
+            with pytest.raises(utils.DeadlineExceeded, match="head stage"):
+                git.run("status")
+            with pytest.raises(utils.DeadlineExceeded, match="git cat-file did not finish"):
+                git.resolve("HEAD")
+            with pytest.raises(utils.DeadlineExceeded, match="git rev-list did not finish"):
+                list(git.stream("rev-list", "HEAD"))
+        assert time.monotonic() - start < 10
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="replaces git by a shell script")
+    @pytest.mark.usefixtures("hanging_git")
+    def test_batch_restarts_after_timeout(self, tmp_path):
+        with utils.GitBatch(tmp_path) as batch:
+            with pytest.raises(subprocess.TimeoutExpired):
+                batch.resolve("HEAD", timeout=0.2)
+            assert not batch.is_running
+
+
+class TestGitBatch:
+    def test_resolve(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        short_id = git_dir.commit()
+        with utils.change_dir(git_dir.path), utils.GitBatch() as batch:
+            full_id = batch.resolve("HEAD")
+            assert len(full_id) == 40
+            assert full_id.startswith(short_id)
+            assert batch.resolve("HEAD^{commit}") == full_id
+            assert batch.resolve("does-not-exist") is None
+            assert batch.resolve("HEAD\nHEAD") is None
+
+    def test_peel_annotated_tag(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with utils.change_dir(git_dir.path):
+            subprocess.check_call(["git", "tag", "-a", "v1.0.0", "-m", "release"])
+            with utils.GitBatch() as batch:
+                commit_id = batch.resolve("HEAD")
+                tag_object_id = batch.resolve("refs/tags/v1.0.0")
+                assert tag_object_id != commit_id
+                assert batch.resolve("refs/tags/v1.0.0^{commit}") == commit_id
+
+    def test_read_commit(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.commit()
+        with utils.change_dir(git_dir.path), utils.GitBatch() as batch:
+            parent_id = batch.resolve("HEAD~1")
+            object_id, object_type, content = batch.read("HEAD")
+            assert object_type == "commit"
+            assert f"parent {parent_id}".encode() in content
+            # Queries after a content read stay in sync
+            assert batch.resolve("HEAD") == object_id
+
+    def test_single_process(self, tmp_path, monkeypatch):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        started = []
+        original_popen = subprocess.Popen
+
+        def counting_popen(*args, **kwargs):
+            process = original_popen(*args, **kwargs)
+            started.append(process)
+            return process
+
+        monkeypatch.setattr(subprocess, "Popen", counting_popen)
+        with utils.change_dir(git_dir.path):
+            batch = utils.GitBatch()
+            for _ in range(10):
+                batch.resolve("HEAD")
+            batch.close()
+            batch.close()  # closing twice is harmless
+        assert len(started) == 1
+        assert started[0].returncode == 0
+
+    def test_not_a_repository(self, tmp_path):
+        with utils.change_dir(tmp_path), utils.GitBatch() as batch, pytest.raises(subprocess.CalledProcessError):
+            batch.resolve("HEAD")
@@ -1,9 +1,25 @@
+import json
+import os
+import subprocess
 from pathlib import Path
 
 import pytest
 
 from tests.utils import GitDir
-from version_builder.version_collector import VersionCollectError, from_file, from_git
+from version_builder.utils import Deadline, GitCallStats, GitTrace, RecordingBackend, ReplayBackend, change_dir
+from version_builder.version_collector import (
+    ARCHIVAL_FILE_TEMPLATE,
+    VersionCollectError,
+    _Git,
+    from_archive,
+    from_env,
+    from_file,
+    from_frozen,
+    from_git,
+    history_from_git,
+    write_frozen,
+)
+from version_builder.version_data import VersionData
 
 
 class TestVersionCollectorGit:
@@ -121,6 +137,71 @@ class TestVersionCollectorGit:
         assert version_data.tag == "1.0.0"
         assert version_data.commits_since_tag == 2
 
+    def test_annotated_tag_on_head(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with change_dir(git_dir.path):
+            subprocess.check_call(["git", "tag", "-a", "v1.0.0", "-m", "release"])
+            subprocess.check_call(["git", "tag", "-a", "v1.0.1", "-m", "release"])
+        with pytest.raises(VersionCollectError, match="multiple valid SemVer tags on commit"):
+            from_git(git_dir.path, use_describe=False)
+
+    @pytest.mark.parametrize("use_describe", [True, False])
+    def test_process_count_independent_of_tag_count(self, tmp_path: Path, monkeypatch, use_describe) -> None:
+        def count_processes(repo_path):
+            started = []
+            original_popen = subprocess.Popen
+
+            def counting_popen(*args, **kwargs):
+                started.append(args)
+                return original_popen(*args, **kwargs)
+
+            monkeypatch.setattr(subprocess, "Popen", counting_popen)
+            from_git(repo_path, use_describe=use_describe)
+            monkeypatch.setattr(subprocess, "Popen", original_popen)
+            return len(started)
+
+        (tmp_path / "few").mkdir()
+        few_tags = GitDir(tmp_path / "few")
+        few_tags.commit()
+        few_tags.tag("v1.0.0")
+        few_tags.commit()
+
+        (tmp_path / "many").mkdir()
+        many_tags = GitDir(tmp_path / "many")
+        for minor in range(20):
+            (many_tags.path / "file.txt").write_text(str(minor))
+            # Tags created in the same second are left to the full search, so each tag gets a second of its own
+            many_tags.commit(date=f"{1700000000 + minor:d} +0000")
+            many_tags.tag(f"v1.{minor}.0")
+            many_tags.tag(f"not-a-version-{minor}")
+        many_tags.commit()
+
+        assert count_processes(few_tags.path) == count_processes(many_tags.path)
+
+    def test_query_count_independent_of_tag_count(self, tmp_path: Path) -> None:
+        def count_queries(repo_path):
+            stats = GitCallStats()
+            from_git(repo_path, use_describe=False, stats=stats)
+            return sum(stats.queries.values())
+
+        (tmp_path / "few").mkdir()
+        few_tags = GitDir(tmp_path / "few")
+        few_tags.commit()
+        few_tags.tag("v1.0.0")
+        few_tags.commit()
+
+        (tmp_path / "many").mkdir()
+        many_tags = GitDir(tmp_path / "many")
+        for minor in range(20):
+            (many_tags.path / "file.txt").write_text(str(minor))
+            many_tags.commit()
+            many_tags.tag(f"v1.{minor}.0")
+        many_tags.commit()
+
+        # Tags are peeled by the listing itself rather than one object lookup per tag
+        assert count_queries(few_tags.path) == count_queries(many_tags.path)
+
     def test_multiple_tags_on_ancestor(self, tmp_path: Path) -> None:
         git_dir = GitDir(tmp_path)
         ancestor_commit = git_dir.commit()
@@ -130,6 +211,543 @@ class TestVersionCollectorGit:
         with pytest.raises(VersionCollectError, match="multiple valid SemVer tags on ancestor commit"):
             from_git(git_dir.path)
 
+    def test_commits_since_tag_across_runs(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.commit()
+        assert from_git(git_dir.path, use_describe=False).commits_since_tag == 1
+        git_dir.commit()
+        git_dir.commit()
+        assert from_git(git_dir.path, use_describe=False).commits_since_tag == 3
+        # Counts are remembered per tagged commit, so a tag moved to another commit is counted from there
+        with change_dir(git_dir.path):
+            subprocess.check_call(["git", "tag", "--force", "v1.0.0", "HEAD~1"])
+        assert from_git(git_dir.path, use_describe=False).commits_since_tag == 1
+
+
+class TestVersionCollectorGitHighestStrategy:
+    def test_highest_precedence_wins_over_newer_tag(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v2.0.0")
+        git_dir.commit()
+        git_dir.tag("v1.5.3")  # e.g. a back-ported patch release tagged later
+        git_dir.commit()
+        version_data = from_git(git_dir.path, tag_strategy="highest")
+        assert version_data.tag == "2.0.0"
+        assert version_data.commits_since_tag == 2
+
+    def test_release_above_prerelease(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("1.0.0")
+        git_dir.commit()
+        git_dir.tag("1.0.0-rc.10")
+        git_dir.commit()
+        git_dir.tag("1.0.0-rc.9")
+        version_data = from_git(git_dir.path, tag_strategy="highest")
+        assert version_data.tag == "1.0.0"
+        assert version_data.commits_since_tag == 2
+
+    def test_unreachable_tags_ignored(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.create_branch("main")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.create_branch("feature")
+        git_dir.commit()
+        git_dir.tag("v9.0.0")
+        git_dir.checkout("main")
+        (git_dir.path / "main.txt").write_text("")  # keep the commit distinct from the one on feature
+        git_dir.commit()
+        version_data = from_git(git_dir.path, tag_strategy="highest")
+        assert version_data.tag == "1.0.0"
+        assert version_data.commits_since_tag == 1
+
+    def test_annotated_tags(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with change_dir(git_dir.path):
+            subprocess.check_call(["git", "tag", "-a", "v3.1.0", "-m", "release"])
+        git_dir.commit()
+        version_data = from_git(git_dir.path, tag_strategy="highest")
+        assert version_data.tag == "3.1.0"
+        assert version_data.commits_since_tag == 1
+
+    def test_invalid_tags_are_ignored(self, tmp_path: Path, capsys) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("99.0.0.1")
+        version_data = from_git(git_dir.path, tag_strategy="highest")
+        assert version_data.tag == "0.0.0-UNTAGGED"
+        captured = capsys.readouterr()
+        assert "No valid SemVer tags found in git history. Using '0.0.0-UNTAGGED'." in captured.out
+
+    def test_multiple_tags_on_ancestor(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.tag("v1.0.1")
+        git_dir.commit()
+        with pytest.raises(VersionCollectError, match="multiple valid SemVer tags on ancestor commit"):
+            from_git(git_dir.path, tag_strategy="highest")
+
+    def test_unknown_strategy(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with pytest.raises(ValueError, match="Unknown tag strategy"):
+            from_git(git_dir.path, tag_strategy="newest")
+
+
+class TestVersionCollectorGitNearestStrategy:
+    def test_nearest_wins_over_newer_tag(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        older_commit = git_dir.commit()
+        git_dir.commit()
+        git_dir.tag("v1.1.0")
+        git_dir.commit()
+        git_dir.tag("v1.0.1", older_commit)  # tagged later, but further from HEAD
+        version_data = from_git(git_dir.path, tag_strategy="nearest")
+        assert version_data.tag == "1.1.0"
+        assert version_data.commits_since_tag == 1
+
+    def test_tagged_head(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v0.9.0")
+        git_dir.commit()
+        with change_dir(git_dir.path):
+            subprocess.check_call(["git", "tag", "-a", "v1.0.0", "-m", "release"])
+        version_data = from_git(git_dir.path, tag_strategy="nearest")
+        assert version_data.tag == "1.0.0"
+        assert version_data.commits_since_tag == 0
+
+    def test_commits_counted_across_merges(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.create_branch("main")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.create_branch("feature")
+        (git_dir.path / "feature.txt").write_text("")
+        git_dir.commit()
+        git_dir.commit()
+        git_dir.checkout("main")
+        (git_dir.path / "main.txt").write_text("")
+        git_dir.commit()
+        with change_dir(git_dir.path):
+            subprocess.check_call(["git", "merge", "--no-edit", "--quiet", "feature"])
+        version_data = from_git(git_dir.path, tag_strategy="nearest")
+        assert version_data.tag == "1.0.0"
+        # Two feature commits, one main commit and the merge
+        assert version_data.commits_since_tag == 4
+
+    def test_invalid_and_unreachable_tags_are_ignored(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.create_branch("main")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.create_branch("feature")
+        git_dir.commit()
+        git_dir.tag("v9.0.0")
+        git_dir.checkout("main")
+        (git_dir.path / "main.txt").write_text("")
+        git_dir.commit()
+        git_dir.tag("release-candidate")
+        version_data = from_git(git_dir.path, tag_strategy="nearest")
+        assert version_data.tag == "1.0.0"
+        assert version_data.commits_since_tag == 1
+
+    def test_untagged(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.commit()
+        version_data = from_git(git_dir.path, tag_strategy="nearest")
+        assert version_data.tag == "0.0.0-UNTAGGED"
+        assert version_data.commits_since_tag == 2
+
+    def test_multiple_tags_on_ancestor(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.tag("v1.0.1")
+        git_dir.commit()
+        with pytest.raises(VersionCollectError, match="multiple valid SemVer tags on ancestor commit"):
+            from_git(git_dir.path, tag_strategy="nearest")
+
+
+class TestVersionCollectorGitDescribe:
+    def _forbid_history_search(self, monkeypatch):
+        def fail(*_args, **_kwargs):
+            msg = "full history search should not be needed"
+            raise AssertionError(msg)
+
+        monkeypatch.setattr(_Git, "_find_version_from_history", fail)
+
+    def test_tag_on_head_resolved_by_describe(self, tmp_path: Path, monkeypatch) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.4.0")
+        self._forbid_history_search(monkeypatch)
+        version_data = from_git(git_dir.path)
+        assert version_data.tag == "1.4.0"
+        assert version_data.commits_since_tag == 0
+
+    def test_tag_near_head_resolved_by_describe(self, tmp_path: Path, monkeypatch) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("not-a-version")
+        git_dir.commit()
+        git_dir.tag("1.4.0-rc.1")
+        git_dir.commit()
+        git_dir.commit()
+        self._forbid_history_search(monkeypatch)
+        version_data = from_git(git_dir.path)
+        assert version_data.tag == "1.4.0-rc.1"
+        assert version_data.commits_since_tag == 2
+
+    def test_describe_depth_not_used_as_count(self, tmp_path: Path, monkeypatch) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit(date="1700000100 +0000")
+        parent_commit_id = git_dir.commit(date="1700001000 +0000")
+        # Committed before its parent, so describe walks the parent first and counts it although the tag reaches it
+        git_dir.commit(date="1700000010 +0000")
+        git_dir.tag("v1.0.0")
+        with change_dir(git_dir.path):
+            merge_commit_id = subprocess.check_output(
+                ["git", "commit-tree", "HEAD^{tree}", "-p", "HEAD", "-p", parent_commit_id, "-m", "merge"],
+                env={**os.environ, "GIT_COMMITTER_DATE": "1700002000 +0000"},
+                text=True,
+            ).strip()
+            subprocess.check_call(["git", "reset", "--quiet", "--hard", merge_commit_id])
+            assert subprocess.check_output(["git", "describe", "--tags", "--long"], text=True).startswith("v1.0.0-3-")
+        self._forbid_history_search(monkeypatch)
+        version_data = from_git(git_dir.path)
+        assert (version_data.tag, version_data.commits_since_tag) == ("1.0.0", 1)
+
+    def test_tag_created_in_same_second_falls_back(self, tmp_path: Path, monkeypatch) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit(date="1700000000 +0000")
+        git_dir.tag("v1.1.0")
+        git_dir.commit(date="1700000000 +0000")
+        git_dir.tag("v1.0.0")
+        git_dir.commit()
+        history_searches = []
+        original_search = _Git._find_version_from_history  # noqa: SLF001 - wrapped to observe the fallback
+
+        def search(collector, head_commit_id_full):
+            history_searches.append(head_commit_id_full)
+            return original_search(collector, head_commit_id_full)
+
+        monkeypatch.setattr(_Git, "_find_version_from_history", search)
+        # Either tag may be the newer one, so describe does not pick the nearer one by itself
+        assert from_git(git_dir.path) == from_git(git_dir.path, use_describe=False)
+        assert len(history_searches) == 2
+
+    def test_invalid_nearest_tag_falls_back(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.commit()
+        git_dir.tag("1.2.3.4")  # Passes the describe prefilter, but is not SemVer
+        version_data = from_git(git_dir.path)
+        assert version_data.tag == "1.0.0"
+        assert version_data.commits_since_tag == 1
+
+    def test_describe_disabled(self, tmp_path: Path, monkeypatch) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("v1.4.0")
+        git_dir.commit()
+
+        def fail(*_args, **_kwargs):
+            msg = "describe should not be used"
+            raise AssertionError(msg)
+
+        monkeypatch.setattr(_Git, "_find_version_from_description", fail)
+        version_data = from_git(git_dir.path, use_describe=False)
+        assert version_data.tag == "1.4.0"
+        assert version_data.commits_since_tag == 1
+
+    def test_merged_backport_tagged_later(self, tmp_path: Path) -> None:
+        def annotated_tag(name: str, date: str) -> None:
+            with change_dir(git_dir.path):
+                subprocess.check_call(
+                    ["git", "tag", "-a", name, "-m", "release"], env={**os.environ, "GIT_COMMITTER_DATE": date}
+                )
+
+        git_dir = GitDir(tmp_path)
+        git_dir.create_branch("main")
+        git_dir.commit()
+        annotated_tag("v1.0.0", "2024-01-01T00:00:00")
+        git_dir.create_branch("release")
+        git_dir.checkout("main")
+        (git_dir.path / "main.txt").write_text("")
+        git_dir.commit()
+        annotated_tag("v1.1.0", "2024-02-01T00:00:00")
+        git_dir.checkout("release")
+        (git_dir.path / "release.txt").write_text("")
+        git_dir.commit()
+        annotated_tag("v1.0.1", "2024-03-01T00:00:00")
+        git_dir.checkout("main")
+        with change_dir(git_dir.path):
+            subprocess.check_call(["git", "merge", "--no-ff", "--no-edit", "--quiet", "release"])
+
+        # The backport is tagged most recently, although the tag of main is nearer to the merge
+        version_data = from_git(git_dir.path)
+        assert (version_data.tag, version_data.commits_since_tag) == ("1.0.1", 2)
+        assert version_data == from_git(git_dir.path, use_describe=False)
+
+
+class TestVersionCollectorReplay:
+    @pytest.mark.parametrize("tag_strategy", ["creatordate", "highest", "nearest"])
+    def test_replay_matches_recording(self, tmp_path: Path, monkeypatch, tag_strategy) -> None:
+        (tmp_path / "repo").mkdir()
+        git_dir = GitDir(tmp_path / "repo")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.commit()
+        git_dir.tag("not-a-version")
+        git_dir.commit()
+        recorder = RecordingBackend()
+        recorded = from_git(git_dir.path, tag_strategy=tag_strategy, backend=recorder)
+        recorder.close()
+        recorder.trace.save(tmp_path / "trace.json")
+
+        def no_process(*_args, **_kwargs):
+            pytest.fail("a replayed collection must not start git")
+
+        monkeypatch.setattr(subprocess, "Popen", no_process)
+        replayed = from_git(
+            git_dir.path, tag_strategy=tag_strategy, backend=ReplayBackend(GitTrace.load(tmp_path / "trace.json"))
+        )
+        assert replayed == recorded
+        assert replayed.commits_since_tag == 2
+
+    def test_replay_untagged(self, tmp_path: Path, capsys) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        recorder = RecordingBackend()
+        recorded = from_git(git_dir.path, backend=recorder)
+        recorder.close()
+        assert from_git(git_dir.path, backend=ReplayBackend(recorder.trace)) == recorded
+        assert capsys.readouterr().out.count("0.0.0-UNTAGGED") == 2
+
+    def test_replay_file(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        (tmp_path / "version.txt").write_text("2.1.0")
+        git_dir.commit()
+        recorder = RecordingBackend()
+        recorded = from_file(str(tmp_path / "version.txt"), backend=recorder)
+        recorder.close()
+        assert from_file(str(tmp_path / "version.txt"), backend=ReplayBackend(recorder.trace)) == recorded
+
+    def test_query_missing_from_trace(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        recorder = RecordingBackend()
+        from_git(git_dir.path, backend=recorder)
+        recorder.close()
+        with pytest.raises(LookupError, match="git trace has no answer"):
+            from_git(git_dir.path, tag_strategy="highest", backend=ReplayBackend(recorder.trace))
+
+
+class TestVersionCollectorGitRevision:
+    @staticmethod
+    def _create_branches(git_dir: GitDir) -> str:
+        git_dir.create_branch("main")
+        git_dir.commit(date="1700000000 +0000")
+        git_dir.tag("v1.0.0")
+        git_dir.create_branch("feature")
+        (git_dir.path / "feature.txt").write_text("")
+        git_dir.commit()
+        feature_commit_id = git_dir.commit()
+        git_dir.checkout("main")
+        git_dir.commit(date="1700000001 +0000")
+        git_dir.tag("v2.0.0")
+        return feature_commit_id
+
+    @pytest.mark.parametrize("tag_strategy", ["creatordate", "highest", "nearest"])
+    def test_branch(self, tmp_path: Path, tag_strategy) -> None:
+        git_dir = GitDir(tmp_path)
+        feature_commit_id = self._create_branches(git_dir)
+        (git_dir.path / "untracked.txt").write_text("")
+        version_data = from_git(git_dir.path, tag_strategy=tag_strategy, revision="feature")
+        assert version_data.tag == "1.0.0"
+        assert version_data.commits_since_tag == 2
+        assert version_data.commit_id == feature_commit_id
+        assert version_data.branch_name == "feature"
+        assert not version_data.is_dirty
+        assert not version_data.is_dirty_applicable
+        # The checked out HEAD is unaffected
+        head_version_data = from_git(git_dir.path, tag_strategy=tag_strategy)
+        assert head_version_data.tag == "2.0.0"
+        assert head_version_data.is_dirty
+
+    def test_head_checks_working_tree(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        self._create_branches(git_dir)
+        (git_dir.path / "untracked.txt").write_text("")
+        # HEAD has the working tree checked out, so its version is the one collected without a revision
+        version_data = from_git(git_dir.path, revision="HEAD")
+        assert version_data.is_dirty_applicable
+        assert version_data.is_dirty
+        assert version_data.branch_name == "main"
+        assert version_data == from_git(git_dir.path)
+
+    def test_commit_and_tag(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        feature_commit_id = self._create_branches(git_dir)
+        version_data = from_git(git_dir.path, revision=f"{feature_commit_id:s}~1")
+        assert version_data.commits_since_tag == 1
+        assert version_data.branch_name == "HEAD"
+        version_data = from_git(git_dir.path, revision="v1.0.0")
+        assert version_data.qualified_version.startswith("1.0.0+sha.")
+        assert version_data.branch_name == "HEAD"
+
+    def test_describe_matches_history_search(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        self._create_branches(git_dir)
+        assert from_git(git_dir.path, revision="feature") == from_git(
+            git_dir.path, revision="feature", use_describe=False
+        )
+
+    def test_unknown_revision(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with pytest.raises(VersionCollectError, match="revision 'nope' does not name a commit"):
+            from_git(git_dir.path, revision="nope")
+        with pytest.raises(ValueError, match="Invalid revision"):
+            from_git(git_dir.path, revision="--all")
+
+
+class TestVersionCollectorHistory:
+    @staticmethod
+    def _create_history(git_dir: GitDir) -> None:
+        git_dir.create_branch("main")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.create_branch("feature")
+        for index in range(2):
+            (git_dir.path / "feature.txt").write_text(str(index))
+            git_dir.commit()
+        git_dir.tag("1.1.0-rc.1")
+        git_dir.checkout("main")
+        (git_dir.path / "main.txt").write_text("")
+        git_dir.commit()
+        with change_dir(git_dir.path):
+            subprocess.check_call(["git", "merge", "--no-edit", "--quiet", "feature"])
+        git_dir.commit()
+
+    @pytest.mark.parametrize("tag_strategy", ["creatordate", "highest"])
+    def test_matches_collection_at_each_commit(self, tmp_path: Path, tag_strategy) -> None:
+        git_dir = GitDir(tmp_path)
+        self._create_history(git_dir)
+        history = list(history_from_git(git_dir.path, "main", tag_strategy=tag_strategy))
+        assert len(history) == 6
+        for commit_id_full, version_data in history:
+            git_dir.checkout(commit_id_full)
+            assert version_data == from_git(git_dir.path, tag_strategy=tag_strategy, use_describe=False)
+        # The main commit, the merge and the commit after it
+        assert history[-1][1].tag == "1.1.0-rc.1"
+        assert history[-1][1].commits_since_tag == 3
+
+    def test_range(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        self._create_history(git_dir)
+        history = list(history_from_git(git_dir.path, "feature..main"))
+        # The main commit, the merge and the commit after it, oldest first
+        assert [version_data.tag for _, version_data in history] == ["1.0.0", "1.1.0-rc.1", "1.1.0-rc.1"]
+        assert [version_data.commits_since_tag for _, version_data in history] == [1, 2, 3]
+        assert list(history_from_git(git_dir.path, "main..feature")) == []
+        assert len(list(history_from_git(git_dir.path, "..feature"))) == 0
+
+    def test_untagged(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.commit()
+        history = list(history_from_git(git_dir.path, "HEAD"))
+        assert [version_data.qualified_version.split("+")[0] for _, version_data in history] == ["0.0.0-UNTAGGED"] * 2
+        assert [version_data.commits_since_tag for _, version_data in history] == [1, 2]
+
+    def test_ambiguous_tags(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("1.0.0")
+        git_dir.tag("v1.0.1")
+        short_id = git_dir.commit()
+        history = list(history_from_git(git_dir.path, "HEAD", tag_strategy="highest"))
+        assert [type(version_data) for _, version_data in history] == [VersionCollectError] * 2
+        assert "multiple valid SemVer tags on commit" in str(history[0][1])
+        assert "ancestor commit" in str(history[1][1])
+        assert short_id not in str(history[1][1])
+
+    def test_unknown_revision(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with pytest.raises(VersionCollectError, match="'nope' does not name a commit"):
+            list(history_from_git(git_dir.path, "nope..HEAD"))
+
+    def test_single_walk(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        self._create_history(git_dir)
+        stats = GitCallStats()
+        list(history_from_git(git_dir.path, "main", stats=stats))
+        assert stats.queries["rev-list"] == 1
+        assert stats.processes == 3
+
+    def test_unsupported_strategy(self, tmp_path: Path) -> None:
+        with pytest.raises(ValueError, match="Unknown history tag strategy"):
+            history_from_git(tmp_path, "HEAD", tag_strategy="nearest")
+
+
+class TestVersionCollectorDeadline:
+    def test_deadline_passed(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with pytest.raises(VersionCollectError, match="before the deadline of the head stage"):
+            from_git(git_dir.path, deadline=Deadline(0))
+
+    def test_tag_stage_fails_under_degrade_policy(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with pytest.raises(VersionCollectError, match="before the deadline of the tag stage"):
+            from_git(git_dir.path, deadline=Deadline(stage_limits={"tag": 0}, policy="degrade"))
+
+    def test_dirty_stage_fails(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("1.0.0")
+        with pytest.raises(VersionCollectError, match="before the deadline of the dirty stage"):
+            from_git(git_dir.path, deadline=Deadline(stage_limits={"dirty": 0}))
+
+    def test_dirty_stage_degrades(self, tmp_path: Path, capsys) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("1.0.0")
+        version_data = from_git(git_dir.path, deadline=Deadline(stage_limits={"dirty": 0}, policy="degrade"))
+        assert version_data.is_dirty_unknown
+        assert version_data.is_dirty
+        assert version_data.full_build_metadata.endswith(".dirty-unknown")
+        assert version_data.base_version == "1.0.0"
+        assert "marked dirty-unknown" in capsys.readouterr().out
+
+    def test_file_dirty_stage_degrades(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        (tmp_path / "version.txt").write_text("2.1.0")
+        git_dir.commit()
+        version_data = from_file(
+            str(tmp_path / "version.txt"), deadline=Deadline(stage_limits={"dirty": 0}, policy="degrade")
+        )
+        assert version_data.is_dirty_unknown
+
+    def test_generous_deadline(self, tmp_path: Path) -> None:
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        git_dir.tag("1.0.0")
+        version_data = from_git(git_dir.path, deadline=Deadline(60, stage_limits={"dirty": 30}))
+        assert version_data == from_git(git_dir.path)
+
 
 class TestVersionCollectorFile:
     def test_valid_file_in_repo(self, tmp_path):
@@ -177,3 +795,252 @@ class TestVersionCollectorFile:
         dirty_file.write_text("")
         version_data = from_file(file)
         assert version_data.is_dirty
+
+
+class TestVersionCollectorEnv:
+    _SHA = "0123456789abcdef0123456789abcdef01234567"
+
+    def test_github_tag_build(self):
+        environ = {"GITHUB_ACTIONS": "true", "GITHUB_SHA": self._SHA, "GITHUB_REF": "refs/tags/v1.2.3"}
+        version_data = from_env("auto", environ=environ)
+        assert version_data.tag == "1.2.3"
+        assert version_data.commit_id == "0123456"
+        assert version_data.branch_name == "HEAD"
+        assert not version_data.is_dirty
+        assert version_data.commits_since_tag == 0
+
+    def test_github_pull_request(self):
+        environ = {
+            "GITHUB_SHA": self._SHA,
+            "GITHUB_REF": "refs/pull/7/merge",
+            "GITHUB_HEAD_REF": "feature",
+        }
+        version_data = from_env("github", environ=environ)
+        assert version_data.tag == "0.0.0-UNTAGGED"
+        assert version_data.qualified_version == "0.0.0-UNTAGGED+sha.0123456"
+        assert version_data.branch_name == "feature"
+
+    def test_untagged_build_number(self):
+        environ = {"GITLAB_CI": "true", "CI_COMMIT_SHA": self._SHA, "CI_COMMIT_BRANCH": "main", "CI_PIPELINE_IID": "42"}
+        version_data = from_env("auto", environ=environ)
+        assert version_data.qualified_version == "0.0.0-UNTAGGED+build.42.sha.0123456"
+        assert version_data.branch_name == "main"
+        # A tag build is versioned by its tag alone
+        version_data = from_env("auto", environ={**environ, "CI_COMMIT_TAG": "v1.0.0"})
+        assert version_data.qualified_version == "1.0.0+sha.0123456"
+
+    def test_invalid_build_number(self):
+        environ = {"GIT_COMMIT": self._SHA, "BUILD_NUMBER": "1.2"}
+        with pytest.raises(VersionCollectError, match="not a valid build metadata identifier"):
+            from_env("jenkins", environ=environ)
+
+    def test_gitlab(self):
+        environ = {"GITLAB_CI": "true", "CI_COMMIT_SHA": self._SHA, "CI_COMMIT_TAG": "3.0.0", "CI_COMMIT_BRANCH": ""}
+        version_data = from_env("auto", environ=environ)
+        assert version_data.tag == "3.0.0"
+        assert version_data.branch_name == "HEAD"
+
+    def test_jenkins_branch_prefix(self):
+        environ = {"GIT_COMMIT": self._SHA, "GIT_BRANCH": "origin/release", "TAG_NAME": "v4.1.0"}
+        version_data = from_env("jenkins", environ=environ)
+        assert version_data.tag == "4.1.0"
+        assert version_data.branch_name == "release"
+
+    def test_mapping_file(self, tmp_path: Path):
+        mapping = tmp_path / "mapping.json"
+        mapping.write_text(json.dumps({"commit_id": "MY_SHA", "branch_name": ["MY_BRANCH"], "tag": ["MY_TAG"]}))
+        environ = {"MY_SHA": self._SHA, "MY_BRANCH": "main", "MY_TAG": "v2.0.0-rc.1"}
+        version_data = from_env(str(mapping), environ=environ)
+        assert version_data.tag == "2.0.0-rc.1"
+        assert version_data.branch_name == "main"
+
+    def test_invalid_mapping_file(self, tmp_path: Path):
+        mapping = tmp_path / "mapping.json"
+        mapping.write_text(json.dumps({"sha": "MY_SHA"}))
+        with pytest.raises(VersionCollectError, match="environment mapping must be an object"):
+            from_env(str(mapping), environ={})
+        with pytest.raises(VersionCollectError, match="neither a CI provider nor a readable JSON file"):
+            from_env(str(tmp_path / "missing.json"), environ={})
+
+    def test_no_provider_detected(self):
+        with pytest.raises(VersionCollectError, match="no supported CI provider detected"):
+            from_env("auto", environ={"GITHUB_SHA": self._SHA})
+
+    def test_missing_commit(self):
+        with pytest.raises(VersionCollectError, match="no commit is set"):
+            from_env("gitlab", environ={"CI_COMMIT_TAG": "1.0.0"})
+
+    def test_no_subprocesses(self, monkeypatch):
+        def fail(*_args, **_kwargs):
+            msg = "no subprocess should be started"
+            raise AssertionError(msg)
+
+        monkeypatch.setattr(subprocess, "Popen", fail)
+        monkeypatch.setenv("GITHUB_ACTIONS", "true")
+        monkeypatch.setenv("GITHUB_SHA", self._SHA)
+        monkeypatch.setenv("GITHUB_REF", "refs/tags/1.0.0")
+        assert from_env().tag == "1.0.0"
+
+
+class TestVersionCollectorArchive:
+    def _create_repo(self, path: Path) -> GitDir:
+        path.mkdir()
+        git_dir = GitDir(path)
+        (git_dir.path / ".git_archival.txt").write_text(ARCHIVAL_FILE_TEMPLATE)
+        (git_dir.path / ".gitattributes").write_text(".git_archival.txt export-subst\n")
+        return git_dir
+
+    def test_tagged_commit(self, tmp_path: Path, monkeypatch) -> None:
+        git_dir = self._create_repo(tmp_path / "repo")
+        git_dir.create_branch("main")
+        commit_id = git_dir.commit()
+        git_dir.tag("v1.2.3-rc.1")
+        git_dir.tag("not-semver")
+        git_dir.export_archive(tmp_path / "export")
+
+        def fail(*_args, **_kwargs):
+            msg = "no subprocess should be started"
+            raise AssertionError(msg)
+
+        monkeypatch.setattr(subprocess, "Popen", fail)
+        version_data = from_archive(tmp_path / "export" / ".git_archival.txt")
+        assert version_data.tag == "1.2.3-rc.1"
+        assert version_data.commit_id == commit_id
+        assert version_data.branch_name == "main"
+        assert version_data.commits_since_tag == 0
+        assert not version_data.is_dirty
+
+    def test_commits_since_tag(self, tmp_path: Path) -> None:
+        git_dir = self._create_repo(tmp_path / "repo")
+        git_dir.commit()
+        git_dir.tag("v2.0.0")
+        git_dir.commit()
+        git_dir.tag("nightly")  # Tags not shaped like a version are not described
+        commit_id = git_dir.commit()
+        git_dir.export_archive(tmp_path / "export")
+        version_data = from_archive(tmp_path / "export" / ".git_archival.txt")
+        assert version_data.tag == "2.0.0"
+        assert version_data.commits_since_tag == 2
+        assert version_data.commit_id == commit_id
+
+    def test_detached_export(self, tmp_path: Path) -> None:
+        git_dir = self._create_repo(tmp_path / "repo")
+        commit_id = git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.commit()
+        git_dir.export_archive(tmp_path / "export", commit_id)
+        version_data = from_archive(tmp_path / "export" / ".git_archival.txt")
+        assert version_data.branch_name == "HEAD"
+        assert version_data.commit_id == commit_id
+
+    def test_untagged(self, tmp_path: Path, capsys) -> None:
+        git_dir = self._create_repo(tmp_path / "repo")
+        git_dir.commit()
+        git_dir.export_archive(tmp_path / "export")
+        version_data = from_archive(tmp_path / "export" / ".git_archival.txt")
+        assert version_data.tag == "0.0.0-UNTAGGED"
+        captured = capsys.readouterr()
+        assert "No valid SemVer tags found in git archive metadata." in captured.out
+
+    def test_multiple_tags_on_commit(self, tmp_path: Path) -> None:
+        git_dir = self._create_repo(tmp_path / "repo")
+        git_dir.commit()
+        git_dir.tag("v1.0.0")
+        git_dir.tag("v1.0.1")
+        git_dir.export_archive(tmp_path / "export")
+        with pytest.raises(VersionCollectError, match="multiple valid SemVer tags on commit"):
+            from_archive(tmp_path / "export" / ".git_archival.txt")
+
+    def test_tag_from_ref_names_only(self, tmp_path: Path) -> None:
+        archival_file = tmp_path / ".git_archival.txt"
+        archival_file.write_text(
+            "node: 0123456789abcdef0123456789abcdef01234567\n"
+            "describe-name: %(describe:tags=true)\n"
+            "ref-names: HEAD -> release, tag: v3.1.4\n"
+        )
+        version_data = from_archive(archival_file)
+        assert version_data.tag == "3.1.4"
+        assert version_data.branch_name == "release"
+
+    def test_not_expanded(self, tmp_path: Path) -> None:
+        archival_file = tmp_path / ".git_archival.txt"
+        archival_file.write_text(ARCHIVAL_FILE_TEMPLATE)
+        with pytest.raises(VersionCollectError, match="not expanded by git archive"):
+            from_archive(archival_file)
+
+
+class TestVersionCollectorFrozen:
+    _VERSION_DATA = VersionData(
+        tag="1.2.3-rc.1", commit_id="abcd123", branch_name="main", is_dirty=True, commits_since_tag=4
+    )
+
+    def test_round_trip(self, tmp_path: Path, monkeypatch) -> None:
+        record = tmp_path / "version.json"
+        write_frozen(self._VERSION_DATA, record)
+
+        def fail(*_args, **_kwargs):
+            msg = "no subprocess should be started"
+            raise AssertionError(msg)
+
+        monkeypatch.setattr(subprocess, "Popen", fail)
+        assert from_frozen(record) == self._VERSION_DATA
+
+    def test_record_contents(self, tmp_path: Path) -> None:
+        record = tmp_path / "version.json"
+        write_frozen(self._VERSION_DATA, record)
+        contents = json.loads(record.read_text())
+        assert contents["qualified_version"] == "1.2.3-rc.1+dev.4.sha.abcd123.dirty"
+        assert contents["version"]["commits_since_tag"] == 4
+
+    def test_dirty_unknown_round_trip(self, tmp_path: Path) -> None:
+        record = tmp_path / "version.json"
+        version_data = VersionData(tag="1.2.3", commit_id="abcd123", branch_name="main", is_dirty_unknown=True)
+        write_frozen(version_data, record)
+        assert json.loads(record.read_text())["version"]["is_dirty_unknown"] is True
+        assert from_frozen(record) == version_data
+
+        write_frozen(self._VERSION_DATA, record)
+        assert "is_dirty_unknown" not in json.loads(record.read_text())["version"]
+
+    def test_dirty_not_applicable_round_trip(self, tmp_path: Path) -> None:
+        record = tmp_path / "version.json"
+        version_data = VersionData(tag="1.2.3", commit_id="abcd123", branch_name="main", is_dirty_applicable=False)
+        write_frozen(version_data, record)
+        assert json.loads(record.read_text())["version"]["is_dirty_applicable"] is False
+        assert from_frozen(record) == version_data
+
+    def test_content_fingerprint_round_trip(self, tmp_path: Path) -> None:
+        record = tmp_path / "version.json"
+        version_data = self._VERSION_DATA.with_content_fingerprint("0123456789abcdef")
+        write_frozen(version_data, record)
+        assert json.loads(record.read_text())["version"]["content_fingerprint"] == "0123456789abcdef"
+        assert from_frozen(record) == version_data
+        assert from_frozen(record).qualified_version == version_data.qualified_version
+
+    def test_tampered_record(self, tmp_path: Path) -> None:
+        record = tmp_path / "version.json"
+        write_frozen(self._VERSION_DATA, record)
+        contents = json.loads(record.read_text())
+        contents["version"]["tag"] = "9.9.9"
+        record.write_text(json.dumps(contents))
+        with pytest.raises(VersionCollectError, match="does not match its checksum"):
+            from_frozen(record)
+
+    def test_incomplete_record(self, tmp_path: Path) -> None:
+        record = tmp_path / "version.json"
+        write_frozen(self._VERSION_DATA, record)
+        contents = json.loads(record.read_text())
+        del contents["version"]["branch_name"]
+        record.write_text(json.dumps(contents))
+        with pytest.raises(VersionCollectError, match="is incomplete"):
+            from_frozen(record)
+
+    def test_unsupported_format(self, tmp_path: Path) -> None:
+        record = tmp_path / "version.json"
+        record.write_text(json.dumps({"format": 99}))
+        with pytest.raises(VersionCollectError, match="unsupported format"):
+            from_frozen(record)
+
+    def test_unreadable_record(self, tmp_path: Path) -> None:
+        with pytest.raises(VersionCollectError, match="is not readable"):
+            from_frozen(tmp_path / "missing.json")
@@ -1,6 +1,9 @@
+import pickle
+from itertools import pairwise
+
 import pytest
 
-from version_builder.version_data import VersionData, VersionParseError
+from version_builder.version_data import VersionData, VersionParseError, precedence_key
 
 
 class TestVersionDataSemVerParsing:
@@ -139,6 +142,23 @@ class TestVersionDataDevelopmentFlag:
         )
         assert data.is_development_build
 
+    def test_dirty_unknown(self):
+        data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", is_dirty_unknown=True)
+        assert data.is_dirty
+        assert data.is_development_build
+        assert data.qualified_version == "1.2.3+sha.abcd1234.dirty-unknown"
+        assert data != VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", is_dirty=True)
+
+    def test_dirty_not_applicable(self):
+        data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", is_dirty_applicable=False)
+        assert not data.is_dirty
+        assert data.qualified_version == "1.2.3+sha.abcd1234"
+        assert data != VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch")
+        with pytest.raises(ValueError, match="cannot be dirty"):
+            VersionData(
+                tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", is_dirty=True, is_dirty_applicable=False
+            )
+
 
 class TestVersionDataTime:
     def test_never_set(self):
@@ -151,9 +171,18 @@ class TestVersionDataTime:
         data = VersionData(
             tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", is_dirty=False, commits_since_tag=0
         )
-        data.set_time()
+        with pytest.deprecated_call():
+            data.set_time()
         assert data.time != ""
 
+    def test_with_time(self):
+        data = VersionData(
+            tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", is_dirty=False, commits_since_tag=0
+        )
+        stamped = data.with_time()
+        assert stamped.time != ""
+        assert data.time == ""
+
 
 class TestVersionDataCargoVersion:
     def test_never_set(self):
@@ -167,5 +196,127 @@ class TestVersionDataCargoVersion:
             tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", is_dirty=False, commits_since_tag=0
         )
         cargo_ver = "0.0.1"
-        data.set_cargo_version(cargo_ver)
+        with pytest.deprecated_call():
+            data.set_cargo_version(cargo_ver)
         assert data.cargo_version == cargo_ver
+
+    def test_with_cargo_version(self):
+        data = VersionData(
+            tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", is_dirty=False, commits_since_tag=0
+        )
+        cargo_ver = "0.0.1"
+        stamped = data.with_cargo_version(cargo_ver)
+        assert stamped.cargo_version == cargo_ver
+        assert data.cargo_version == ""
+
+
+class TestVersionDataContentFingerprint:
+    def test_never_set(self):
+        data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch")
+        assert data.content_fingerprint == ""
+        assert data.qualified_version == "1.2.3+sha.abcd1234"
+
+    def test_set_called(self):
+        data = VersionData(tag="1.2.3-rc.1+build.5", commit_id="abcd1234", branch_name="myBranch", is_dirty=True)
+        stamped = data.with_content_fingerprint("0123456789abcdef0123")
+        assert stamped.content_fingerprint == "0123456789abcdef0123"
+        assert stamped.qualified_version == "1.2.3-rc.1+build.5.sha.abcd1234.content.0123456789ab.dirty"
+        assert stamped.full_build_metadata == "build.5.sha.abcd1234.content.0123456789ab.dirty"
+        assert data.qualified_version == "1.2.3-rc.1+build.5.sha.abcd1234.dirty"
+        assert stamped != data
+        assert stamped.precedence_key == data.precedence_key
+
+    def test_constructor_argument(self):
+        data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch", content_fingerprint="abc")
+        assert data == VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch").with_content_fingerprint(
+            "abc"
+        )
+
+    @pytest.mark.parametrize("content_fingerprint", ["ABCDEF", "not-hex", "abc.def"])
+    def test_invalid(self, content_fingerprint):
+        data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch")
+        with pytest.raises(ValueError, match="not a lowercase hexadecimal digest"):
+            data.with_content_fingerprint(content_fingerprint)
+        with pytest.raises(TypeError):
+            data.with_content_fingerprint(None)
+
+
+class TestVersionDataImmutability:
+    def test_fields_cannot_be_assigned(self):
+        data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch")
+        with pytest.raises(AttributeError):
+            data.tag = "2.0.0"
+        with pytest.raises(AttributeError):
+            data.new_field = "value"
+        with pytest.raises(AttributeError):
+            del data.commit_id
+
+    def test_no_instance_dict(self):
+        data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="myBranch")
+        assert not hasattr(data, "__dict__")
+
+    def test_pickle_round_trip(self):
+        data = VersionData(tag="1.2.3-rc.1", commit_id="abcd1234", branch_name="b", commits_since_tag=2)
+        restored = pickle.loads(pickle.dumps(data))  # noqa: S301
+        assert restored == data
+        assert restored.qualified_version == data.qualified_version
+
+
+class TestVersionDataEquality:
+    def test_equal_by_value(self):
+        first = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="b", commits_since_tag=1)
+        second = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="b", commits_since_tag=1)
+        assert first == second
+        assert hash(first) == hash(second)
+        assert len({first, second}) == 1
+
+    def test_not_equal(self):
+        first = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="b")
+        assert first != VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="b", is_dirty=True)
+        assert first != VersionData(tag="1.2.3", commit_id="ffff1234", branch_name="b")
+        assert first != first.with_time()
+        assert first != "1.2.3"
+
+    def test_usable_as_dict_key(self):
+        data = VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="b")
+        lookup = {data: "value"}
+        assert lookup[VersionData(tag="1.2.3", commit_id="abcd1234", branch_name="b")] == "value"
+
+
+class TestVersionDataPrecedence:
+    def test_semver_specification_order(self):
+        # Example ordering from SemVer 2.0.0, item 11.4
+        ordered_tags = [
+            "1.0.0-alpha",
+            "1.0.0-alpha.1",
+            "1.0.0-alpha.beta",
+            "1.0.0-beta",
+            "1.0.0-beta.2",
+            "1.0.0-beta.11",
+            "1.0.0-rc.1",
+            "1.0.0",
+            "2.0.0",
+            "2.1.0",
+            "2.1.1",
+            "10.0.0",
+        ]
+        versions = [VersionData(tag=tag, commit_id="abcd1234", branch_name="b") for tag in ordered_tags]
+        assert [data.tag for data in sorted(versions[5:] + versions[:5])] == ordered_tags
+        for lower, higher in pairwise(versions):
+            assert lower < higher
+            assert lower <= higher
+            assert higher > lower
+            assert higher >= lower
+
+    def test_build_metadata_ignored(self):
+        first = VersionData(tag="1.0.0+build.1", commit_id="abcd1234", branch_name="b")
+        second = VersionData(tag="1.0.0+build.2", commit_id="ffff1234", branch_name="b", commits_since_tag=3)
+        assert not first < second
+        assert not second < first
+        assert first <= second
+        assert second >= first
+        assert first.precedence_key == second.precedence_key
+
+    def test_numeric_identifiers_lower_than_alphanumeric(self):
+        assert precedence_key(1, 0, 0, "999") < precedence_key(1, 0, 0, "0a")
+        assert precedence_key(1, 0, 0, "rc.2") < precedence_key(1, 0, 0, "rc.10")
@@ -0,0 +1,74 @@
+import sys
+
+import pytest
+
+from tests.utils import GitDir
+from version_builder import utils, watcher
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+
+
+def _ref_watcher(git_dir, **kwargs):
+    with utils.Git(git_dir.path) as git:
+        git_dir_path, common_dir = git.get_git_dirs()
+    return watcher.RefWatcher(git_dir_path, common_dir, **kwargs)
+
+
+class TestRefWatcher:
+    def test_commit(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with _ref_watcher(git_dir) as ref_watcher:
+            changes = ref_watcher.changes(debounce=0.05)
+            git_dir.commit()
+            assert next(changes) is None
+            ref_watcher.stop()
+            with pytest.raises(StopIteration):
+                next(changes)
+
+    def test_checkout(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        commit_id = git_dir.commit()
+        git_dir.commit()
+        with _ref_watcher(git_dir) as ref_watcher:
+            git_dir.checkout(commit_id)
+            next(ref_watcher.changes(debounce=0.05))
+
+    def test_tag(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with _ref_watcher(git_dir) as ref_watcher:
+            git_dir.tag("v1.0.0")
+            next(ref_watcher.changes(debounce=0.05))
+
+    def test_branch_in_new_directory(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with _ref_watcher(git_dir) as ref_watcher:
+            changes = ref_watcher.changes(debounce=0.05)
+            git_dir.create_branch("feature/one")
+            next(changes)
+            # The directory created for the branch is watched as well
+            (tmp_path / ".git" / "refs" / "heads" / "feature" / "two").write_text(
+                (tmp_path / ".git" / "refs" / "heads" / "feature" / "one").read_text()
+            )
+            next(changes)
+
+    def test_unrelated_files_are_ignored(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        with _ref_watcher(git_dir) as ref_watcher:
+            (tmp_path / "file.txt").write_text("")
+            (tmp_path / ".git" / "refs" / "heads" / "main.lock").write_text("")
+            (tmp_path / ".git" / "description").write_text("")
+            ref_watcher.stop()
+            with pytest.raises(StopIteration):
+                next(ref_watcher.changes(debounce=0.05))
+
+    def test_extra_file(self, tmp_path):
+        git_dir = GitDir(tmp_path)
+        git_dir.commit()
+        version_file = tmp_path / "version.txt"
+        with _ref_watcher(git_dir, extra_files=(version_file,)) as ref_watcher:
+            version_file.write_text("1.0.0")
+            next(ref_watcher.changes(debounce=0.05))
@@ -1,5 +1,7 @@
+import io
 import os
 import subprocess
+import tarfile
 
 from version_builder.utils import change_dir
 
@@ -15,20 +17,22 @@ class GitDir:
             self._silent_call(["git", "config", "user.email", "you@example.com"])
             self._silent_call(["git", "config", "user.name", "Your Name"])
 
-    def commit(self):
+    def commit(self, date=None):
+        """Commit all changes, at a date such as "1700000000 +0000" if given, which lightweight tags then share."""
         self.add_all()
+        env = {**os.environ, "GIT_AUTHOR_DATE": date, "GIT_COMMITTER_DATE": date} if date else None
         with change_dir(self.path):
-            self._silent_call(["git", "commit", "--allow-empty", "-m", "message"])
+            self._silent_call(["git", "commit", "--allow-empty", "-m", "message"], env=env)
             return self._silent_call(["git", "rev-parse", "--short=7", "HEAD"]).strip()
 
     def add_all(self):
         with change_dir(self.path):
             self._silent_call(["git", "add", "."])
 
-    def _silent_call(self, command):
+    def _silent_call(self, command, env=None):
         with open(os.devnull, "w") as devnull:
             # Private helper to unit testing should not be used outside of trusted context
-            return subprocess.check_output(command, stderr=devnull).decode()
+            return subprocess.check_output(command, stderr=devnull, env=env).decode()
 
     # This performs a checkout of the new branch as well
     def create_branch(self, branch_name):
@@ -45,3 +49,11 @@ class GitDir:
             if commit_id:
                 command.append(commit_id)
             self._silent_call(command)
+
+    def export_archive(self, destination, revision="HEAD"):
+        """Extract the tree exported by git archive for a revision into destination."""
+        with change_dir(self.path):
+            # Private helper to unit testing should not be used outside of trusted context
+            archive = subprocess.check_output(["git", "archive", "--format=tar", revision])
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(destination, filter="data")
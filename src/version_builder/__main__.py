@@ -1,25 +1,197 @@
 import argparse
+import contextlib
+import sys
 
-from version_builder import main
+from version_builder import fingerprint, main, utils, version_collector
 
 
 def execute() -> None:
-    parser = argparse.ArgumentParser(description="Create a source file containing git version information.")
-    parser.add_argument(
-        "--lang",
-        "-l",
-        choices=["cpp", "cpp11", "c", "rust"],
-        required=True,
-        help="language supported by the file output",
-    )
+    argv = sys.argv[1:]
+    if argv and argv[0] in _COMMANDS:
+        _COMMANDS[argv[0]](argv[1:])
+    else:
+        _generate(argv)
+
+
+def _add_source_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument(
         "--source",
         "-s",
-        choices=["git", "file"],
+        choices=main.SOURCES,
         required=True,
         help="type of source used for generating the version information",
     )
-    parser.add_argument("--input", "-i", required=True, help="path to source of version information")
+    parser.add_argument(
+        "--input",
+        "-i",
+        required=True,
+        help=(
+            "path to source of version information; for env, a CI provider, 'auto' or a JSON mapping file; "
+            "for frozen, a record written by 'freeze'"
+        ),
+    )
+    _add_collection_arguments(parser)
+    parser.add_argument(
+        "--rev",
+        default=None,
+        metavar="REV",
+        help=(
+            "collect the version of a revision other than HEAD without checking it out; git source only, dirty "
+            "detection does not apply"
+        ),
+    )
+    parser.add_argument(
+        "--git-stats",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="print the git queries made while collecting version information, with their cost",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=_seconds,
+        default=None,
+        metavar="SECONDS",
+        help="time git may take for the whole collection; git is killed when it runs out",
+    )
+    parser.add_argument(
+        "--stage-deadline",
+        type=_stage_deadline,
+        action="append",
+        dest="stage_deadlines",
+        default=[],
+        metavar="STAGE=SECONDS",
+        help=f"time git may take for one stage ({', '.join(utils.DEADLINE_STAGES):s}); may be given multiple times",
+    )
+    parser.add_argument(
+        "--deadline-policy",
+        choices=utils.DEADLINE_POLICIES,
+        default="fail",
+        help=(
+            "what to do when a deadline passes: fail (default), or mark the version dirty-unknown if it is the dirty "
+            "stage that ran out of time"
+        ),
+    )
+    parser.add_argument(
+        "--fingerprint",
+        default=None,
+        metavar="DIR",
+        help="add a fingerprint of the content of a directory to the build metadata, e.g. for exported sources",
+    )
+    parser.add_argument(
+        "--fingerprint-ignore",
+        action="append",
+        dest="fingerprint_ignores",
+        default=[],
+        metavar="PATTERN",
+        help="gitignore-style pattern of paths left out of the fingerprint; may be given multiple times",
+    )
+    parser.add_argument(
+        "--fingerprint-cache",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="reuse the hashes of files whose size and modification time did not change since the last fingerprint",
+    )
+
+
+def _add_collection_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the arguments selecting how the version is collected from git."""
+    parser.add_argument(
+        "--tag-strategy",
+        choices=version_collector.TAG_STRATEGIES,
+        default="creatordate",
+        help=(
+            "how the git source selects a tag: most recently created (default), highest SemVer precedence or nearest "
+            "in history"
+        ),
+    )
+    parser.add_argument(
+        "--describe",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="resolve the nearest tag with a single 'git describe' before searching the full history",
+    )
+    parser.add_argument(
+        "--dirty-path",
+        action="append",
+        dest="dirty_paths",
+        default=[],
+        help="limit dirty detection to a git pathspec relative to the input; may be given multiple times",
+    )
+    parser.add_argument(
+        "--dirty-untracked",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="consider untracked files during dirty detection",
+    )
+    parser.add_argument(
+        "--dirty-submodules",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="consider submodules during dirty detection",
+    )
+
+
+def _collection_configuration(args: argparse.Namespace) -> dict:
+    return {
+        "tag_strategy": args.tag_strategy,
+        "use_describe": args.describe,
+        "dirty_options": utils.DirtyCheckOptions(
+            pathspecs=tuple(args.dirty_paths),
+            include_untracked=args.dirty_untracked,
+            include_submodules=args.dirty_submodules,
+        ),
+    }
+
+
+def _seconds(value: str) -> float:
+    try:
+        seconds = float(value)
+    except ValueError:
+        seconds = -1.0
+    if not seconds >= 0:
+        msg = f"'{value:s}' is not a number of seconds"
+        raise argparse.ArgumentTypeError(msg)
+    return seconds
+
+
+def _stage_deadline(value: str) -> tuple[str, float]:
+    stage, _, seconds = value.partition("=")
+    if stage not in utils.DEADLINE_STAGES:
+        msg = f"'{value:s}' does not name a stage of {', '.join(utils.DEADLINE_STAGES):s}"
+        raise argparse.ArgumentTypeError(msg)
+    return stage, _seconds(seconds)
+
+
+def _source_configuration(parser: argparse.ArgumentParser, args: argparse.Namespace) -> dict:
+    """Validate the source arguments and return the OptionalConfiguration arguments controlling the collection."""
+    if args.rev is not None and args.source != "git":
+        parser.error("The --rev argument requires --source to be set to 'git'")
+    if args.rev is not None and (not args.rev or args.rev.startswith("-")):
+        parser.error(f"argument --rev: invalid revision '{args.rev:s}'")
+    if args.fingerprint is None and args.fingerprint_ignores:
+        parser.error("The --fingerprint-ignore argument requires --fingerprint")
+
+    return {
+        **_collection_configuration(args),
+        "git_stats": utils.GitCallStats() if args.git_stats else None,
+        "revision": args.rev,
+        "deadline": utils.Deadline(args.deadline, stage_limits=dict(args.stage_deadlines), policy=args.deadline_policy),
+        "fingerprint_options": None
+        if args.fingerprint is None
+        else fingerprint.FingerprintOptions(
+            args.fingerprint, ignore_patterns=tuple(args.fingerprint_ignores), use_cache=args.fingerprint_cache
+        ),
+    }
+
+
+def _add_output_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--lang",
+        "-l",
+        choices=["cpp", "cpp11", "cpp20-module", "c", "rust", "python", "stamp"],
+        required=True,
+        help="language supported by the file output; stamp emits a placeholder record filled in by 'stamp'",
+    )
     parser.add_argument(
         "--print",
         "-p",
@@ -45,21 +217,48 @@ def execute() -> None:
         required=False,
         help="cargo version of a crate",
     )
-    parser.add_argument("file")
-    args = parser.parse_args()
 
+
+def _output_configuration(parser: argparse.ArgumentParser, args: argparse.Namespace) -> dict:
+    """Validate the output arguments and return the OptionalConfiguration arguments controlling the output."""
     if args.namespace == "":
         parser.error("argument --namespace/-n: cannot be an empty string")
 
-    if args.namespace and args.lang not in {"cpp", "cpp11"}:
+    if args.namespace and args.lang not in {"cpp", "cpp11", "cpp20-module"}:
         parser.error("The --namespace argument requires --lang to be set to 'cpp'")
 
-    if args.lang in {"cpp", "cpp11"} and args.namespace is None:
+    if args.lang in {"cpp", "cpp11", "cpp20-module"} and args.namespace is None:
         args.namespace = "plxsversion"
 
     if args.cargo and args.lang != "rust":
         parser.error("The --cargo argument requires --lang to be set to 'rust'")
 
+    return {
+        "print_created_file": args.print,
+        "include_time": args.time,
+        "cargo_version": args.cargo,
+        "namespace": args.namespace,
+    }
+
+
+def _generate(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        description="Create a source file containing git version information.",
+        epilog=f"additional commands: {', '.join(_COMMANDS)} (see '<command> --help')",
+    )
+    _add_output_arguments(parser)
+    _add_source_arguments(parser)
+    parser.add_argument(
+        "--depfile",
+        metavar="FILE",
+        help="write a Makefile-style dependency file listing the git files the version was derived from",
+    )
+    parser.add_argument("file")
+    args = parser.parse_args(argv)
+    output_configuration = _output_configuration(parser, args)
+    if args.depfile is not None and args.source == "env":
+        parser.error("The --depfile argument cannot be used with --source env, as CI variables are not files")
+
     # Intentional print for user status notification
     print(f"Creating version information using {args.source:s} from {args.input:s}")  # noqa: T201
 
@@ -69,12 +268,158 @@ def execute() -> None:
         output_file=args.file,
         lang=args.lang,
         optional_config=main.OptionalConfiguration(
-            print_created_file=args.print,
-            include_time=args.time,
-            cargo_version=args.cargo,
-            namespace=args.namespace,
+            **output_configuration, **_source_configuration(parser, args), depfile_path=args.depfile
+        ),
+    )
+
+
+def _freeze(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="plxs-version freeze",
+        description=(
+            "Resolve version information once and write it to a checksummed record. Builds render from the record "
+            f"with '--source frozen --input RECORD' or by setting {version_collector.RESOLVED_ENV_VAR:s}=RECORD."
+        ),
+    )
+    _add_source_arguments(parser)
+    parser.add_argument("file", help="path of the version record to write")
+    args = parser.parse_args(argv)
+
+    # Intentional print for user status notification
+    print(f"Freezing version information using {args.source:s} from {args.input:s}")  # noqa: T201
+
+    main.freeze_version(
+        source=args.source,
+        source_input=args.input,
+        output_file=args.file,
+        optional_config=main.OptionalConfiguration(**_source_configuration(parser, args)),
+    )
+
+
+def _watch(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="plxs-version watch",
+        description=(
+            "Keep a source file containing git version information up to date. The file is regenerated when HEAD, "
+            "refs, packed-refs or the index change and the version information differs. Requires Linux (inotify)."
         ),
     )
+    _add_output_arguments(parser)
+    _add_source_arguments(parser)
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.2,
+        help="seconds without further changes before regenerating (default: %(default)s)",
+    )
+    parser.add_argument("file")
+    args = parser.parse_args(argv)
+    output_configuration = _output_configuration(parser, args)
+    if args.source not in main.WATCH_SOURCES:
+        parser.error(f"argument --source/-s: watch supports {', '.join(main.WATCH_SOURCES):s}")
+
+    # Intentional print for user status notification
+    print(f"Watching version information using {args.source:s} from {args.input:s}, press Ctrl+C to stop")  # noqa: T201
+
+    # Interrupting is the regular way to end watching
+    with contextlib.suppress(KeyboardInterrupt):
+        main.watch_version_file(
+            source=args.source,
+            source_input=args.input,
+            output_file=args.file,
+            lang=args.lang,
+            optional_config=main.OptionalConfiguration(**output_configuration, **_source_configuration(parser, args)),
+            debounce=args.debounce,
+        )
+
+
+def _stamp(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="plxs-version stamp",
+        description=(
+            "Write version information into a linked ELF binary, in place. The binary must contain the placeholder "
+            "record of a header generated with '--lang stamp'."
+        ),
+    )
+    _add_source_arguments(parser)
+    parser.add_argument(
+        "--time",
+        "-t",
+        action=argparse.BooleanOptionalAction,
+        help="include time data in the version infomation",
+    )
+    parser.add_argument("binary", help="path of the binary to stamp")
+    args = parser.parse_args(argv)
+
+    main.stamp_version(
+        source=args.source,
+        source_input=args.input,
+        binary_file=args.binary,
+        optional_config=main.OptionalConfiguration(include_time=args.time, **_source_configuration(parser, args)),
+    )
+
+
+def _history(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="plxs-version history",
+        description=(
+            "Print the version of every commit of a revision range as one JSON record per line, oldest first, walking "
+            "the history once. Versions are those of the git source at each commit checked out without changes."
+        ),
+    )
+    parser.add_argument(
+        "range", help="'A..B' for the commits reachable from B but not from A, or 'B' for all commits reachable from B"
+    )
+    parser.add_argument("--input", "-i", default=".", help="path to the git repository (default: %(default)s)")
+    parser.add_argument(
+        "--tag-strategy",
+        choices=version_collector.HISTORY_TAG_STRATEGIES,
+        default="creatordate",
+        help="how a tag is selected: most recently created (default) or highest SemVer precedence",
+    )
+    parser.add_argument(
+        "--git-stats",
+        action=argparse.BooleanOptionalAction,
+        default=False,
+        help="print the git queries made to standard error, with their cost",
+    )
+    args = parser.parse_args(argv)
+
+    main.write_version_history(
+        args.input,
+        args.range,
+        sys.stdout,
+        tag_strategy=args.tag_strategy,
+        git_stats=utils.GitCallStats() if args.git_stats else None,
+    )
+
+
+def _doctor(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="plxs-version doctor",
+        description=(
+            "Measure what makes collecting the version of a git repository slow: its refs, objects, configuration and "
+            "working tree, and the time of each collection stage. Prints the changes that would speed it up, ranked "
+            "by the time they could save."
+        ),
+    )
+    parser.add_argument("--input", "-i", default=".", help="path to the git repository (default: %(default)s)")
+    _add_collection_arguments(parser)
+    args = parser.parse_args(argv)
+
+    # Intentional print for user status notification
+    print(f"Examining {args.input:s}, collecting its version several times")  # noqa: T201
+
+    main.diagnose_repository(args.input, sys.stdout, **_collection_configuration(args))
+
+
+_COMMANDS = {
+    "freeze": _freeze,
+    "watch": _watch,
+    "stamp": _stamp,
+    "history": _history,
+    "doctor": _doctor,
+}
 
 
 if __name__ == "__main__":
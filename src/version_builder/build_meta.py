@@ -0,0 +1,140 @@
+import functools
+import importlib
+import sys
+from collections.abc import Callable
+from pathlib import Path
+
+from version_builder import main, version_collector
+
+if sys.version_info >= (3, 11):
+    import tomllib
+else:
+    try:
+        import tomli as tomllib
+    except ModuleNotFoundError:
+        tomllib = None
+
+# Hooks of PEP 517 and PEP 660. The backend only offers those the wrapped backend offers, as frontends treat missing
+# optional hooks as not supported.
+HOOKS = (
+    "get_requires_for_build_sdist",
+    "get_requires_for_build_wheel",
+    "get_requires_for_build_editable",
+    "prepare_metadata_for_build_wheel",
+    "prepare_metadata_for_build_editable",
+    "build_sdist",
+    "build_wheel",
+    "build_editable",
+)
+
+# Table of pyproject.toml configuring the backend
+CONFIGURATION_TABLE = "plxsversion"
+
+
+class BuildConfiguration:
+    """
+    Select the version module written before every build hook and the backend building the package.
+
+    Read from the [tool.plxsversion] table of pyproject.toml: version-file (required) is the path of the module to
+    write, backend the PEP 517 backend to wrap, and source, input, tag-strategy, describe and time select how the
+    version is collected, as the command line arguments of the same names. Relative paths are relative to the project.
+    """
+
+    OPTIONS = ("version-file", "backend", "source", "input", "tag-strategy", "describe", "time")
+
+    def __init__(  # noqa: PLR0913 - each option maps to an independent pyproject.toml key
+        self,
+        version_file: str,
+        *,
+        backend: str = "setuptools.build_meta",
+        source: str = "git",
+        source_input: str = ".",
+        tag_strategy: str = "creatordate",
+        use_describe: bool = True,
+        include_time: bool = False,
+    ) -> None:
+        self.version_file = version_file
+        self.backend = backend
+        self.source = source
+        self.source_input = source_input
+        self.tag_strategy = tag_strategy
+        self.use_describe = use_describe
+        self.include_time = include_time
+
+    @classmethod
+    def load(cls, project_dir: str | Path = ".") -> "BuildConfiguration":
+        pyproject_path = Path(project_dir) / "pyproject.toml"
+        if tomllib is None:
+            msg = "Reading pyproject.toml requires Python 3.11 or the tomli package"
+            raise RuntimeError(msg)
+        with open(pyproject_path, "rb") as pyproject:
+            table = tomllib.load(pyproject).get("tool", {}).get(CONFIGURATION_TABLE, {})
+
+        unknown_options = set(table) - set(cls.OPTIONS)
+        if unknown_options:
+            msg = f"Unknown [tool.{CONFIGURATION_TABLE:s}] option: {', '.join(sorted(unknown_options)):s}"
+            raise ValueError(msg)
+        if "version-file" not in table:
+            msg = f"[tool.{CONFIGURATION_TABLE:s}] of {pyproject_path!s} does not name a version-file"
+            raise ValueError(msg)
+        return cls(
+            str(Path(project_dir) / table["version-file"]),
+            backend=table.get("backend", "setuptools.build_meta"),
+            source=table.get("source", "git"),
+            source_input=str(Path(project_dir) / table.get("input", ".")),
+            tag_strategy=table.get("tag-strategy", "creatordate"),
+            use_describe=table.get("describe", True),
+            include_time=table.get("time", False),
+        )
+
+
+def write_version_file(configuration: BuildConfiguration) -> None:
+    """
+    Collect the version in this process and write it to the version module of a package.
+
+    A package built from an sdist has no git repository to collect from; if the version module exists, e.g. as it was
+    shipped in the sdist, it is kept.
+    """
+    optional_config = main.OptionalConfiguration(
+        include_time=configuration.include_time,
+        tag_strategy=configuration.tag_strategy,
+        use_describe=configuration.use_describe,
+    )
+    try:
+        main.create_version_file(
+            configuration.source,
+            configuration.source_input,
+            configuration.version_file,
+            "python",
+            optional_config=optional_config,
+        )
+    except version_collector.VersionCollectError as exc:
+        if not Path(configuration.version_file).is_file():
+            raise
+        # Intentional print for user status notification
+        print(f"Keeping {configuration.version_file:s}: {exc!s}")  # noqa: T201
+
+
+@functools.cache
+def _prepare_build(project_dir: str) -> None:
+    # Frontends may run several hooks of a project in one process; the version is only collected for the first
+    write_version_file(BuildConfiguration.load(project_dir))
+
+
+def _wrap_hook(hook: Callable) -> Callable:
+    @functools.wraps(hook)
+    def run_hook(*args: object, **kwargs: object) -> object:
+        # Hooks run in the project directory
+        _prepare_build(str(Path.cwd()))
+        return hook(*args, **kwargs)
+
+    return run_hook
+
+
+def __getattr__(name: str) -> Callable:
+    if name not in HOOKS:
+        msg = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(msg)
+    backend = importlib.import_module(BuildConfiguration.load().backend)
+    # A hook the wrapped backend lacks raises AttributeError here, which tells the frontend it is not supported
+    return _wrap_hook(getattr(backend, name))
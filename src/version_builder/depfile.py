@@ -0,0 +1,75 @@
+import os
+from collections.abc import Iterable
+from pathlib import Path
+
+from version_builder import utils
+
+# Characters of a path that make and Ninja would otherwise read as separators, comments or variable references
+_ESCAPES = str.maketrans({" ": "\\ ", "#": "\\#", "$": "$$"})
+
+
+def git_dependencies(
+    path: str | Path,
+    *,
+    revision: str | None = None,
+    tag: str = "",
+    include_tags: bool = True,
+    include_index: bool = True,
+) -> list[Path]:
+    """
+    Return the files of a git repository that the version of a revision, or of HEAD, is derived from.
+
+    These are HEAD, the loose file of the branch or ref the revision names and the directories leading to it,
+    packed-refs, the directories holding loose tags and the loose file of the tag the version is based on, and the
+    index when the dirty state was checked. Files that do not exist are left out; the directories of the refs change
+    whenever a loose ref is added, moved or removed, such as when a packed branch is updated.
+    """
+    with utils.Git(path) as git:
+        git_dir, common_dir = git.get_git_dirs()
+        # A detached HEAD or a commit id names no ref, which leaves the commit itself as all the revision depends on
+        ref_name = git.run("rev-parse", "--symbolic-full-name", revision or "HEAD").strip()
+
+    candidates = [git_dir / "HEAD"] if revision in {None, "HEAD"} else []
+    if (common_dir / "reftable").is_dir():
+        # Every ref update of a reftable repository rewrites the list of its tables
+        candidates.append(common_dir / "reftable" / "tables.list")
+    else:
+        if ref_name.startswith("refs/"):
+            candidates.append(common_dir / ref_name)
+            # A packed ref has no loose file, and updating it creates one in these directories
+            candidates.extend(common_dir / directory for directory in reversed(Path(ref_name).parents[:-1]))
+        candidates.append(common_dir / "packed-refs")
+        if include_tags:
+            tags_dir = common_dir / "refs" / "tags"
+            if tag:
+                candidates.extend(tags_dir / name for name in (tag, f"v{tag:s}"))
+            candidates.extend(Path(directory) for directory, _, _ in os.walk(tags_dir))
+    if include_index:
+        candidates.append(git_dir / "index")
+    return _existing(candidates)
+
+
+def format_depfile(target: str | Path, dependencies: Iterable[str | Path]) -> str:
+    """
+    Return a Makefile-style rule making a target depend on files, as written by `gcc -MD -MP`.
+
+    Every dependency gets an empty rule of its own, so that make does not fail once a file is removed, as a loose ref
+    is by `git pack-refs`.
+    """
+    escaped = [_escape(dependency) for dependency in dependencies]
+    lines = [" \\\n  ".join([f"{_escape(target):s}:", *escaped])]
+    lines.extend(f"\n{dependency:s}:" for dependency in escaped)
+    return "\n".join(lines) + "\n"
+
+
+def write_depfile(depfile_path: str | Path, target: str | Path, dependencies: Iterable[str | Path]) -> None:
+    utils.write_file_atomic(depfile_path, format_depfile(target, dependencies))
+
+
+def _escape(path: str | Path) -> str:
+    return str(path).translate(_ESCAPES)
+
+
+def _existing(candidates: Iterable[Path]) -> list[Path]:
+    # A tag may be listed as its own file and within its directory; each file is listed once, in order
+    return [candidate for candidate in dict.fromkeys(candidates) if candidate.exists()]
@@ -0,0 +1,435 @@
+import io
+import os
+import subprocess
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager, redirect_stdout, suppress
+from pathlib import Path
+
+from version_builder import utils, version_collector, version_data
+
+# Repository sizes above which a missing optimization is worth recommending
+LOOSE_REFS_THRESHOLD = 100
+COMMIT_GRAPH_COMMITS_THRESHOLD = 1000
+PACKS_THRESHOLD = 20
+LOOSE_OBJECTS_THRESHOLD = 10_000
+FSMONITOR_FILES_THRESHOLD = 10_000
+
+# Measured savings below this many seconds are within the noise of a single run and not recommended
+MIN_SAVING_SECONDS = 0.005
+
+# Total time of a warm collection above which resolving the version once per build pays off
+FREEZE_SECONDS_THRESHOLD = 0.5
+
+
+class RepositoryFacts:
+    """The properties of a repository that drive the cost of collecting its version."""
+
+    def __init__(self, git: utils.Git) -> None:
+        git_dir, common_dir = git.get_git_dirs()
+        objects_dir = common_dir / "objects"
+        self.commit_count = git.get_commit_count()
+        self.tag_count = len(git.run("for-each-ref", "--format=%(refname)", "refs/tags").splitlines())
+        self.loose_ref_count = sum(len(files) for _, _, files in os.walk(common_dir / "refs"))
+        self.loose_tag_count = sum(len(files) for _, _, files in os.walk(common_dir / "refs" / "tags"))
+        self.packed_ref_count = _count_packed_refs(common_dir / "packed-refs")
+        self.uses_reftable = (common_dir / "reftable").exists()
+
+        object_counts = dict(line.split(": ", 1) for line in git.run("count-objects", "-v").splitlines())
+        self.pack_count = int(object_counts.get("packs", 0))
+        self.loose_object_count = int(object_counts.get("count", 0))
+        info_dir = objects_dir / "info"
+        self.has_commit_graph = (info_dir / "commit-graph").exists() or (
+            info_dir / "commit-graphs" / "commit-graph-chain"
+        ).exists()
+        self.has_bitmap = any((objects_dir / "pack").glob("*.bitmap"))
+
+        settings = _get_settings(git, ("core.untrackedcache", "core.fsmonitor", "feature.manyfiles"))
+        many_files = _parse_bool(settings.get("feature.manyfiles", "false"))
+        # feature.manyFiles implies the untracked cache unless it is configured explicitly
+        untracked_cache = settings.get("core.untrackedcache", "true" if many_files else "keep")
+        if untracked_cache == "keep":
+            # The default keeps the cache as the index has it, e.g. after `git update-index --untracked-cache`
+            self.has_untracked_cache = _index_has_untracked_cache(git_dir / "index")
+        else:
+            self.has_untracked_cache = bool(_parse_bool(untracked_cache))
+        # A hook command in place of a boolean also enables the monitor
+        self.has_fsmonitor = _parse_bool(settings.get("core.fsmonitor", "false")) is not False
+
+        index_modes = [line.split(" ", 1)[0] for line in git.run("ls-files", "--stage").splitlines()]
+        self.tracked_file_count = len(index_modes)
+        self.submodule_count = index_modes.count("160000")
+        self.is_shallow = git.run("rev-parse", "--is-shallow-repository").strip() == "true"
+
+
+def _count_packed_refs(packed_refs_path: Path) -> int:
+    try:
+        lines = packed_refs_path.read_text().splitlines()
+    except FileNotFoundError:
+        return 0
+    # Comments hold the file traits, and "^" lines the commits annotated tags peel to
+    return sum(1 for line in lines if line and line[0] not in "#^")
+
+
+def _index_has_untracked_cache(index_path: Path) -> bool:
+    try:
+        index = index_path.read_bytes()
+    except FileNotFoundError:
+        return False
+    # The signature of the extension; paths spelling it are left to chance rather than parsing every entry
+    return b"UNTR" in index
+
+
+def _parse_bool(value: str) -> bool | None:
+    """Return the boolean a git setting is read as, or None if it is not a boolean, like `git config --type=bool`."""
+    # A name without "=" sets the value to true, and is listed without a value
+    if value in {"", "true", "yes", "on"}:
+        return True
+    if value in {"false", "no", "off"}:
+        return False
+    try:
+        return int(value) != 0
+    except ValueError:
+        return None
+
+
+def _get_settings(git: utils.Git, names: tuple[str, ...]) -> dict[str, str]:
+    pattern = "^({:s})$".format("|".join(name.replace(".", r"\.") for name in names))
+    try:
+        settings_raw = git.run("config", "--get-regexp", pattern)
+    except subprocess.CalledProcessError:
+        # None of the settings are present
+        return {}
+    settings = {}
+    for line in settings_raw.splitlines():
+        name, _, value = line.partition(" ")
+        settings[name.lower()] = value.lower()
+    return settings
+
+
+class _StageClock(utils.Deadline):
+    """A deadline without limits that measures how long each stage of a collection takes."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.stage_seconds = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            with super().stage(name):
+                yield
+        finally:
+            self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + time.perf_counter() - start
+
+
+class _UncachedBackend(utils.SubprocessBackend):
+    """Run git without the caches shared across runs, as in the first run after the tags change."""
+
+    uses_repository_files = False
+
+
+class Measurement:
+    """The stage times of one collection, with the tag and commits since the tag it found."""
+
+    def __init__(self, label: str, stage_seconds: dict[str, float], version: version_data.VersionData) -> None:
+        self.label = label
+        self.stage_seconds = stage_seconds
+        self.tag = version.tag
+        self.commits_since_tag = version.commits_since_tag
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.stage_seconds.values())
+
+    def finds_same_version(self, other: "Measurement") -> bool:
+        return (self.tag, self.commits_since_tag) == (other.tag, other.commits_since_tag)
+
+
+class Recommendation:
+    """A change expected to speed up collection, with the time of the work it could save at most."""
+
+    def __init__(self, action: str, reason: str, saving_seconds: float) -> None:
+        self.action = action
+        self.reason = reason
+        self.saving_seconds = saving_seconds
+
+
+class Diagnosis:
+    """
+    The facts, measured stage times and ranked recommendations for collecting the version of a repository.
+
+    cold is the configured collection without the caches shared across runs, warm the same collection once they are
+    filled. strategies holds the cold tag stage of every other way of selecting a tag, and dirty_seconds the time of
+    dirty detection with each of its options turned off. When the configured collection fails, e.g. in a repository
+    without commits, the failure is the only finding, and cold and warm are None, as nothing could be measured.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        tag_strategy: str = "creatordate",
+        use_describe: bool = True,
+        dirty_options: utils.DirtyCheckOptions | None = None,
+    ) -> None:
+        self.path = Path(path)
+        self.tag_strategy = tag_strategy
+        self.use_describe = use_describe and tag_strategy == "creatordate"
+        self.dirty_options = utils.DirtyCheckOptions() if dirty_options is None else dirty_options
+
+        with utils.Git(self.path) as git:
+            self.facts = RepositoryFacts(git)
+            # None without commits, which fails the first measurement
+            head_commit_id_full = git.resolve("HEAD^{commit}")
+        self.findings = []
+        self.cold = self.warm = None
+        self.strategies = []
+        self.dirty_seconds = {}
+        self.recommendations = []
+        # Collections print notices such as the fallback version, which would repeat for every measurement
+        with redirect_stdout(io.StringIO()):
+            try:
+                self.cold = self._measure("configured", tag_strategy, self.use_describe, backend=_UncachedBackend())
+            except version_collector.VersionCollectError as exc:
+                self.findings.append(str(exc).strip())
+                return
+            self._measure("warming up", tag_strategy, self.use_describe)
+            self.warm = self._measure("configured", tag_strategy, self.use_describe)
+            for label, strategy, describe in _strategy_variants():
+                if (strategy, describe) == (tag_strategy, self.use_describe):
+                    continue
+                # Dirty detection does not depend on the tag, so the HEAD commit is collected without a working tree
+                with suppress(version_collector.VersionCollectError):
+                    self.strategies.append(
+                        self._measure(
+                            label, strategy, describe, backend=_UncachedBackend(), revision=head_commit_id_full
+                        )
+                    )
+        self.dirty_seconds = self._measure_dirty_variants()
+        self.recommendations = sorted(self._recommend(), key=lambda recommendation: -recommendation.saving_seconds)
+
+    def _measure(
+        self,
+        label: str,
+        tag_strategy: str,
+        use_describe: bool,  # noqa: FBT001 - mirrors the positional variants of _strategy_variants
+        *,
+        backend: utils.GitBackend | None = None,
+        revision: str | None = None,
+    ) -> Measurement:
+        clock = _StageClock()
+        try:
+            version = version_collector.from_git(
+                self.path,
+                tag_strategy=tag_strategy,
+                use_describe=use_describe,
+                dirty_options=self.dirty_options,
+                backend=backend,
+                deadline=clock,
+                revision=revision,
+            )
+        finally:
+            if backend is not None:
+                backend.close()
+        return Measurement(label, clock.stage_seconds, version)
+
+    def _measure_dirty_variants(self) -> dict[str, float]:
+        options = self.dirty_options
+        variants = {"configured": options}
+        if options.include_untracked:
+            variants["no untracked"] = utils.DirtyCheckOptions(
+                pathspecs=options.pathspecs, include_untracked=False, include_submodules=options.include_submodules
+            )
+        if options.include_submodules and self.facts.submodule_count:
+            variants["no submodules"] = utils.DirtyCheckOptions(
+                pathspecs=options.pathspecs, include_untracked=options.include_untracked, include_submodules=False
+            )
+        dirty_seconds = {}
+        for label, variant in variants.items():
+            # Each variant gets its own session, so no answer is reused from another
+            with utils.Git(self.path) as git:
+                start = time.perf_counter()
+                git.get_is_dirty(variant)
+                dirty_seconds[label] = time.perf_counter() - start
+        return dirty_seconds
+
+    def _recommend(self) -> Iterator[Recommendation]:
+        recommendations = [
+            *self._recommend_repository_maintenance(),
+            *self._recommend_tag_selection(),
+            *self._recommend_dirty_detection(),
+        ]
+        if self.warm.total_seconds >= FREEZE_SECONDS_THRESHOLD:
+            recommendations.append(
+                Recommendation(
+                    "plxs-version freeze RECORD, then --source frozen --input RECORD",
+                    "resolves the version once per build instead of in every configure and nested build",
+                    self.warm.total_seconds,
+                )
+            )
+        return (
+            recommendation for recommendation in recommendations if recommendation.saving_seconds >= MIN_SAVING_SECONDS
+        )
+
+    def _recommend_repository_maintenance(self) -> Iterator[Recommendation]:
+        facts = self.facts
+        ref_seconds = self.cold.stage_seconds.get("head", 0.0) + self.cold.stage_seconds.get("tag", 0.0)
+        tag_seconds = self.cold.stage_seconds.get("tag", 0.0)
+        if facts.loose_ref_count >= LOOSE_REFS_THRESHOLD and not facts.uses_reftable:
+            yield Recommendation(
+                "git pack-refs --all",
+                f"{facts.loose_ref_count:d} refs are stored as loose files that git reads one by one",
+                ref_seconds,
+            )
+        if not facts.has_commit_graph and facts.commit_count >= COMMIT_GRAPH_COMMITS_THRESHOLD and not facts.is_shallow:
+            yield Recommendation(
+                "git commit-graph write --reachable && git config fetch.writeCommitGraph true",
+                f"without a commit-graph, tag ancestry and commit counts parse each of {facts.commit_count:d} commits",
+                tag_seconds,
+            )
+        if facts.pack_count >= PACKS_THRESHOLD or facts.loose_object_count >= LOOSE_OBJECTS_THRESHOLD:
+            yield Recommendation(
+                "git maintenance run --task=gc",
+                f"objects are spread over {facts.pack_count:d} packs and {facts.loose_object_count:d} loose files",
+                ref_seconds,
+            )
+        if facts.is_shallow:
+            yield Recommendation(
+                "git fetch --unshallow --tags, or --source env in CI",
+                "in a shallow clone commit counts cannot be cached and tags may be missing from the history",
+                tag_seconds,
+            )
+
+    def _recommend_tag_selection(self) -> Iterator[Recommendation]:
+        configured_seconds = self.cold.stage_seconds.get("tag", 0.0)
+        for measurement in self.strategies:
+            if not measurement.finds_same_version(self.cold):
+                continue
+            yield Recommendation(
+                _strategy_arguments(measurement.label),
+                f"selects the same tag in {_milliseconds(measurement.stage_seconds.get('tag', 0.0)):s} in this "
+                "repository",
+                configured_seconds - measurement.stage_seconds.get("tag", 0.0),
+            )
+
+    def _recommend_dirty_detection(self) -> Iterator[Recommendation]:
+        facts = self.facts
+        dirty_seconds = self.dirty_seconds["configured"]
+        untracked_seconds = dirty_seconds - self.dirty_seconds.get("no untracked", dirty_seconds)
+        if "no untracked" in self.dirty_seconds and not facts.has_untracked_cache:
+            yield Recommendation(
+                "git config core.untrackedCache true",
+                "git reads every directory of the working tree to find untracked files",
+                untracked_seconds,
+            )
+        if not facts.has_fsmonitor and facts.tracked_file_count >= FSMONITOR_FILES_THRESHOLD:
+            yield Recommendation(
+                "git config core.fsmonitor true",
+                f"git checks each of {facts.tracked_file_count:d} tracked files for changes",
+                dirty_seconds,
+            )
+        if "no untracked" in self.dirty_seconds:
+            yield Recommendation(
+                "--no-dirty-untracked", "untracked files would no longer make the version dirty", untracked_seconds
+            )
+        if "no submodules" in self.dirty_seconds:
+            yield Recommendation(
+                "--no-dirty-submodules",
+                f"changes in {facts.submodule_count:d} submodules would no longer make the version dirty",
+                dirty_seconds - self.dirty_seconds["no submodules"],
+            )
+        if not self.dirty_options.pathspecs and facts.tracked_file_count >= FSMONITOR_FILES_THRESHOLD:
+            yield Recommendation(
+                "--dirty-path PATH",
+                "only changes to the sources of the build would make the version dirty",
+                dirty_seconds,
+            )
+
+    def report(self) -> str:
+        facts = self.facts
+        lines = [
+            f"Repository {self.path!s}",
+            f"  commits: {facts.commit_count:d}, shallow: {_yes_no(facts.is_shallow):s}",
+            (
+                f"  tags: {facts.tag_count:d} ({facts.loose_tag_count:d} loose), refs: {facts.loose_ref_count:d} "
+                f"loose, {facts.packed_ref_count:d} packed, reftable: {_yes_no(facts.uses_reftable):s}"
+            ),
+            (
+                f"  packs: {facts.pack_count:d}, loose objects: {facts.loose_object_count:d}, "
+                f"commit-graph: {_yes_no(facts.has_commit_graph):s}, bitmap: {_yes_no(facts.has_bitmap):s}"
+            ),
+            (
+                f"  tracked files: {facts.tracked_file_count:d}, submodules: {facts.submodule_count:d}, "
+                f"untracked cache: {_yes_no(facts.has_untracked_cache):s}, fsmonitor: {_yes_no(facts.has_fsmonitor):s}"
+            ),
+        ]
+        if self.findings:
+            lines.extend(["", "Findings:"])
+            lines.extend(f"  {finding:s}" for finding in self.findings)
+            lines.append("  nothing was measured, as the configured collection fails")
+            return "\n".join(lines)
+        lines.extend(
+            [
+                "",
+                f"Collection stages ({_strategy_arguments(self._configured_label()):s}):",
+                f"  {'stage':<8s} {'cold':>10s} {'warm':>10s}",
+            ]
+        )
+        lines.extend(
+            f"  {stage:<8s} {_milliseconds(self.cold.stage_seconds.get(stage, 0.0)):>10s} "
+            f"{_milliseconds(self.warm.stage_seconds.get(stage, 0.0)):>10s}"
+            for stage in utils.DEADLINE_STAGES
+        )
+        cold_total, warm_total = _milliseconds(self.cold.total_seconds), _milliseconds(self.warm.total_seconds)
+        lines.append(f"  {'total':<8s} {cold_total:>10s} {warm_total:>10s}")
+        lines.extend(["", "Tag stage of each tag selection (cold):"])
+        for measurement in [self.cold, *self.strategies]:
+            label = self._configured_label() if measurement is self.cold else measurement.label
+            version = f"{measurement.tag:s}, {measurement.commits_since_tag:d} commits since"
+            lines.append(
+                f"  {_strategy_arguments(label):<42s} {_milliseconds(measurement.stage_seconds.get('tag', 0.0)):>10s}"
+                f"  {version:s}"
+            )
+        lines.extend(["", "Dirty detection:"])
+        lines.extend(f"  {label:<42s} {_milliseconds(seconds):>10s}" for label, seconds in self.dirty_seconds.items())
+        lines.extend(["", "Recommendations, by the time they could save at most:"])
+        if not self.recommendations:
+            lines.append("  none found for this repository")
+        for rank, recommendation in enumerate(self.recommendations, start=1):
+            lines.append(
+                f"  {rank:d}. {recommendation.action:s}  (up to {_milliseconds(recommendation.saving_seconds):s})"
+            )
+            lines.append(f"     {recommendation.reason:s}")
+        return "\n".join(lines)
+
+    def _configured_label(self) -> str:
+        return next(
+            label
+            for label, strategy, describe in _strategy_variants()
+            if (strategy, describe) == (self.tag_strategy, self.use_describe)
+        )
+
+
+def _strategy_variants() -> Iterator[tuple[str, str, bool]]:
+    """Yield (label, tag strategy, use describe) of every way of selecting a tag."""
+    for strategy in version_collector.TAG_STRATEGIES:
+        if strategy == "creatordate":
+            yield "creatordate", strategy, True
+            yield "creatordate without describe", strategy, False
+        else:
+            yield strategy, strategy, False
+
+
+def _strategy_arguments(label: str) -> str:
+    strategy, _, without_describe = label.partition(" ")
+    return f"--tag-strategy {strategy:s}" + (" --no-describe" if without_describe else "")
+
+
+def _milliseconds(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
+
+
+def _yes_no(value: bool) -> str:  # noqa: FBT001 - formats a single flag
+    return "yes" if value else "no"
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import re
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from pathlib import Path
+
+from version_builder import utils
+
+# Files holding ignore rules in the gitignore format. Every directory of a tree may contain them, and their rules apply
+# to the directory and everything below it.
+IGNORE_FILE_NAMES = (".gitignore", ".plxsversionignore")
+
+# Entries that are never part of the content of a tree
+_ALWAYS_IGNORED = frozenset({".git"})
+
+# First line of a hash cache file, identifying its format
+_CACHE_HEADER = "plxsversion fingerprint cache 1"
+
+# Files modified less than this many seconds before the cache is written are not cached: a change within the
+# resolution of the file system timestamps would leave the modification time and size unchanged
+_SETTLE_SECONDS = 2.0
+
+_READ_SIZE = 1 << 20
+
+_BATCH_SIZE = 256
+
+
+class FingerprintOptions:
+    """
+    Select the tree whose content is fingerprinted and how it is read.
+
+    ignore_patterns are gitignore-style patterns applied at the root in addition to the ignore files of the tree.
+    Hashes of files are cached by modification time and size in cache_path, by default a file per tree below the user
+    cache directory; use_cache=False reads every file. workers is the number of files hashed in parallel.
+    """
+
+    def __init__(
+        self,
+        root: str | Path,
+        *,
+        ignore_patterns: tuple[str, ...] = (),
+        use_cache: bool = True,
+        cache_path: str | Path | None = None,
+        workers: int | None = None,
+    ) -> None:
+        self.root = Path(root)
+        self.ignore_patterns = tuple(ignore_patterns)
+        self.use_cache = use_cache
+        self.cache_path = None if cache_path is None else Path(cache_path)
+        self.workers = workers
+
+
+class TreeFingerprint:
+    """The fingerprint of a tree, with how many files it covers and how many of them had to be read."""
+
+    def __init__(self, digest: str, file_count: int, hashed_count: int) -> None:
+        self.digest = digest
+        self.file_count = file_count
+        self.hashed_count = hashed_count
+
+
+class FingerprintError(Exception):
+    def __init__(self, root_cause: str) -> None:
+        self.root_cause = root_cause
+
+    def __str__(self) -> str:
+        return f"Could not fingerprint content because {self.root_cause:s}. "
+
+
+def compute_fingerprint(options: FingerprintOptions) -> TreeFingerprint:
+    """
+    Return a fingerprint of the content of a tree that only depends on its files' paths, content and executable bits.
+
+    Ignored entries, empty directories and modification times do not affect it, so two exports of the same sources
+    share a fingerprint wherever they are unpacked. Symbolic links are fingerprinted by their target, not followed.
+    """
+    root = options.root.resolve()
+    if not root.is_dir():
+        msg = f"{options.root!s} is not a directory"
+        raise FingerprintError(msg)
+
+    files = _list_files(root, _IgnoreRules.parse("", options.ignore_patterns))
+    cache_path = (options.cache_path or _default_cache_path(root)) if options.use_cache else None
+    cache = _load_cache(cache_path) if cache_path else {}
+
+    digests = {}
+    stale = []
+    for relative_path, file_stat in files:
+        cached = cache.get(relative_path)
+        if cached and cached[0] == file_stat.st_size and cached[1] == file_stat.st_mtime_ns:
+            digests[relative_path] = cached[2]
+        else:
+            stale.append((relative_path, file_stat))
+    # Files are handed to the workers in batches, as most files take less time to hash than a task takes to schedule
+    batches = [stale[start : start + _BATCH_SIZE] for start in range(0, len(stale), _BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=options.workers) as executor:
+        for batch_digests in executor.map(lambda batch: _hash_files(root, batch), batches):
+            digests.update(batch_digests)
+
+    fingerprint = hashlib.sha256()
+    for relative_path, file_stat in files:
+        entry = f"{_kind(file_stat):s} {digests[relative_path]:s} {relative_path:s}\0"
+        # Names that are not valid UTF-8 keep their original bytes
+        fingerprint.update(entry.encode(errors="surrogateescape"))
+
+    if cache_path and (stale or len(cache) != len(files)):
+        _save_cache(cache_path, files, digests)
+    return TreeFingerprint(fingerprint.hexdigest(), len(files), len(stale))
+
+
+class _IgnoreRules:
+    """The rules of one ignore file, matching paths relative to the directory containing it."""
+
+    def __init__(self, base: str, rules: list[tuple[re.Pattern, bool, bool]]) -> None:
+        self.base = base
+        self.rules = rules
+        # Without negated rules the last matching rule does not matter, so all rules are tried in a single match
+        self._combined = None
+        if rules and not any(negated for _, negated, _ in rules):
+            self._combined = (
+                _combine(pattern for pattern, _, directory_only in rules if not directory_only),
+                _combine(pattern for pattern, _, _ in rules),
+            )
+
+    @classmethod
+    def parse(cls, base: str, lines: tuple[str, ...] | list[str]) -> "_IgnoreRules":
+        rules = []
+        for line in lines:
+            rule = _parse_rule(line)
+            if rule:
+                rules.append(rule)
+        return cls(base, rules)
+
+    def match(self, relative_path: str, *, is_directory: bool) -> bool | None:
+        """Return whether the rules ignore a path below their base, or None if no rule matches it."""
+        path = relative_path[len(self.base) + 1 :] if self.base else relative_path
+        if self._combined:
+            pattern = self._combined[1] if is_directory else self._combined[0]
+            return True if pattern and pattern.match(path) else None
+        ignored = None
+        for pattern, negated, directory_only in self.rules:
+            if (is_directory or not directory_only) and pattern.match(path):
+                ignored = not negated
+        return ignored
+
+
+def _parse_rule(line: str) -> tuple[re.Pattern, bool, bool] | None:
+    """Return (pattern, negated, directory only) of a line of an ignore file, or None if it holds no rule."""
+    line = line.rstrip("\n")
+    if not line.endswith("\\ "):
+        line = line.rstrip(" ")
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\"):
+        # An escaped leading "#" or "!"
+        line = line[1:]
+    directory_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    # A pattern containing a slash other than a trailing one is relative to the base, otherwise it matches at any depth
+    anchored = "/" in line
+    regex = _translate_glob(line.lstrip("/"))
+    if not anchored:
+        regex = "(?:.*/)?" + regex
+    return re.compile(regex + r"\Z", re.DOTALL), negated, directory_only
+
+
+def _translate_glob(glob: str) -> str:
+    parts = []
+    index = 0
+    while index < len(glob):
+        if glob.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif glob.startswith("/**", index) and index + 3 == len(glob):
+            parts.append("/.*")
+            index += 3
+        elif glob.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif glob[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif glob[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        elif glob[index] == "[" and "]" in glob[index + 2 :]:
+            end = glob.index("]", index + 2)
+            characters = glob[index + 1 : end]
+            if characters.startswith("!"):
+                characters = "^" + characters[1:]
+            parts.append(f"[{characters.replace(chr(92), chr(92) * 2):s}]")
+            index = end + 1
+        elif glob[index] == "\\" and index + 1 < len(glob):
+            parts.append(re.escape(glob[index + 1]))
+            index += 2
+        else:
+            parts.append(re.escape(glob[index]))
+            index += 1
+    return "".join(parts)
+
+
+def _combine(patterns: object) -> re.Pattern | None:
+    sources = [pattern.pattern for pattern in patterns]
+    return re.compile("|".join(f"(?:{source:s})" for source in sources), re.DOTALL) if sources else None
+
+
+def _is_ignored(relative_path: str, rule_sets: list[_IgnoreRules], *, is_directory: bool) -> bool:
+    # Rules of deeper directories take precedence over those of their parents
+    for rules in reversed(rule_sets):
+        ignored = rules.match(relative_path, is_directory=is_directory)
+        if ignored is not None:
+            return ignored
+    return False
+
+
+def _list_files(root: Path, root_rules: _IgnoreRules) -> list[tuple[str, os.stat_result]]:
+    """Return (relative path, stat) of the regular files and symbolic links of a tree that are not ignored, sorted."""
+    files = []
+    pending = [("", root, [root_rules])]
+    while pending:
+        relative_directory, directory, rule_sets = pending.pop()
+        with os.scandir(directory) as scan:
+            entries = list(scan)
+        names = {entry.name for entry in entries}
+        for ignore_file_name in IGNORE_FILE_NAMES:
+            if ignore_file_name in names:
+                with suppress(OSError, UnicodeDecodeError):
+                    lines = (directory / ignore_file_name).read_text().splitlines()
+                    rule_sets = [*rule_sets, _IgnoreRules.parse(relative_directory, lines)]
+
+        for entry in entries:
+            if entry.name in _ALWAYS_IGNORED:
+                continue
+            relative_path = f"{relative_directory:s}/{entry.name:s}" if relative_directory else entry.name
+            is_directory = entry.is_dir(follow_symlinks=False)
+            if _is_ignored(relative_path, rule_sets, is_directory=is_directory):
+                continue
+            if is_directory:
+                pending.append((relative_path, Path(entry.path), rule_sets))
+                continue
+            file_stat = entry.stat(follow_symlinks=False)
+            # Sockets, pipes and devices have no content
+            if stat.S_ISREG(file_stat.st_mode) or stat.S_ISLNK(file_stat.st_mode):
+                files.append((relative_path, file_stat))
+    files.sort(key=lambda file: file[0])
+    return files
+
+
+def _kind(file_stat: os.stat_result) -> str:
+    if stat.S_ISLNK(file_stat.st_mode):
+        return "link"
+    return "exec" if file_stat.st_mode & stat.S_IXUSR else "file"
+
+
+def _hash_files(root: Path, files: list[tuple[str, os.stat_result]]) -> dict[str, str]:
+    return {relative_path: _hash_file(f"{root!s}/{relative_path:s}", file_stat) for relative_path, file_stat in files}
+
+
+def _hash_file(path: str, file_stat: os.stat_result) -> str:
+    if stat.S_ISLNK(file_stat.st_mode):
+        return hashlib.sha256(os.fsencode(os.readlink(path))).hexdigest()  # noqa: PTH115 - a str path is cheaper
+    digest = hashlib.sha256()
+    # Plain file descriptors avoid the buffering layers of open(), which cost more than reading a small file
+    descriptor = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        # hashlib releases the GIL for large updates, so files are hashed in parallel
+        while chunk := os.read(descriptor, _READ_SIZE):
+            digest.update(chunk)
+    finally:
+        os.close(descriptor)
+    return digest.hexdigest()
+
+
+def _default_cache_path(root: Path) -> Path:
+    cache_home = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    tree_key = hashlib.sha256(os.fsencode(root)).hexdigest()[:16]
+    return cache_home / "plxsversion" / "fingerprints" / f"{tree_key:s}.txt"
+
+
+def _load_cache(cache_path: Path) -> dict[str, tuple[int, int, str]]:
+    """Return the cached (size, modification time, digest) of files, or nothing if the cache is not readable."""
+    try:
+        lines = cache_path.read_text().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return {}
+    if not lines or lines[0] != _CACHE_HEADER:
+        return {}
+    cache = {}
+    for line in lines[1:]:
+        with suppress(ValueError):
+            digest, size, modification_time, relative_path = line.split(" ", 3)
+            cache[relative_path] = (int(size), int(modification_time), digest)
+    return cache
+
+
+def _save_cache(cache_path: Path, files: list[tuple[str, os.stat_result]], digests: dict[str, str]) -> None:
+    settled = time.time_ns() - int(_SETTLE_SECONDS * 1e9)
+    lines = [_CACHE_HEADER]
+    lines.extend(
+        f"{digests[relative_path]:s} {file_stat.st_size:d} {file_stat.st_mtime_ns:d} {relative_path:s}"
+        for relative_path, file_stat in files
+        if file_stat.st_mtime_ns < settled and relative_path.isprintable()
+    )
+    # The cache only saves time, so a cache that cannot be written is skipped
+    with suppress(OSError):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        utils.write_file_atomic(cache_path, "\n".join(lines) + "\n")
@@ -1,3 +1,4 @@
+from version_builder import stamp
 from version_builder.version_data import VersionData
 
 
@@ -9,6 +10,10 @@ def to_cpp11(version_data: VersionData, *, namespace: str) -> str:
     return _Cpp11Formatter(namespace=namespace).format(version_data)
 
 
+def to_cpp20_module(version_data: VersionData, *, namespace: str) -> str:
+    return _Cpp20ModuleFormatter(namespace=namespace).format(version_data)
+
+
 def to_c(version_data: VersionData) -> str:
     return _CFormatter().format(version_data)
 
@@ -17,6 +22,15 @@ def to_rust(version_data: VersionData) -> str:
     return _RustFormatter().format(version_data)
 
 
+def to_python(version_data: VersionData) -> str:
+    return _PythonFormatter().format(version_data)
+
+
+def to_stamp() -> str:
+    """Return a C/C++ header declaring a placeholder version record that `plxs-version stamp` fills in after linking."""
+    return _StampFormatter().format_placeholder()
+
+
 class _Formatter:
     def __init__(self) -> None:
         pass
@@ -65,6 +79,7 @@ inline constexpr unsigned int COMMITS_SINCE_TAG {{ {version_data.commits_since_t
 inline constexpr std::string_view COMMIT_ID {{ "{version_data.commit_id:s}" }};
 inline constexpr std::string_view BRANCH {{ "{version_data.branch_name:s}" }};
 inline constexpr bool DIRTY_BUILD {{ {str(version_data.is_dirty).lower():s} }};
+inline constexpr bool DIRTY_APPLICABLE {{ {str(version_data.is_dirty_applicable).lower():s} }};
 inline constexpr bool DEVELOPMENT_BUILD {{ {str(version_data.is_development_build).lower():s} }};
 inline constexpr std::string_view BUILD_METADATA {{ "{version_data.full_build_metadata:s}" }};
 {self._optional_output(version_data):s}
@@ -116,6 +131,7 @@ constexpr unsigned int COMMITS_SINCE_TAG {{ {version_data.commits_since_tag:d} }
 constexpr const char *COMMIT_ID {{ "{version_data.commit_id:s}" }};
 constexpr const char *BRANCH {{ "{version_data.branch_name:s}" }};
 constexpr bool DIRTY_BUILD {{ {str(version_data.is_dirty).lower():s} }};
+constexpr bool DIRTY_APPLICABLE {{ {str(version_data.is_dirty_applicable).lower():s} }};
 constexpr bool DEVELOPMENT_BUILD {{ {str(version_data.is_development_build).lower():s} }};
 constexpr const char *BUILD_METADATA {{ "{version_data.full_build_metadata:s}" }};
 {self._optional_output(version_data):s}
@@ -131,6 +147,46 @@ constexpr const char *BUILD_METADATA {{ "{version_data.full_build_metadata:s}" }
         return optional_output
 
 
+# ----------------------------------------
+# C++20 Module Formatter
+# ----------------------------------------
+class _Cpp20ModuleFormatter(_CppFormatter):
+    def main_formatter(self, version_data: VersionData) -> str:
+        # Only the module interface parses <string_view>; importing translation units read the compiled interface.
+        # The module name is fixed, so importers are unaffected by the namespace the constants are exported in.
+        return f"""
+// ---------------------------------------------------
+// This file is autogenerated.
+// DO NOT MODIFY!
+// ---------------------------------------------------
+
+module;
+
+#include <string_view>
+
+export module plxsversion;
+
+export namespace {self.namespace} {{
+
+inline constexpr std::string_view BASE_VERSION {{ "{version_data.base_version:s}" }};
+inline constexpr std::string_view VERSION {{ "{version_data.qualified_version:s}" }};
+inline constexpr unsigned int MAJOR {{ {version_data.major:d} }};
+inline constexpr unsigned int MINOR {{ {version_data.minor:d} }};
+inline constexpr unsigned int PATCH {{ {version_data.patch:d} }};
+inline constexpr std::string_view PRE_RELEASE {{ "{version_data.prerelease:s}" }};
+inline constexpr std::string_view TAG {{ "{version_data.tag:s}" }};
+inline constexpr unsigned int COMMITS_SINCE_TAG {{ {version_data.commits_since_tag:d} }};
+inline constexpr std::string_view COMMIT_ID {{ "{version_data.commit_id:s}" }};
+inline constexpr std::string_view BRANCH {{ "{version_data.branch_name:s}" }};
+inline constexpr bool DIRTY_BUILD {{ {str(version_data.is_dirty).lower():s} }};
+inline constexpr bool DIRTY_APPLICABLE {{ {str(version_data.is_dirty_applicable).lower():s} }};
+inline constexpr bool DEVELOPMENT_BUILD {{ {str(version_data.is_development_build).lower():s} }};
+inline constexpr std::string_view BUILD_METADATA {{ "{version_data.full_build_metadata:s}" }};
+{self._optional_output(version_data):s}
+}} // namespace {self.namespace}
+"""
+
+
 # ----------------------------------------
 # C Formatter
 # ----------------------------------------
@@ -163,6 +219,7 @@ static const unsigned int COMMITS_SINCE_TAG = {version_data.commits_since_tag:d}
 static const char *COMMIT_ID = "{version_data.commit_id:s}";
 static const char *BRANCH = "{version_data.branch_name:s}";
 static bool DIRTY_BUILD = {str(version_data.is_dirty).lower():s};
+static bool DIRTY_APPLICABLE = {str(version_data.is_dirty_applicable).lower():s};
 static bool DEVELOPMENT_BUILD = {str(version_data.is_development_build).lower():s};
 static const char *BUILD_METADATA = "{version_data.full_build_metadata:s}";
 {self._optional_output(version_data):s}
@@ -204,6 +261,7 @@ pub mod plxsversion {{
     pub const COMMIT_ID: &str = "{version_data.commit_id:s}";
     pub const BRANCH: &str = "{version_data.branch_name:s}";
     pub const DIRTY_BUILD: bool = {str(version_data.is_dirty).lower():s};
+    pub const DIRTY_APPLICABLE: bool = {str(version_data.is_dirty_applicable).lower():s};
     pub const DEVELOPMENT_BUILD: bool = {str(version_data.is_development_build).lower():s};
     pub const BUILD_METADATA: &str = "{version_data.full_build_metadata:s}";
 {self._optional_output(version_data):s}
@@ -217,3 +275,123 @@ pub mod plxsversion {{
         if version_data.cargo_version:
             optional_output += f"""\tpub const CARGO_VERSION: &str = "{version_data.cargo_version:s}";\n"""
         return optional_output
+
+
+# ----------------------------------------
+# Python Formatter
+# ----------------------------------------
+class _PythonFormatter(_Formatter):
+    def main_formatter(self, version_data: VersionData) -> str:
+        # Strings are written as Python literals, so quotes in e.g. branch names are escaped
+        return f"""# ---------------------------------------------------
+# This file is autogenerated.
+# DO NOT MODIFY!
+# ---------------------------------------------------
+
+BASE_VERSION = {version_data.base_version!r}
+VERSION = {version_data.qualified_version!r}
+MAJOR = {version_data.major:d}
+MINOR = {version_data.minor:d}
+PATCH = {version_data.patch:d}
+PRE_RELEASE = {version_data.prerelease!r}
+TAG = {version_data.tag!r}
+COMMITS_SINCE_TAG = {version_data.commits_since_tag:d}
+COMMIT_ID = {version_data.commit_id!r}
+BRANCH = {version_data.branch_name!r}
+DIRTY_BUILD = {version_data.is_dirty!r}
+DIRTY_APPLICABLE = {version_data.is_dirty_applicable!r}
+DEVELOPMENT_BUILD = {version_data.is_development_build!r}
+BUILD_METADATA = {version_data.full_build_metadata!r}
+{self._optional_output(version_data):s}
+__version__ = VERSION
+"""
+
+    def _optional_output(self, version_data: VersionData) -> str:
+        optional_output = ""
+        if version_data.time:
+            optional_output += f"UTC_TIME = {version_data.time!r}\n"
+        if version_data.cargo_version:
+            optional_output += f"CARGO_VERSION = {version_data.cargo_version!r}\n"
+        return optional_output
+
+
+# ----------------------------------------
+# Stamp Formatter
+# ----------------------------------------
+class _StampFormatter:
+    def format_placeholder(self) -> str:
+        return f"""
+// ---------------------------------------------------
+// This file is autogenerated.
+// DO NOT MODIFY!
+// ---------------------------------------------------
+
+#ifndef PLXSVERSION_STAMP_H
+#define PLXSVERSION_STAMP_H
+
+#include <stdbool.h>
+#include <stdint.h>
+
+#ifdef __cplusplus
+extern "C" {{
+#endif
+
+// Fixed-size version record in the {stamp.SECTION_NAME:s} section, filled in after linking by `plxs-version stamp`
+struct plxsversion_record {{
+{self._members():s}}};
+
+extern const volatile struct plxsversion_record plxsversion_record;
+
+// The record holds a placeholder when compiled. Text is read through an empty asm statement, so the optimizer cannot
+// replace reads with the placeholder contents.
+static inline const char *plxsversion_text_(const volatile char *field) {{
+    const char *text = (const char *)field;
+    __asm__("" : "+r"(text));
+    return text;
+}}
+
+{self._accessors():s}
+// Exactly one source file of a binary defines PLXSVERSION_DEFINE_RECORD before including this header
+#ifdef PLXSVERSION_DEFINE_RECORD
+__attribute__((section("{stamp.SECTION_NAME:s}"), used))
+const volatile struct plxsversion_record plxsversion_record = {{
+{self._placeholder():s}}};
+#endif
+
+#ifdef __cplusplus
+}} // extern "C"
+#endif
+
+#endif // PLXSVERSION_STAMP_H
+"""
+
+    def _members(self) -> str:
+        members = ""
+        for field, c_type, size in stamp.RECORD_LAYOUT:
+            array = f"[{size:d}]" if c_type == "char" else ""
+            members += f"    {c_type:s} {field:s}{array:s};\n"
+        return members
+
+    def _accessors(self) -> str:
+        accessors = ""
+        for field, c_type, _ in stamp.RECORD_LAYOUT:
+            if field == "magic":
+                continue
+            if c_type == "char":
+                return_type, value = "const char *", f"plxsversion_text_(plxsversion_record.{field:s})"
+            elif field in {"stamped", "dirty_build", "dirty_applicable", "development_build"}:
+                return_type, value = "bool ", f"plxsversion_record.{field:s} != 0"
+            else:
+                return_type, value = "unsigned int ", f"plxsversion_record.{field:s}"
+            accessors += f"static inline {return_type:s}plxsversion_{field:s}(void) {{ return {value:s}; }}\n"
+        return accessors
+
+    def _placeholder(self) -> str:
+        placeholder = ""
+        for field, c_type, _ in stamp.RECORD_LAYOUT:
+            value = stamp.PLACEHOLDER_VALUES.get(field)
+            if c_type == "char":
+                placeholder += f'    "{(value or b"").decode():s}",\n'
+            else:
+                placeholder += f"    {value or 0:d},\n"
+        return placeholder
@@ -1,21 +1,58 @@
-from pathlib import PosixPath
+import json
+import os
+import sys
+from pathlib import Path, PosixPath
+from typing import TextIO
 
-from version_builder import formatter, version_collector, version_data
+from version_builder import (
+    depfile,
+    doctor,
+    fingerprint,
+    formatter,
+    stamp,
+    utils,
+    version_collector,
+    version_data,
+    watcher,
+)
+
+SOURCES = ("git", "file", "archive", "env", "frozen")
+
+# Sources whose version data follows the refs of a git repository, which watch mode observes
+WATCH_SOURCES = ("git", "file")
 
 
 class OptionalConfiguration:
-    def __init__(
+    def __init__(  # noqa: PLR0913 - each option maps to an independent CLI argument
         self,
         *,
         print_created_file: bool = False,
         include_time: bool = False,
         cargo_version: str = "",
         namespace: str = "plxsversion",
+        tag_strategy: str = "creatordate",
+        use_describe: bool = True,
+        dirty_options: utils.DirtyCheckOptions | None = None,
+        git_stats: utils.GitCallStats | None = None,
+        git_backend: utils.GitBackend | None = None,
+        deadline: utils.Deadline | None = None,
+        revision: str | None = None,
+        fingerprint_options: fingerprint.FingerprintOptions | None = None,
+        depfile_path: str | None = None,
     ) -> None:
         self.print_created_file = print_created_file
         self.include_time = include_time
         self.cargo_version = cargo_version
         self.namespace = namespace
+        self.tag_strategy = tag_strategy
+        self.use_describe = use_describe
+        self.dirty_options = dirty_options
+        self.git_stats = git_stats
+        self.git_backend = git_backend
+        self.deadline = deadline
+        self.revision = revision
+        self.fingerprint_options = fingerprint_options
+        self.depfile_path = depfile_path
 
 
 def create_version_file(
@@ -29,12 +66,21 @@ def create_version_file(
     if optional_config is None:
         optional_config = OptionalConfiguration()
 
-    version_info = _get_version(source, source_input)
-    if optional_config.include_time:
-        version_info.set_time()
+    if optional_config.depfile_path is not None and source == "env":
+        # CI variables are not files, so a build system could never tell that the version changed
+        msg = "Cannot write a dependency file for source env, whose variables are not files"
+        raise ValueError(msg)
 
-    if optional_config.cargo_version:
-        version_info.set_cargo_version(optional_config.cargo_version)
+    if lang == "stamp":
+        # The placeholder does not depend on the version, which is only collected when stamping the binary
+        version_info = None
+    else:
+        version_info = _get_version(source, source_input, optional_config)
+        if optional_config.include_time:
+            version_info = version_info.with_time()
+
+        if optional_config.cargo_version:
+            version_info = version_info.with_cargo_version(optional_config.cargo_version)
 
     _output_version_file(
         version_info=version_info,
@@ -44,21 +90,281 @@ def create_version_file(
         print_created_file=optional_config.print_created_file,
     )
 
+    if optional_config.depfile_path is not None:
+        dependencies = (
+            []
+            if version_info is None
+            else _version_dependencies(source, source_input, optional_config, tag=version_info.tag)
+        )
+        depfile.write_depfile(optional_config.depfile_path, output_file, dependencies)
+
+
+def freeze_version(
+    source: str,
+    source_input: str,
+    output_file: str,
+    *,
+    optional_config: OptionalConfiguration = None,
+) -> None:
+    """Resolve version data once and write it to a record that builds can render from without collecting again."""
+    if optional_config is None:
+        optional_config = OptionalConfiguration()
+
+    version_info = _get_version(source, source_input, optional_config)
+    version_collector.write_frozen(version_info, output_file)
+    # Intentional print for user status notification
+    print(f"Froze version {version_info.qualified_version:s} to {output_file!s}")  # noqa: T201
+
+
+def stamp_version(
+    source: str,
+    source_input: str,
+    binary_file: str,
+    *,
+    optional_config: OptionalConfiguration = None,
+) -> None:
+    """Write version data into the placeholder record of a linked binary generated with the stamp language."""
+    if optional_config is None:
+        optional_config = OptionalConfiguration()
+
+    version_info = _get_version(source, source_input, optional_config)
+    if optional_config.include_time:
+        version_info = version_info.with_time()
+
+    if stamp.stamp_binary(binary_file, version_info):
+        # Intentional print for user status notification
+        print(f"Stamped version {version_info.qualified_version:s} into {binary_file!s}")  # noqa: T201
+    else:
+        # Intentional print for user status notification
+        print(f"{binary_file!s} already carries version {version_info.qualified_version:s}")  # noqa: T201
+
+
+def write_version_history(
+    source_input: str,
+    revision_range: str,
+    output: TextIO,
+    *,
+    tag_strategy: str = "creatordate",
+    git_stats: utils.GitCallStats | None = None,
+) -> int:
+    """
+    Write one JSON record per commit of a revision range, from the oldest commit to the newest.
+
+    Records are written as soon as the version of their commit is known, with the fields of _history_record. Returns
+    the number of commits whose version could not be determined; their records carry the reason as "error".
+    """
+    failures = 0
+    for commit_id_full, version_info in version_collector.history_from_git(
+        source_input, revision_range, tag_strategy=tag_strategy, stats=git_stats
+    ):
+        if isinstance(version_info, version_collector.VersionCollectError):
+            failures += 1
+        output.write(json.dumps(_history_record(commit_id_full, version_info)) + "\n")
+    if git_stats is not None:
+        # Intentional print of the git query account requested by the user, kept out of the records
+        print(git_stats.summary(), file=sys.stderr)  # noqa: T201
+    return failures
+
+
+def diagnose_repository(
+    source_input: str,
+    output: TextIO,
+    *,
+    tag_strategy: str = "creatordate",
+    use_describe: bool = True,
+    dirty_options: utils.DirtyCheckOptions | None = None,
+) -> doctor.Diagnosis:
+    """Measure what drives the cost of collecting the version of a git repository and write a ranked set of fixes."""
+    diagnosis = doctor.Diagnosis(
+        source_input, tag_strategy=tag_strategy, use_describe=use_describe, dirty_options=dirty_options
+    )
+    output.write(diagnosis.report() + "\n")
+    return diagnosis
+
+
+def watch_version_file(  # noqa: PLR0913 - create_version_file arguments plus the debounce interval
+    source: str,
+    source_input: str,
+    output_file: str,
+    lang: str,
+    *,
+    optional_config: OptionalConfiguration = None,
+    debounce: float = 0.2,
+) -> None:
+    """
+    Keep a version file in sync with its git repository until interrupted.
+
+    The file is regenerated after HEAD, a ref, packed-refs or the index changed and the collected version data differs
+    from the data the file was last written with. Changes limited to the working tree are only noticed once they
+    reach the index.
+    """
+    if optional_config is None:
+        optional_config = OptionalConfiguration()
+    if source not in WATCH_SOURCES:
+        msg = f"Cannot watch source {source:s}. Expected one of: {', '.join(WATCH_SOURCES):s}"
+        raise ValueError(msg)
+
+    input_path = Path(source_input)
+    repo_path, extra_files = (input_path.parent, (input_path,)) if source == "file" else (input_path, ())
+    with utils.Git(repo_path) as git:
+        git_dir, common_dir = git.get_git_dirs()
+
+    updater = VersionFileUpdater(source, source_input, output_file, lang, optional_config)
+    # Watches are in place before the first collection, so no change made while collecting is missed
+    with watcher.RefWatcher(git_dir, common_dir, extra_files=extra_files) as ref_watcher:
+        updater.update()
+        for _ in ref_watcher.changes(debounce=debounce):
+            updater.update()
+
+
+class VersionFileUpdater:
+    """Regenerate a version file only when the version data it is rendered from changes."""
+
+    def __init__(
+        self, source: str, source_input: str, output_file: str, lang: str, optional_config: OptionalConfiguration
+    ) -> None:
+        self.source = source
+        self.source_input = source_input
+        self.output_file = PosixPath(output_file)
+        self.lang = lang
+        self.optional_config = optional_config
+        self._written_version = None
+
+    def update(self) -> bool:
+        """Collect version data and rewrite the file if it changed. Return whether the file was written."""
+        try:
+            version_info = _get_version(self.source, self.source_input, self.optional_config)
+        except version_collector.VersionCollectError as exc:
+            # The repository may be in a transient state, e.g. during a rebase; the next change is awaited
+            # Intentional print for user status notification
+            print(exc)  # noqa: T201
+            return False
+        if self.optional_config.cargo_version:
+            version_info = version_info.with_cargo_version(self.optional_config.cargo_version)
+        if version_info == self._written_version:
+            return False
+
+        # The time is added after comparing, as it would otherwise differ on every update
+        _output_version_file(
+            version_info=version_info.with_time() if self.optional_config.include_time else version_info,
+            output_file=self.output_file,
+            lang=self.lang,
+            namespace=self.optional_config.namespace,
+            print_created_file=self.optional_config.print_created_file,
+        )
+        self._written_version = version_info
+        # Intentional print for user status notification
+        print(f"Updated {self.output_file!s} to version {version_info.qualified_version:s}")  # noqa: T201
+        return True
+
+
+def _history_record(
+    commit_id_full: str, version_info: version_data.VersionData | version_collector.VersionCollectError
+) -> dict:
+    if isinstance(version_info, version_collector.VersionCollectError):
+        return {"commit": commit_id_full, "error": version_info.root_cause}
+    return {
+        "commit": commit_id_full,
+        "version": version_info.qualified_version,
+        "base_version": version_info.base_version,
+        "pre_release": version_info.prerelease,
+        "tag": version_info.tag,
+        "commits_since_tag": version_info.commits_since_tag,
+        "development_build": version_info.is_development_build,
+    }
 
-def _get_version(source: str, source_input: str) -> version_data.VersionData:
+
+def _get_version(source: str, source_input: str, optional_config: OptionalConfiguration) -> version_data.VersionData:
     """Obtain version data from a particular data source."""
+    # A record frozen by a parent build takes precedence, so all nested builds agree on one version
+    resolved_record = _resolved_record(source)
+    if resolved_record:
+        # Intentional print for user status notification
+        print(f"Using frozen version information from {version_collector.RESOLVED_ENV_VAR:s}={resolved_record:s}")  # noqa: T201
+        return version_collector.from_frozen(resolved_record)
+
+    version_info = _collect_version(source, source_input, optional_config)
+    if optional_config.fingerprint_options is not None:
+        tree_fingerprint = fingerprint.compute_fingerprint(optional_config.fingerprint_options)
+        version_info = version_info.with_content_fingerprint(tree_fingerprint.digest)
+    if optional_config.git_stats is not None:
+        # Intentional print of the git query account requested by the user
+        print(optional_config.git_stats.summary())  # noqa: T201
+    return version_info
+
+
+def _resolved_record(source: str) -> str | None:
+    """Return the frozen record that overrides the source, if a parent build named one."""
+    if source == "frozen":
+        return None
+    return os.environ.get(version_collector.RESOLVED_ENV_VAR) or None
+
+
+def _version_dependencies(
+    source: str, source_input: str, optional_config: OptionalConfiguration, *, tag: str
+) -> list[Path]:
+    """Return the files the version data of a source was derived from, for the build system to rerun on changes."""
+    resolved_record = _resolved_record(source)
+    if resolved_record:
+        return [Path(resolved_record)]
+
+    match source:
+        case "git":
+            return depfile.git_dependencies(
+                source_input,
+                revision=optional_config.revision,
+                tag=tag,
+                include_index=optional_config.revision in {None, "HEAD"},
+            )
+        case "file":
+            # The tag comes from the file, the commit, branch and dirty state from the repository holding it
+            return [
+                Path(source_input),
+                *depfile.git_dependencies(Path(source_input).parent, include_tags=False),
+            ]
+        case _:
+            return [Path(source_input)]
+
+
+def _collect_version(
+    source: str, source_input: str, optional_config: OptionalConfiguration
+) -> version_data.VersionData:
+    if optional_config.revision is not None and source != "git":
+        msg = f"Cannot collect a revision from source {source:s}, only from git"
+        raise ValueError(msg)
     match source:
         case "git":
-            return version_collector.from_git(source_input)
+            return version_collector.from_git(
+                source_input,
+                tag_strategy=optional_config.tag_strategy,
+                use_describe=optional_config.use_describe,
+                dirty_options=optional_config.dirty_options,
+                stats=optional_config.git_stats,
+                backend=optional_config.git_backend,
+                deadline=optional_config.deadline,
+                revision=optional_config.revision,
+            )
         case "file":
-            return version_collector.from_file(source_input)
+            return version_collector.from_file(
+                source_input,
+                dirty_options=optional_config.dirty_options,
+                stats=optional_config.git_stats,
+                backend=optional_config.git_backend,
+                deadline=optional_config.deadline,
+            )
+        case "archive":
+            return version_collector.from_archive(source_input)
+        case "env":
+            return version_collector.from_env(source_input)
+        case "frozen":
+            return version_collector.from_frozen(source_input)
         case _:
             msg = "Unknown source"
             raise ValueError(msg)
 
 
 def _output_version_file(
-    version_info: version_data.VersionData,
+    version_info: version_data.VersionData | None,
     output_file: str,
     lang: str,
     *,
@@ -73,12 +379,21 @@ def _output_version_file(
         case "cpp11":
             output = formatter.to_cpp11(version_info, namespace=namespace)
             expected_file_extension = ".hpp"
+        case "cpp20-module":
+            output = formatter.to_cpp20_module(version_info, namespace=namespace)
+            expected_file_extension = ".cppm"
         case "c":
             output = formatter.to_c(version_info)
             expected_file_extension = ".h"
         case "rust":
             output = formatter.to_rust(version_info)
             expected_file_extension = ".rs"
+        case "python":
+            output = formatter.to_python(version_info)
+            expected_file_extension = ".py"
+        case "stamp":
+            output = formatter.to_stamp()
+            expected_file_extension = ".h"
         case _:
             msg = "Unknown language"
             raise ValueError(msg)
@@ -90,10 +405,11 @@ def _output_version_file(
         )
         raise ValueError(msg)
 
-    with open(output_file, "w") as file:
-        file.write(output)
+    # Parallel configures and build scripts may target the same file, so readers never see it partially written.
+    # Version files are rewritten on every run, so build systems see them as newer than what they were generated
+    # from; only the stamp placeholder, which never depends on the version, is left alone to avoid recompiling it.
+    utils.write_file_atomic(output_file, output, keep_unchanged=lang == "stamp")
 
     if print_created_file:
-        with open(output_file) as file:
-            # Intentional printing of file contents
-            print(file.read())  # noqa: T201
+        # Intentional printing of file contents
+        print(output)  # noqa: T201
@@ -0,0 +1,160 @@
+import struct
+from pathlib import Path
+from typing import BinaryIO
+
+from version_builder.version_data import VersionData
+
+# Section of an ELF binary holding the version record. The record is emitted as a placeholder by the "stamp" output
+# language and filled in after linking, so a new version does not require compiling or linking.
+SECTION_NAME = ".plxsversion"
+
+# Identifies a version record and the version of its layout
+RECORD_MAGIC = b"PLXSVERSION:2"
+
+# Layout of the version record as (field, C type, size in bytes). Text fields are NUL terminated, so they hold at
+# most size - 1 characters. The order and sizes must never change for a given RECORD_MAGIC.
+RECORD_LAYOUT = (
+    ("magic", "char", 16),
+    ("stamped", "uint32_t", 4),
+    ("major", "uint32_t", 4),
+    ("minor", "uint32_t", 4),
+    ("patch", "uint32_t", 4),
+    ("commits_since_tag", "uint32_t", 4),
+    ("dirty_build", "uint32_t", 4),
+    ("development_build", "uint32_t", 4),
+    ("dirty_applicable", "uint32_t", 4),
+    ("version", "char", 160),
+    ("base_version", "char", 32),
+    ("pre_release", "char", 64),
+    ("tag", "char", 96),
+    ("commit_id", "char", 48),
+    ("branch", "char", 128),
+    ("build_metadata", "char", 128),
+    ("utc_time", "char", 24),
+)
+
+_RECORD_FORMAT = "".join(f"{size:d}s" if c_type == "char" else "I" for _, c_type, size in RECORD_LAYOUT)
+RECORD_SIZE = struct.calcsize("<" + _RECORD_FORMAT)
+
+# Values of the placeholder record compiled into a binary before it is stamped
+PLACEHOLDER_VALUES = {"magic": RECORD_MAGIC, "version": b"UNSTAMPED"}
+
+_ELF_MAGIC = b"\x7fELF"
+_ELF_IDENTIFICATION_SIZE = 16
+# Formats of the file header after e_ident and of a section header, per ELF class (32 or 64 bit)
+_ELF_CLASSES = {1: ("HHIIIIIHHHHHH", "IIIIIIIIII"), 2: ("HHIQQQIHHHHHH", "IIQQQQIIQQ")}
+_ELF_BYTE_ORDERS = {1: "<", 2: ">"}
+_SHT_NOBITS = 8
+
+
+class StampError(Exception):
+    def __init__(self, root_cause: str) -> None:
+        self.root_cause = root_cause
+
+    def __str__(self) -> str:
+        return f"Could not stamp version because {self.root_cause:s}. "
+
+
+def stamp_binary(binary_path: str | Path, version_data: VersionData) -> bool:
+    """
+    Write version data into the version record of a linked ELF binary, in place.
+
+    Returns whether the binary was modified; a binary already carrying the same record is left untouched, so its
+    modification time only changes along with the version.
+    """
+    with open(binary_path, "r+b") as binary:
+        offset, byte_order = _find_record(binary)
+        record = _pack_record(version_data, byte_order)
+        binary.seek(offset)
+        if binary.read(RECORD_SIZE) == record:
+            return False
+        binary.seek(offset)
+        binary.write(record)
+    return True
+
+
+def read_stamp(binary_path: str | Path) -> dict:
+    """Return the fields of the version record of an ELF binary, with text fields decoded."""
+    with open(binary_path, "rb") as binary:
+        offset, byte_order = _find_record(binary)
+        binary.seek(offset)
+        values = struct.unpack(byte_order + _RECORD_FORMAT, binary.read(RECORD_SIZE))
+    return {
+        field: value.rstrip(b"\0").decode() if c_type == "char" else value
+        for (field, c_type, _), value in zip(RECORD_LAYOUT, values, strict=True)
+    }
+
+
+def _pack_record(version_data: VersionData, byte_order: str) -> bytes:
+    values = {
+        "magic": RECORD_MAGIC,
+        "stamped": 1,
+        "major": version_data.major,
+        "minor": version_data.minor,
+        "patch": version_data.patch,
+        "commits_since_tag": version_data.commits_since_tag,
+        "dirty_build": int(version_data.is_dirty),
+        "development_build": int(version_data.is_development_build),
+        "dirty_applicable": int(version_data.is_dirty_applicable),
+        "version": version_data.qualified_version,
+        "base_version": version_data.base_version,
+        "pre_release": version_data.prerelease,
+        "tag": version_data.tag,
+        "commit_id": version_data.commit_id,
+        "branch": version_data.branch_name,
+        "build_metadata": version_data.full_build_metadata,
+        "utc_time": version_data.time,
+    }
+    packed_values = []
+    for field, c_type, size in RECORD_LAYOUT:
+        value = values[field]
+        if c_type == "char":
+            value = value if isinstance(value, bytes) else value.encode()
+            if len(value) >= size:
+                msg = f"{field:s} '{value.decode():s}' exceeds the {size - 1:d} characters reserved in the record"
+                raise StampError(msg)
+        packed_values.append(value)
+    return struct.pack(byte_order + _RECORD_FORMAT, *packed_values)
+
+
+def _find_record(binary: BinaryIO) -> tuple[int, str]:
+    """Return the file offset of the version record and the byte order of an ELF binary."""
+    identification = binary.read(_ELF_IDENTIFICATION_SIZE)
+    if len(identification) < _ELF_IDENTIFICATION_SIZE or not identification.startswith(_ELF_MAGIC):
+        msg = "the file is not an ELF binary"
+        raise StampError(msg)
+    elf_class, data_encoding = identification[4], identification[5]
+    if elf_class not in _ELF_CLASSES or data_encoding not in _ELF_BYTE_ORDERS:
+        msg = "the ELF class or byte order is not supported"
+        raise StampError(msg)
+    header_format, section_header_format = _ELF_CLASSES[elf_class]
+    byte_order = _ELF_BYTE_ORDERS[data_encoding]
+
+    header_struct = struct.Struct(byte_order + header_format)
+    header = header_struct.unpack(binary.read(header_struct.size))
+    # e_shoff, e_shentsize, e_shnum and e_shstrndx
+    section_offset, section_entry_size, section_count, names_index = header[5], *header[-3:]
+    section_struct = struct.Struct(byte_order + section_header_format)
+
+    sections = []
+    for index in range(section_count):
+        binary.seek(section_offset + index * section_entry_size)
+        sections.append(section_struct.unpack(binary.read(section_struct.size)))
+    if names_index >= len(sections):
+        msg = "the binary has no section names"
+        raise StampError(msg)
+    _, _, _, _, names_offset, names_size, *_ = sections[names_index]
+    binary.seek(names_offset)
+    names = binary.read(names_size)
+
+    for name_offset, section_type, _, _, offset, size, *_ in sections:
+        if names[name_offset : names.find(b"\0", name_offset)].decode() != SECTION_NAME:
+            continue
+        binary.seek(offset)
+        if section_type == _SHT_NOBITS or size < RECORD_SIZE or binary.read(len(RECORD_MAGIC)) != RECORD_MAGIC:
+            msg = f"section {SECTION_NAME:s} does not hold a version record of this version of plxsversion"
+            raise StampError(msg)
+        return offset, byte_order
+
+    msg = f"the binary has no {SECTION_NAME:s} section, it must link the placeholder of the stamp output language"
+    raise StampError(msg)
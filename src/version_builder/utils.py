@@ -1,7 +1,20 @@
+import hashlib
+import json
 import os
 import subprocess
-from contextlib import contextmanager
+import sys
+import threading
+import time
+import warnings
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager, suppress
 from pathlib import Path
+from typing import Protocol
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
 
 
 @contextmanager
@@ -15,7 +28,15 @@ def change_dir(path: str) -> None:
 
 
 class EqualityByValue:
-    """Override identity eq with a check of the object's underlying fields."""
+    """
+    Override identity eq with a check of the object's underlying fields.
+
+    Deprecated: VersionData no longer derives from this mixin and compares by value itself.
+    """
+
+    def __init_subclass__(cls, **kwargs: object) -> None:
+        warnings.warn("EqualityByValue is deprecated", DeprecationWarning, stacklevel=2)
+        super().__init_subclass__(**kwargs)
 
     def __eq__(self, other: object) -> bool:
         if isinstance(other, self.__class__):
@@ -29,48 +50,954 @@ class EqualityByValue:
         return hash(self.name)
 
 
+@contextmanager
+def file_lock(path: str | Path) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock on a lock file while the context is active, waiting for other holders first.
+
+    The lock file is left in place afterwards: removing it would let a waiting process lock a file that a newcomer
+    no longer sees.
+    """
+    with open(path, "a+b") as lock:
+        if sys.platform == "win32":
+            # msvcrt locks a byte range; LK_LOCK retries for a while before giving up
+            msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def write_file_atomic(path: str | Path, content: str, *, keep_unchanged: bool = True) -> bool:
+    """
+    Replace the content of a file so that readers only ever see the old or the new content in full.
+
+    The content is written to a temporary file next to the target, which is then renamed over it. Writers of the same
+    file are serialized by an advisory lock on ".<name>.lock" in the same directory. With keep_unchanged, a file that
+    already holds the content is left alone, keeping its modification time. Returns whether the file was written.
+    """
+    path = Path(path)
+    with file_lock(_lock_path(path)):
+        return _replace_file(path, content, keep_unchanged=keep_unchanged)
+
+
+def _lock_path(path: Path) -> Path:
+    return path.with_name(f".{path.name:s}.lock")
+
+
+def _replace_file(path: Path, content: str, *, keep_unchanged: bool = True) -> bool:
+    """Write a file through a temporary file and a rename; the caller holds the lock of the file."""
+    with suppress(FileNotFoundError):
+        if keep_unchanged and path.read_text() == content:
+            return False
+    temporary_path = path.with_name(f".{path.name:s}.{os.getpid():d}.tmp")
+    try:
+        # Created like any other file, so the final file gets the permissions the umask grants
+        with open(temporary_path, "w") as temporary_file:
+            temporary_file.write(content)
+        temporary_path.replace(path)
+    except BaseException:
+        # A failed or interrupted write leaves the previous content and no partial file behind
+        temporary_path.unlink(missing_ok=True)
+        raise
+    return True
+
+
+class GitCallStats:
+    """
+    Account for the git queries made while collecting version information.
+
+    Queries are grouped by git command. Queries answered from a session's memo are counted as cache hits and start
+    no process; queries answered by the batch process are counted without starting a new one.
+    """
+
+    def __init__(self) -> None:
+        self.queries = {}
+        self.seconds = {}
+        self.processes = 0
+        self.cache_hits = 0
+
+    def record(self, command: str, seconds: float, *, started_process: bool) -> None:
+        self.queries[command] = self.queries.get(command, 0) + 1
+        self.seconds[command] = self.seconds.get(command, 0.0) + seconds
+        if started_process:
+            self.processes += 1
+
+    def summary(self) -> str:
+        total = (
+            f"git queries: {sum(self.queries.values()):d}, processes started: {self.processes:d}, "
+            f"answered from cache: {self.cache_hits:d}, time: {sum(self.seconds.values()) * 1000:.1f}ms"
+        )
+        lines = [total]
+        lines.extend(
+            f"  {command:<24s} {self.queries[command]:>4d} x {self.seconds[command] * 1000:>8.1f}ms"
+            for command in sorted(self.seconds, key=self.seconds.get, reverse=True)
+        )
+        return "\n".join(lines)
+
+
 class Git:
-    @staticmethod
-    def get_branch_name() -> str:
-        # No user input is passed to subprocess calls
-        return subprocess.check_output(["git", "rev-parse", "--abbrev-ref", "HEAD"]).strip().decode()
+    """
+    A session answering questions about one git repository during a single run.
 
-    @staticmethod
-    def get_commit_id(*, short: bool = True) -> str:
-        # No user input is passed to subprocess calls
-        command = ["git", "rev-parse"]
-        if short:
-            command.append("--short=7")
-        command.append("HEAD")
-        return subprocess.check_output(command).strip().decode()  # noqa: S603
+    Results are memoized for the lifetime of the session, so facts needed by several parts of the collection (such as
+    the commit count or the HEAD commit) are only fetched once. The queries themselves are answered by a GitBackend,
+    by default a SubprocessBackend running git. The session is meant to be short lived: changes to the repository after
+    a question was answered are not seen.
+    """
 
-    @staticmethod
-    def get_description() -> str:
-        """Output format: <tag>-<commits_since_tag>-g<commit_hash_abbrev>."""
-        # No user input is passed to subprocess calls
-        return subprocess.check_output(["git", "describe", "--tags", "--abbrev=7", "--long"]).strip().decode()
+    def __init__(
+        self,
+        path: str | Path = ".",
+        *,
+        stats: GitCallStats | None = None,
+        backend: "GitBackend | None" = None,
+        deadline: "Deadline | None" = None,
+    ) -> None:
+        self.path = Path(path)
+        self.stats = GitCallStats() if stats is None else stats
+        self.backend = SubprocessBackend() if backend is None else backend
+        self.deadline = Deadline() if deadline is None else deadline
+        # A backend passed in may serve further sessions, so it is left to its owner to close
+        self._owns_backend = backend is None
+        self._memo = {}
+
+    def __enter__(self) -> "Git":  # noqa: PYI034 - typing.Self requires Python 3.11
+        return self
+
+    def __exit__(self, *_exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._owns_backend:
+            self.backend.close()
+
+    def run(self, *args: str) -> str:
+        """Return the output of a git command, raising CalledProcessError if it fails."""
+        returncode, output = self._run(args)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, ["git", *args], output)
+        return output
+
+    def run_status(self, *args: str) -> int:
+        """Return the exit code of a git command, discarding its output."""
+        returncode, _ = self._run(args)
+        return returncode
+
+    def resolve(self, revision: str) -> str | None:
+        """Return the full object id a revision names, or None if it does not name an object."""
+        return self._memoized(
+            ("resolve", revision),
+            lambda: self._timed(
+                ("cat-file", "--batch"), lambda timeout: self.backend.resolve(self.path, revision, timeout=timeout)
+            ),
+        )
+
+    def stream(self, *args: str) -> Iterator[str]:
+        """
+        Yield the output lines of a git command while it runs, raising CalledProcessError if it fails.
+
+        Streams are not memoized; they serve walks that stop as soon as the answer is found. git is stopped when the
+        iteration is abandoned, so the rest of its output is never produced. The whole stream must finish within the
+        time the deadline leaves when it starts.
+        """
+        timeout = self._timeout(args)
+        start = time.perf_counter()
+        processes_started = self.backend.processes_started
+        lines = self.backend.stream(self.path, args, timeout=timeout)
+        try:
+            yield from lines
+        except subprocess.TimeoutExpired as exc:
+            raise DeadlineExceeded(["git", *args], exc.timeout, self.deadline.stage_name) from exc
+        finally:
+            lines.close()
+            self.stats.record(
+                args[0],
+                time.perf_counter() - start,
+                started_process=self.backend.processes_started > processes_started,
+            )
+
+    def get_branch_name(self, revision: str = "HEAD") -> str:
+        """Return the branch a revision names, or "HEAD" if it names none, such as a commit or a detached HEAD."""
+        if revision == "HEAD":
+            return self.run("rev-parse", "--abbrev-ref", "HEAD").strip()
+        ref_name = self.run("rev-parse", "--symbolic-full-name", revision).strip()
+        for prefix in ("refs/heads/", "refs/remotes/"):
+            if ref_name.startswith(prefix):
+                return ref_name.removeprefix(prefix)
+        return "HEAD"
+
+    def get_commit_id(self, *, short: bool = True, revision: str = "HEAD") -> str:
+        commit_id = self.resolve(f"{revision:s}^{{commit}}")
+        if commit_id is None:
+            raise subprocess.CalledProcessError(128, ("git", "rev-parse", revision))
+        # The short id is derived from the full one rather than asking git again
+        return commit_id[:7] if short else commit_id
+
+    def get_description(self, match_patterns: tuple[str, ...] = ()) -> str:
+        """
+        Output format: <tag>-<commits_since_tag>-g<commit_hash_abbrev>.
+
+        When match_patterns are given, only tags matching at least one of the glob patterns are considered.
+        """
+        return self.run(*self.describe_arguments(match_patterns)).strip()
 
     @staticmethod
-    def get_commit_count() -> int:
+    def describe_arguments(match_patterns: tuple[str, ...] = ()) -> list[str]:
+        """Return the arguments of the git command get_description runs."""
+        arguments = ["describe", "--tags", "--abbrev=7", "--long"]
+        for pattern in match_patterns:
+            arguments.extend(["--match", pattern])
+        return arguments
+
+    def get_commit_count(self, revision_range: str = "HEAD") -> int:
         try:
-            # No user input is passed to subprocess calls
-            return int(subprocess.check_output(["git", "rev-list", "HEAD", "--count"]))
+            return int(self.run("rev-list", "--count", revision_range).strip())
         except subprocess.CalledProcessError:
             # HEAD likely does not exist, meaning no commits
             return 0
 
-    @staticmethod
-    def get_cwd_is_not_empty() -> bool:
+    def get_git_dirs(self) -> tuple[Path, Path]:
+        """Return the git directory of the working tree and the directory shared by all of its worktrees."""
+        git_dir, common_dir = self.run("rev-parse", "--absolute-git-dir", "--git-common-dir").splitlines()
+        # The common directory is reported relative to the directory the command runs in
+        return Path(git_dir), (self.path / common_dir).resolve()
+
+    def get_cwd_is_not_empty(self) -> bool:
         """Return true if a directory contains files besides a .git directory."""
         # listdir offers a simpler and more readable way to collect all files in a directory
-        all_entries = os.listdir(Path.cwd())  # noqa: PTH208
+        all_entries = os.listdir(self.path)  # noqa: PTH208
         nongit_entries = [entry for entry in all_entries if entry != ".git"]
         return len(nongit_entries) != 0
 
+    def get_uses_status_cache(self) -> bool:
+        """Return true if the untracked cache or a filesystem monitor is enabled, which only `git status` uses."""
+        try:
+            settings_raw = self.run(
+                "config", "--get-regexp", r"^(core\.untrackedcache|core\.fsmonitor|feature\.manyfiles)$"
+            )
+        except subprocess.CalledProcessError:
+            # None of the settings are present
+            return False
+        for line in settings_raw.splitlines():
+            _, _, value = line.partition(" ")
+            if value.lower() not in {"", "false", "no", "off", "0"}:
+                return True
+        return False
+
+    def get_is_dirty(self, options: "DirtyCheckOptions | None" = None) -> bool:
+        if options is None:
+            options = DirtyCheckOptions()
+        pathspec_args = ["--", *options.pathspecs] if options.pathspecs else []
+        submodule_args = [] if options.include_submodules else ["--ignore-submodules=all"]
+
+        if self.get_uses_status_cache():
+            # A single status call lets git answer from the untracked cache and the filesystem monitor
+            untracked_files_mode = "normal" if options.include_untracked else "no"
+            status_command = ["status", "--porcelain", f"--untracked-files={untracked_files_mode:s}"]
+            return self.run(*status_command, *submodule_args, *pathspec_args).strip() != ""
+
+        # Each check only runs if the previous ones found the tree clean
+        diff_command = ["diff", "--quiet", "--exit-code", *submodule_args]
+        if self.run_status(*diff_command, "--cached", "HEAD", *pathspec_args) != 0:
+            return True  # staged changes
+        if self.run_status(*diff_command, "HEAD", *pathspec_args) != 0:
+            return True  # unstaged changes
+        if not options.include_untracked:
+            return False
+        return self.run("ls-files", "--exclude-standard", "--others", *pathspec_args).strip() != ""
+
+    def _run(self, args: tuple[str, ...]) -> tuple[int, str]:
+        def query(timeout: float | None) -> tuple[int, str]:
+            return self.backend.run(self.path, args, timeout=timeout)
+
+        return self._memoized(("run", *args), lambda: self._timed(args, query))
+
+    def _memoized(self, key: tuple, query: Callable[[], object]) -> object:
+        if key in self._memo:
+            self.stats.cache_hits += 1
+            return self._memo[key]
+        result = query()
+        self._memo[key] = result
+        return result
+
+    def _timed(self, args: tuple[str, ...], query: Callable[[float | None], object]) -> object:
+        """Answer a query within the time the deadline leaves, accounting for it under the git command it runs."""
+        timeout = self._timeout(args)
+        start = time.perf_counter()
+        processes_started = self.backend.processes_started
+        try:
+            return query(timeout)
+        except subprocess.TimeoutExpired as exc:
+            raise DeadlineExceeded(["git", *args], exc.timeout, self.deadline.stage_name) from exc
+        finally:
+            self.stats.record(
+                " ".join(args) if args[0] == "cat-file" else args[0],
+                time.perf_counter() - start,
+                started_process=self.backend.processes_started > processes_started,
+            )
+
+    def _timeout(self, args: tuple[str, ...]) -> float | None:
+        timeout = self.deadline.remaining()
+        if timeout is not None and timeout <= 0:
+            # No process is started once the time is up
+            raise DeadlineExceeded(["git", *args], 0.0, self.deadline.stage_name)
+        return timeout
+
+
+# Stages of a collection that Deadline limits individually: resolving HEAD and the branch, selecting the tag and
+# counting the commits since it, and detecting uncommitted changes
+DEADLINE_STAGES = ("head", "tag", "dirty")
+
+# What a collection does when the deadline of the dirty stage passes: fail, or report the dirty state as unknown
+DEADLINE_POLICIES = ("fail", "degrade")
+
+
+class DeadlineExceeded(subprocess.TimeoutExpired):
+    """A git query was stopped, or not started, because the deadline of the collection or of its stage passed."""
+
+    def __init__(self, cmd: list[str], timeout: float, stage: str) -> None:
+        super().__init__(cmd, timeout)
+        self.stage = stage
+
+    def __str__(self) -> str:
+        return f"git {self.cmd[1]:s} did not finish before the deadline of the {self.stage:s} stage"
+
+
+class Deadline:
+    """
+    A time budget for the git queries of a collection, killing git when it runs out.
+
+    seconds limits the whole collection, counted from start(); stage_limits additionally limit the queries made while
+    a stage (one of DEADLINE_STAGES) is active. Each query may use whatever is left of both. A limit of None means no
+    limit. policy (one of DEADLINE_POLICIES) tells collectors how to handle a passed deadline.
+    """
+
+    def __init__(
+        self, seconds: float | None = None, *, stage_limits: dict[str, float] | None = None, policy: str = "fail"
+    ) -> None:
+        stage_limits = {} if stage_limits is None else dict(stage_limits)
+        unknown_stages = set(stage_limits) - set(DEADLINE_STAGES)
+        if unknown_stages:
+            msg = f"Unknown deadline stage: {', '.join(sorted(unknown_stages)):s}"
+            raise ValueError(msg)
+        if policy not in DEADLINE_POLICIES:
+            msg = f"Unknown deadline policy: {policy:s}"
+            raise ValueError(msg)
+        self.seconds = seconds
+        self.stage_limits = stage_limits
+        self.policy = policy
+        self._end = None
+        self._stage = None
+        self._stage_end = None
+        self.start()
+
+    def start(self) -> None:
+        """Start the budget of the whole collection anew."""
+        self._end = None if self.seconds is None else time.monotonic() + self.seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Apply the limit of a stage to the queries made within the context."""
+        previous = self._stage, self._stage_end
+        limit = self.stage_limits.get(name)
+        self._stage, self._stage_end = name, None if limit is None else time.monotonic() + limit
+        try:
+            yield
+        finally:
+            self._stage, self._stage_end = previous
+
+    @property
+    def stage_name(self) -> str:
+        return self._stage or "collection"
+
+    def remaining(self) -> float | None:
+        """Return the seconds left for a query, or None if there is no limit."""
+        ends = [end for end in (self._end, self._stage_end) if end is not None]
+        if not ends:
+            return None
+        return max(min(ends) - time.monotonic(), 0.0)
+
+
+@contextmanager
+def _killed_after(process: subprocess.Popen, timeout: float | None) -> Iterator[threading.Event]:
+    """Kill a process still running after timeout seconds; the event yielded is set if it was killed."""
+    expired = threading.Event()
+    if timeout is None:
+        yield expired
+        return
+
+    def expire() -> None:
+        expired.set()
+        with suppress(OSError):
+            process.kill()
+
+    timer = threading.Timer(timeout, expire)
+    timer.daemon = True
+    timer.start()
+    try:
+        yield expired
+    finally:
+        timer.cancel()
+
+
+class GitBackend(Protocol):
+    """
+    Answers the git queries of Git sessions; the sessions add memoization and call accounting on top.
+
+    Every query names the directory git runs in, so one backend can serve the sessions of several repositories.
+    """
+
+    # Number of processes started so far, which lets sessions account for the processes their queries started
+    processes_started: int
+    # Whether answers come from the repository on this machine, so files in its git directory describe the same state.
+    # Caches stored there would change which queries are made, so they are only used when this is true.
+    uses_repository_files: bool
+
+    def run(self, path: Path, args: tuple[str, ...], *, timeout: float | None = None) -> tuple[int, str]:
+        """Return the exit code and the output of a git command, raising TimeoutExpired after timeout seconds."""
+
+    def resolve(self, path: Path, revision: str, *, timeout: float | None = None) -> str | None:
+        """Return the full object id a revision names, or None if it does not name an object."""
+
+    def stream(self, path: Path, args: tuple[str, ...], *, timeout: float | None = None) -> Iterator[str]:
+        """Yield the output lines of a git command, raising CalledProcessError if it fails."""
+
+    def close(self) -> None:
+        """Release the resources held by the backend."""
+
+
+class SubprocessBackend:
+    """Answer queries by running git. Object lookups share one GitBatch process per repository."""
+
+    uses_repository_files = True
+
+    def __init__(self) -> None:
+        self.processes_started = 0
+        self._batches = {}
+
+    def run(self, path: Path, args: tuple[str, ...], *, timeout: float | None = None) -> tuple[int, str]:
+        self.processes_started += 1
+        # Arguments are passed to git directly, never interpreted by a shell; git is killed on timeout
+        completed = subprocess.run(  # noqa: S603
+            ["git", *args], cwd=path, capture_output=True, check=False, timeout=timeout
+        )
+        return completed.returncode, completed.stdout.decode()
+
+    def resolve(self, path: Path, revision: str, *, timeout: float | None = None) -> str | None:
+        batch = self._batches.setdefault(path, GitBatch(path))
+        if not batch.is_running:
+            self.processes_started += 1
+        return batch.resolve(revision, timeout=timeout)
+
+    def stream(self, path: Path, args: tuple[str, ...], *, timeout: float | None = None) -> Iterator[str]:
+        self.processes_started += 1
+        # Arguments are passed to git directly, never interpreted by a shell
+        process = subprocess.Popen(  # noqa: S603
+            ["git", *args], cwd=path, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        try:
+            with _killed_after(process, timeout) as expired:
+                for line in process.stdout:
+                    yield line.decode().rstrip("\n")
+                process.wait()
+            if expired.is_set():
+                raise subprocess.TimeoutExpired(["git", *args], timeout)
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, ["git", *args])
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+
+    def close(self) -> None:
+        for batch in self._batches.values():
+            batch.close()
+        self._batches = {}
+
+
+class GitTrace:
+    """
+    Answers to git queries captured by a RecordingBackend, which a ReplayBackend serves without running git.
+
+    Queries are identified by their kind, the directory they ran in and their arguments. Traces are stored as JSON.
+    """
+
+    FORMAT = 1
+
+    def __init__(self, answers: dict | None = None) -> None:
+        self.answers = {} if answers is None else answers
+
+    def save(self, trace_path: str | Path) -> None:
+        entries = [{"query": list(query), "answer": answer} for query, answer in self.answers.items()]
+        write_file_atomic(trace_path, json.dumps({"format": self.FORMAT, "queries": entries}, indent=2) + "\n")
+
+    @classmethod
+    def load(cls, trace_path: str | Path) -> "GitTrace":
+        trace = json.loads(Path(trace_path).read_text())
+        if trace.get("format") != cls.FORMAT:
+            msg = f"Unsupported git trace format in {trace_path!s}"
+            raise ValueError(msg)
+        return cls({tuple(entry["query"]): entry["answer"] for entry in trace["queries"]})
+
+
+class RecordingBackend:
+    """
+    Forward queries to another backend, by default a SubprocessBackend, and record their answers in a GitTrace.
+
+    Caches in the git directory are not used while recording, so the trace holds every query a collection needs no
+    matter what previous runs stored.
+    """
+
+    uses_repository_files = False
+
+    def __init__(self, backend: GitBackend | None = None) -> None:
+        self.backend = SubprocessBackend() if backend is None else backend
+        self.trace = GitTrace()
+
+    @property
+    def processes_started(self) -> int:
+        return self.backend.processes_started
+
+    def run(self, path: Path, args: tuple[str, ...], *, timeout: float | None = None) -> tuple[int, str]:
+        returncode, output = self.backend.run(path, args, timeout=timeout)
+        self.trace.answers[("run", str(path), *args)] = [returncode, output]
+        return returncode, output
+
+    def resolve(self, path: Path, revision: str, *, timeout: float | None = None) -> str | None:
+        object_id = self.backend.resolve(path, revision, timeout=timeout)
+        self.trace.answers[("resolve", str(path), revision)] = object_id
+        return object_id
+
+    def stream(self, path: Path, args: tuple[str, ...], *, timeout: float | None = None) -> Iterator[str]:
+        # An abandoned stream is recorded up to where it was abandoned, which is as far as a replay of the same
+        # collection reads
+        answer = {"lines": [], "complete": False, "returncode": 0}
+        self.trace.answers[("stream", str(path), *args)] = answer
+        lines = self.backend.stream(path, args, timeout=timeout)
+        try:
+            for line in lines:
+                answer["lines"].append(line)
+                yield line
+            answer["complete"] = True
+        except subprocess.CalledProcessError as exc:
+            answer["complete"] = True
+            answer["returncode"] = exc.returncode
+            raise
+        finally:
+            lines.close()
+
+    def close(self) -> None:
+        self.backend.close()
+
+
+class ReplayBackend:
+    """
+    Serve the answers of a GitTrace from memory, without starting any process.
+
+    A query missing from the trace raises LookupError, as the collection then differs from the recorded one.
+    """
+
+    processes_started = 0
+    uses_repository_files = False
+
+    def __init__(self, trace: GitTrace) -> None:
+        self.trace = trace
+
+    def run(self, path: Path, args: tuple[str, ...], *, timeout: float | None = None) -> tuple[int, str]:  # noqa: ARG002 - answers are immediate
+        returncode, output = self._answer("run", path, *args)
+        return returncode, output
+
+    def resolve(self, path: Path, revision: str, *, timeout: float | None = None) -> str | None:  # noqa: ARG002 - answers are immediate
+        return self._answer("resolve", path, revision)
+
+    def stream(self, path: Path, args: tuple[str, ...], *, timeout: float | None = None) -> Iterator[str]:  # noqa: ARG002 - answers are immediate
+        answer = self._answer("stream", path, *args)
+        yield from answer["lines"]
+        if not answer["complete"]:
+            msg = f"git trace ends before the output of git {' '.join(args):s} in {path!s} does"
+            raise LookupError(msg)
+        if answer["returncode"] != 0:
+            raise subprocess.CalledProcessError(answer["returncode"], ["git", *args])
+
+    def close(self) -> None:
+        pass
+
+    def _answer(self, kind: str, path: Path, *args: str) -> object:
+        try:
+            return self.trace.answers[(kind, str(path), *args)]
+        except KeyError:
+            msg = f"git trace has no answer to {kind:s} {' '.join(args):s} in {path!s}"
+            raise LookupError(msg) from None
+
+
+class GitBatch:
+    """
+    A long-lived `git cat-file --batch` process answering object queries for one repository.
+
+    Queries accept any revision expression understood by git (e.g. "HEAD" or "v1.0.0^{commit}"), so resolving
+    revisions, peeling tags and reading commits go through a single process instead of starting one per question.
+    The process is started on the first query and stopped by close() or when leaving the context manager.
+    """
+
+    _COMMAND = ("git", "cat-file", "--batch")
+
+    def __init__(self, path: str | Path | None = None, *, stats: GitCallStats | None = None) -> None:
+        self.path = path
+        self.stats = stats
+        self._process = None
+
+    def __enter__(self) -> "GitBatch":  # noqa: PYI034 - typing.Self requires Python 3.11
+        return self
+
+    def __exit__(self, *_exc_info: object) -> None:
+        self.close()
+
+    @property
+    def is_running(self) -> bool:
+        return self._process is not None
+
+    def read(self, revision: str, *, timeout: float | None = None) -> tuple[str, str, bytes] | None:
+        """
+        Return (object id, object type, content) of a revision, or None if it does not name an object.
+
+        If no answer arrives within timeout seconds, the process is killed and TimeoutExpired raised; the next query
+        starts a new one.
+        """
+        if "\n" in revision:
+            # A newline would be read as the start of a second query
+            return None
+        start = time.perf_counter()
+        started_process = self._process is None
+        if started_process:
+            # No user input is passed to subprocess calls
+            self._process = subprocess.Popen(  # noqa: S603
+                self._COMMAND, cwd=self.path, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+            )
+        with _killed_after(self._process, timeout) as expired:
+            try:
+                self._process.stdin.write(revision.encode() + b"\n")
+                self._process.stdin.flush()
+                header = self._process.stdout.readline()
+            except OSError:
+                header = b""
+            result = self._read_content(header) if header else None
+        if expired.is_set():
+            self._process.wait()
+            self._process.stdout.close()
+            self._process = None
+            raise subprocess.TimeoutExpired(self._COMMAND, timeout)
+        if not header:
+            # git exited, e.g. because the directory is not a git repository
+            returncode = self._process.wait()
+            self._process = None
+            raise subprocess.CalledProcessError(returncode, self._COMMAND)
+
+        if self.stats is not None:
+            self.stats.record("cat-file --batch", time.perf_counter() - start, started_process=started_process)
+        return result
+
+    def resolve(self, revision: str, *, timeout: float | None = None) -> str | None:
+        """Return the full object id a revision names, or None if it does not name an object."""
+        result = self.read(revision, timeout=timeout)
+        return result[0] if result else None
+
+    def _read_content(self, header: bytes) -> tuple[str, str, bytes] | None:
+        # "<object id> <type> <size>" on success, "<revision> missing" or "<revision> ambiguous" otherwise
+        fields = header.split()
+        if not fields[-1].isdigit():
+            return None
+        object_id, object_type, size = fields[-3:]
+        content = self._process.stdout.read(int(size))
+        self._process.stdout.read(1)  # newline terminating the content
+        return object_id.decode(), object_type.decode(), content
+
+    def close(self) -> None:
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        # Closing stdin ends the batch; git exits once all queries are answered
+        with suppress(OSError):
+            process.stdin.close()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+
+
+class _SharedStore:
+    """
+    A JSON document in the cache directory shared by all worktrees of a repository.
+
+    Runs in sibling worktrees may update the store at the same time. Updates re-read the document while holding its
+    lock and apply their change to what they read, so no run loses the entries of another, and readers only ever see a
+    complete document. A store that cannot be read or written only costs the queries it would have saved.
+    """
+
+    def __init__(self, path: Path, file_format: int) -> None:
+        self.path = path
+        self.file_format = file_format
+
+    def load(self) -> dict:
+        try:
+            document = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(document, dict) or document.pop("format", None) != self.file_format:
+            return {}
+        return document
+
+    def update(self, change: Callable[[dict], None]) -> None:
+        # The git directory may be read-only, in which case later runs query git again
+        with suppress(OSError):
+            self.path.parent.mkdir(exist_ok=True)
+            with file_lock(_lock_path(self.path)):
+                document = self.load()
+                change(document)
+                _replace_file(self.path, json.dumps({"format": self.file_format, **document}, indent=2) + "\n")
+
+
+# Directory below the git common directory holding the caches shared by all worktrees of a repository
+SHARED_CACHE_DIRECTORY = "plxsversion"
+
+
+def _shared_cache_dirs(git: Git) -> tuple[Path, Path] | None:
+    """
+    Return the git directory of the worktree and the shared cache directory, or None if caches must not be used.
+
+    Caches are only used for repositories on this machine, and not with the reftable ref storage, whose tables are
+    not covered by the fingerprint of TagQueryCache.
+    """
+    if not git.backend.uses_repository_files:
+        return None
+    git_dir, common_dir = git.get_git_dirs()
+    if (common_dir / "reftable").exists():
+        return None
+    return git_dir, common_dir / SHARED_CACHE_DIRECTORY
+
+
+class CommitCountCache:
+    """
+    Count the commits between a base commit and HEAD incrementally across runs and worktrees.
+
+    Counts are stored per base commit and HEAD in the cache directory shared by all worktrees, as they only depend on
+    the commits. A worktree whose HEAD was already counted, e.g. by a sibling worktree, gets the count without asking
+    git. Otherwise the HEAD the worktree last counted for the base, or the one most recently counted by any worktree,
+    serves as a starting point: when HEAD descends from it, only the commits HEAD added are counted, so moving forward
+    on a branch with thousands of commits since its tag costs as much as the new commits. After a rebase or reset,
+    the full range is counted again, as it is when the new commits cannot be verified. Shallow repositories are
+    always counted in full, as deepening them changes past counts.
+    """
+
+    FILE_NAME = "commit-counts.json"
+    FORMAT = 2
+    # Base commits remembered, and counted HEADs remembered per base, most recently used last
+    MAX_BASES = 16
+    MAX_HEADS = 32
+    # New commits without new parents checked against the starting point before the full range is counted instead
+    MAX_VERIFIED_COMMITS = 8
+
+    def __init__(self, git: Git) -> None:
+        self._git = git
+        self._store = None
+        self._worktree = None
+
+    def count(self, base_commit: str | None, head_commit: str) -> int:
+        """Return the number of commits reachable from head_commit but not from base_commit, or all of them if None."""
+        if not self._open():
+            return self._count_range(base_commit, head_commit)
+
+        key = base_commit or ""
+        document = self._store.load()
+        counts = document.get("counts", {}).get(key, {})
+        count = counts.get(head_commit)
+        if count is None:
+            count = self._count_from_start_points(base_commit, head_commit, counts, document)
+
+        def record(stored: dict) -> None:
+            stored_counts = stored.setdefault("counts", {})
+            heads = stored_counts.pop(key, {})
+            heads.pop(head_commit, None)
+            heads[head_commit] = count
+            stored_counts[key] = dict(list(heads.items())[-self.MAX_HEADS :])
+            stored["counts"] = dict(list(stored_counts.items())[-self.MAX_BASES :])
+            anchors = stored.setdefault("anchors", {})
+            anchors.setdefault(self._worktree, {})[key] = head_commit
+            # Worktrees that were removed do not need their anchors
+            stored["anchors"] = {worktree: heads for worktree, heads in anchors.items() if Path(worktree).is_dir()}
+
+        self._store.update(record)
+        return count
+
+    def _count_from_start_points(self, base_commit: str | None, head_commit: str, counts: dict, document: dict) -> int:
+        start_points = [document.get("anchors", {}).get(self._worktree, {}).get(base_commit or "")]
+        if counts:
+            start_points.append(next(reversed(counts)))
+        for start_point in dict.fromkeys(start_points):
+            if start_point not in counts:
+                continue
+            if self._git.run_status("merge-base", "--is-ancestor", start_point, head_commit) != 0:
+                continue
+            # The base is reachable from the start point, so no commit added since can be reachable from it
+            if base_commit and self._git.run_status("merge-base", "--is-ancestor", base_commit, start_point) != 0:
+                continue
+            added_count = self._count_added(start_point, head_commit)
+            if added_count is not None:
+                return counts[start_point] + added_count
+        return self._count_range(base_commit, head_commit)
+
+    def _count_added(self, start_point: str, head_commit: str) -> int | None:
+        """
+        Return the number of commits reachable from head_commit but not from start_point, or None if it is not certain.
+
+        git stops walking once only excluded commits are left for a while, so commit dates skewed against the history
+        can make it list commits that the start point reaches. Following the parents of such a commit among the listed
+        ones ends at a commit with no listed parent, so checking those few commits against the start point is enough.
+        """
+        parents = {}
+        for line in self._git.run("rev-list", "--parents", head_commit, f"^{start_point:s}").splitlines():
+            commit, *commit_parents = line.split()
+            parents[commit] = commit_parents
+        oldest_commits = [
+            commit
+            for commit, commit_parents in parents.items()
+            if not any(parent in parents for parent in commit_parents)
+        ]
+        if len(oldest_commits) > self.MAX_VERIFIED_COMMITS:
+            return None
+        for commit in oldest_commits:
+            if self._git.run_status("merge-base", "--is-ancestor", commit, start_point) == 0:
+                return None
+        return len(parents)
+
+    def _count_range(self, base_commit: str | None, head_commit: str) -> int:
+        base_exclusion = (f"^{base_commit:s}",) if base_commit else ()
+        return int(self._git.run("rev-list", "--count", head_commit, *base_exclusion).strip())
+
+    def _open(self) -> bool:
+        """Return whether counts can be stored for this repository."""
+        if self._store is not None:
+            return True
+        dirs = _shared_cache_dirs(self._git)
+        if dirs is None or (dirs[1].parent / "shallow").exists():
+            return False
+        git_dir, cache_dir = dirs
+        self._worktree = str(git_dir)
+        self._store = _SharedStore(cache_dir / self.FILE_NAME, self.FORMAT)
+        return True
+
+
+class TagQueryCache:
+    """
+    Answer git queries whose result only depends on the tags, and optionally on the HEAD commit, across runs.
+
+    Results are stored in the cache directory shared by all worktrees, so sibling worktrees checked out at the same
+    commit share e.g. the `git describe` of that commit, and every worktree shares listings of the tags. Stored
+    results are tied to a fingerprint of the refs they depend on: the modification times of the directories below
+    refs/tags and refs/replace, and of packed-refs, shallow and info/grafts. Creating, moving or deleting a tag
+    changes it and drops every stored result. Refs changed too recently to be told apart by the file system clock
+    are not trusted, so results are only stored once the fingerprint has settled.
+    """
+
+    FILE_NAME = "tag-queries.json"
+    FORMAT = 1
+    MAX_ENTRIES = 64
+    # Changes within this many seconds of a fingerprint may not have changed the modification times it is made of
+    SETTLE_SECONDS = 2.0
+
+    def __init__(self, git: Git) -> None:
+        self._git = git
+        self._store = None
+        self._fingerprint = None
+        self._latest_change = 0.0
+
+    def run(self, *args: str, head_commit: str | None = None) -> str:
+        """
+        Return the output of a git command, raising CalledProcessError if it fails, like Git.run.
+
+        head_commit is the commit HEAD pointed at, which must be given if the result depends on HEAD.
+        """
+        if not self._open():
+            return self._git.run(*args)
+
+        key = json.dumps([head_commit, *args])
+        document = self._store.load()
+        if document.get("fingerprint") == self._fingerprint and key in document.get("results", {}):
+            self._git.stats.cache_hits += 1
+            returncode, output = document["results"][key]
+        else:
+            try:
+                returncode, output = 0, self._git.run(*args)
+            except subprocess.CalledProcessError as exc:
+                returncode, output = exc.returncode, exc.output
+            if self._fingerprint_settled():
+                self._store.update(lambda stored: self._record(stored, key, [returncode, output]))
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, ["git", *args], output)
+        return output
+
+    def _record(self, stored: dict, key: str, result: list) -> None:
+        if stored.get("fingerprint") != self._fingerprint:
+            # Results of other fingerprints describe refs that no longer exist, or that a concurrent run already
+            # replaced; in the latter case, that run stores its results again
+            stored["fingerprint"] = self._fingerprint
+            stored["results"] = {}
+        results = stored["results"]
+        results.pop(key, None)
+        results[key] = result
+        stored["results"] = dict(list(results.items())[-self.MAX_ENTRIES :])
+
+    def _open(self) -> bool:
+        if self._store is not None:
+            return True
+        dirs = _shared_cache_dirs(self._git)
+        if dirs is None:
+            return False
+        _, cache_dir = dirs
+        self._fingerprint, self._latest_change = self._fingerprint_refs(cache_dir.parent)
+        self._store = _SharedStore(cache_dir / self.FILE_NAME, self.FORMAT)
+        return True
+
+    def _fingerprint_settled(self) -> bool:
+        return time.time() - self._latest_change > self.SETTLE_SECONDS
+
     @staticmethod
-    def get_is_dirty() -> bool:
-        # No user input is passed to subprocess calls
-        staged_changes = subprocess.call(["git", "diff", "--quiet", "--cached", "--exit-code", "HEAD"]) != 0
-        unstaged_changes = subprocess.call(["git", "diff", "--quiet", "--exit-code", "HEAD"]) != 0
-        untracked_files = subprocess.check_output(["git", "ls-files", "--exclude-standard", "--others"]).decode() != ""
-        return staged_changes or unstaged_changes or untracked_files
+    def _fingerprint_refs(common_dir: Path) -> tuple[str, float]:
+        """Return a fingerprint of the refs tag queries depend on and the time they last changed."""
+        entries = []
+        for name in ("packed-refs", "shallow", "info/grafts"):
+            with suppress(FileNotFoundError):
+                status = (common_dir / name).stat()
+                entries.append((name, status.st_mtime_ns, status.st_size, status.st_ino))
+        for name in ("refs/tags", "refs/replace"):
+            for directory, _, _ in sorted(os.walk(common_dir / name)):
+                with suppress(FileNotFoundError):
+                    status = Path(directory).stat()
+                    entries.append((directory, status.st_mtime_ns, 0, status.st_ino))
+        latest_change = max((mtime_ns for _, mtime_ns, _, _ in entries), default=0) / 1e9
+        return hashlib.sha256(json.dumps(entries).encode()).hexdigest(), latest_change
+
+
+class DirtyCheckOptions:
+    """
+    Restrict which parts of a working tree are inspected when checking for uncommitted changes.
+
+    Pathspecs are interpreted by git relative to the directory the check runs in. An empty tuple checks the whole
+    working tree.
+    """
+
+    def __init__(
+        self, *, pathspecs: tuple[str, ...] = (), include_untracked: bool = True, include_submodules: bool = True
+    ) -> None:
+        self.pathspecs = tuple(pathspecs)
+        self.include_untracked = include_untracked
+        self.include_submodules = include_submodules
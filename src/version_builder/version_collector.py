@@ -1,17 +1,167 @@
+import hashlib
+import heapq
+import json
+import os
 import re
 import subprocess
+from collections.abc import Iterator, Mapping
 from pathlib import Path
 
 from version_builder import utils
-from version_builder.version_data import VersionData
+from version_builder.version_data import SEMVER_PATTERN, VersionData, precedence_key
 
+# Strategies for selecting the tag a version is derived from:
+#   creatordate: the most recently created SemVer tag reachable from HEAD
+#   highest: the SemVer tag with the highest precedence reachable from HEAD
+#   nearest: the SemVer tag on the first tagged commit met when walking history back from HEAD
+TAG_STRATEGIES = ("creatordate", "highest", "nearest")
 
-def from_git(git_directory: str) -> VersionData:
-    return _Git().get_version(git_directory)
+# Tag strategies of history_from_git. The nearest tag depends on the order in which history is walked from each
+# commit, which a single walk of a range does not reproduce.
+HISTORY_TAG_STRATEGIES = ("creatordate", "highest")
 
+# Glob prefilters for `git describe`. Every SemVer tag, with or without a leading 'v', starts with a digit and has at
+# least three dot-separated components. Globs cannot express the full grammar, so matches are validated afterwards.
+_DESCRIBE_MATCH_PATTERNS = ("[0-9]*.[0-9]*.[0-9]*", "v[0-9]*.[0-9]*.[0-9]*")
 
-def from_file(file_path: str) -> VersionData:
-    return _File().get_version(file_path)
+
+def from_git(  # noqa: PLR0913 - each option selects an independent part of the collection
+    git_directory: str,
+    *,
+    tag_strategy: str = "creatordate",
+    use_describe: bool = True,
+    dirty_options: utils.DirtyCheckOptions | None = None,
+    stats: utils.GitCallStats | None = None,
+    backend: utils.GitBackend | None = None,
+    deadline: utils.Deadline | None = None,
+    revision: str | None = None,
+) -> VersionData:
+    """
+    Collect version data from a git repository.
+
+    When stats is given, every git query made during the collection is accounted in it. backend answers the git
+    queries instead of running git directly, e.g. to record or replay them. deadline limits the time git may take.
+    revision collects the version of another commit than HEAD from the object database, without checking it out; as
+    it has no working tree, dirty detection does not apply to it. A revision of HEAD is collected as without one.
+    """
+    return _Git(
+        tag_strategy=tag_strategy,
+        use_describe=use_describe,
+        dirty_options=dirty_options,
+        stats=stats,
+        backend=backend,
+        deadline=deadline,
+        revision=revision,
+    ).get_version(git_directory)
+
+
+def from_file(
+    file_path: str,
+    *,
+    dirty_options: utils.DirtyCheckOptions | None = None,
+    stats: utils.GitCallStats | None = None,
+    backend: utils.GitBackend | None = None,
+    deadline: utils.Deadline | None = None,
+) -> VersionData:
+    return _File(dirty_options=dirty_options, stats=stats, backend=backend, deadline=deadline).get_version(file_path)
+
+
+def history_from_git(
+    git_directory: str,
+    revision_range: str,
+    *,
+    tag_strategy: str = "creatordate",
+    stats: utils.GitCallStats | None = None,
+    backend: utils.GitBackend | None = None,
+) -> Iterator[tuple[str, "VersionData | VersionCollectError"]]:
+    """
+    Collect the version of every commit in a revision range with a single walk of its history.
+
+    revision_range is "A..B" for the commits reachable from B but not from A, or "B" for every commit reachable from B;
+    an omitted side means HEAD, as in git. Yields (full commit id, version data) from the oldest commit to the newest.
+    The version data is that of from_git with use_describe=False at the commit checked out without changes, or the
+    VersionCollectError from_git would raise there.
+    """
+    return _History(tag_strategy=tag_strategy, stats=stats, backend=backend).walk(git_directory, revision_range)
+
+
+def from_archive(archival_file_path: str) -> VersionData:
+    """Build version data from a metadata file expanded by `git archive` (export-subst), without running git."""
+    return _Archive().get_version(archival_file_path)
+
+
+def from_frozen(record_path: str) -> VersionData:
+    """Load version data from a record written by write_frozen, without running git."""
+    return _Frozen().get_version(record_path)
+
+
+def write_frozen(version_data: VersionData, record_path: str) -> None:
+    """Write fully resolved version data to a checksummed record that from_frozen can load."""
+    fields = {field: getattr(version_data, field) for field in _Frozen.FIELDS}
+    # Optional fields are only written when set, so records stay readable by versions that do not know them
+    fields.update(
+        {
+            field: getattr(version_data, field)
+            for field, default in _Frozen.OPTIONAL_FIELDS
+            if getattr(version_data, field) != default
+        }
+    )
+    record = {
+        "format": _Frozen.FORMAT,
+        "version": fields,
+        "qualified_version": version_data.qualified_version,
+        "sha256": _Frozen.checksum(fields),
+    }
+    # Parallel builds may read the record while it is replaced, so it is never seen half written
+    utils.write_file_atomic(record_path, json.dumps(record, indent=2) + "\n")
+
+
+def from_env(mapping: str = "auto", *, environ: Mapping[str, str] | None = None) -> VersionData:
+    """
+    Build version data from variables exported by a CI runner, without running git.
+
+    mapping is the name of a known CI provider, "auto" to detect the provider, or the path to a JSON file mapping
+    fields to variables in the format of CI_ENVIRONMENT_MAPPINGS.
+    """
+    return _Env(environ=environ).get_version(mapping)
+
+
+# Environment variable naming a frozen version record. When set, it overrides the requested source so that nested and
+# child builds render the version their parent resolved.
+RESOLVED_ENV_VAR = "PLXSVERSION_RESOLVED"
+
+# Template of the metadata file read by the archive source. Git expands the placeholders when the file is exported by
+# `git archive` and has the export-subst attribute.
+ARCHIVAL_FILE_TEMPLATE = """node: $Format:%H$
+describe-name: $Format:%(describe:tags=true,match=[0-9]*.[0-9]*.[0-9]*,match=v[0-9]*.[0-9]*.[0-9]*)$
+ref-names: $Format:%D$
+"""
+
+# Environment variables exported by CI providers, in order of preference for each field. An entry of the form
+# "VARIABLE:prefix" only applies when the variable's value starts with the prefix, which is then stripped.
+CI_ENVIRONMENT_MAPPINGS = {
+    "github": {
+        "commit_id": ["GITHUB_SHA"],
+        "branch_name": ["GITHUB_HEAD_REF", "GITHUB_REF:refs/heads/"],
+        "tag": ["GITHUB_REF:refs/tags/"],
+        "build_number": ["GITHUB_RUN_NUMBER"],
+    },
+    "gitlab": {
+        "commit_id": ["CI_COMMIT_SHA"],
+        "branch_name": ["CI_MERGE_REQUEST_SOURCE_BRANCH_NAME", "CI_COMMIT_BRANCH"],
+        "tag": ["CI_COMMIT_TAG"],
+        "build_number": ["CI_PIPELINE_IID"],
+    },
+    "jenkins": {
+        "commit_id": ["GIT_COMMIT"],
+        "branch_name": ["CHANGE_BRANCH", "GIT_LOCAL_BRANCH", "GIT_BRANCH:origin/", "GIT_BRANCH"],
+        "tag": ["TAG_NAME"],
+        "build_number": ["BUILD_NUMBER"],
+    },
+}
+
+# Variables whose presence identifies the CI provider a job runs on
+_CI_PROVIDER_MARKERS = {"github": "GITHUB_ACTIONS", "gitlab": "GITLAB_CI", "jenkins": "JENKINS_URL"}
 
 
 class VersionCollectError(Exception):
@@ -23,11 +173,42 @@ class VersionCollectError(Exception):
 
 
 class _VersionCollector:
-    def __init__(self) -> None:
-        pass
+    def __init__(
+        self,
+        *,
+        dirty_options: utils.DirtyCheckOptions | None = None,
+        stats: utils.GitCallStats | None = None,
+        backend: utils.GitBackend | None = None,
+        deadline: utils.Deadline | None = None,
+    ) -> None:
+        self.dirty_options = dirty_options
+        self.stats = stats
+        self.backend = backend
+        self.deadline = utils.Deadline() if deadline is None else deadline
 
     def get_version(self, data_source: str) -> VersionData:
-        return self.compute_version(data_source)
+        self.deadline.start()
+        try:
+            return self.compute_version(data_source)
+        except utils.DeadlineExceeded as exc:
+            raise VersionCollectError(str(exc)) from exc
+
+    def _get_dirty_state(self, git: utils.Git) -> tuple[bool, bool]:
+        """
+        Return whether the working tree has changes and whether that is unknown.
+
+        When the deadline of the dirty stage passes under the degrade policy, the state is reported as unknown instead
+        of failing the collection.
+        """
+        with self.deadline.stage("dirty"):
+            try:
+                return git.get_is_dirty(self.dirty_options), False
+            except utils.DeadlineExceeded as exc:
+                if self.deadline.policy != "degrade":
+                    raise
+                # Intentional print for user status notification
+                print(f"Warning: {exc!s}, the version is marked dirty-unknown.")  # noqa: T201
+                return True, True
 
     def _process_tag(self, raw_tag: str) -> str:
         # Strip leading 'v' if present, as SemVer itself doesn't include it.
@@ -36,118 +217,503 @@ class _VersionCollector:
             return raw_tag[1:]
         return raw_tag
 
-
-class _Git(_VersionCollector):
-    # Official SemVer 2.0.0 regex from version_data.py
-    _SEMVER_REGEX = r"^(0|[1-9]\d*)\.(0|[1-9]\d*)\.(0|[1-9]\d*)(?:-((?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:\+([0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$"  # noqa: E501
-
     def _is_valid_semver(self, tag: str) -> bool:
         processed_tag = self._process_tag(tag)
-        return re.match(self._SEMVER_REGEX, processed_tag) is not None
+        return SEMVER_PATTERN.match(processed_tag) is not None
+
+
+class _Git(_VersionCollector):
+    def __init__(  # noqa: PLR0913 - each option selects an independent part of the collection
+        self,
+        *,
+        tag_strategy: str = "creatordate",
+        use_describe: bool = True,
+        dirty_options: utils.DirtyCheckOptions | None = None,
+        stats: utils.GitCallStats | None = None,
+        backend: utils.GitBackend | None = None,
+        deadline: utils.Deadline | None = None,
+        revision: str | None = None,
+    ) -> None:
+        super().__init__(dirty_options=dirty_options, stats=stats, backend=backend, deadline=deadline)
+        if tag_strategy not in TAG_STRATEGIES:
+            msg = f"Unknown tag strategy: {tag_strategy:s}"
+            raise ValueError(msg)
+        if revision is not None and (not revision or revision.startswith("-")):
+            msg = f"Invalid revision: '{revision:s}'"
+            raise ValueError(msg)
+        self.tag_strategy = tag_strategy
+        self.use_describe = use_describe
+        # HEAD names the checked out commit, whose working tree is checked for changes as without a revision
+        self.revision = None if revision == "HEAD" else revision
+        self._git = None
+        self._commit_counts = None
+        self._tag_queries = None
 
     def _get_valid_semver_tags_on_commit(self, commit_hash: str) -> list[str]:
         """Return a list of valid SemVer tags pointing at a specific commit."""
         try:
-            tags_raw = subprocess.check_output(  # noqa: S603
-                ["git", "tag", "--points-at", commit_hash], stderr=subprocess.PIPE
-            ).decode()
+            tags_raw = self._tag_queries.run("tag", "--points-at", commit_hash)
             tags = [tag for tag in tags_raw.strip().split("\n") if tag]
             return [tag for tag in tags if self._is_valid_semver(tag)]
         except subprocess.CalledProcessError:
             return []
 
+    def _find_version_from_description(self, head_commit_id_full: str) -> tuple[str, int] | None:
+        """
+        Resolve the nearest SemVer tag with a single `git describe`.
+
+        The depth describe reports counts the commits its walk visited, which is not always the number of commits
+        reachable from HEAD but not from the tag, so the commits since the tag are counted like for any other tag.
+
+        Returns (tag, commits_since) or None if the description cannot be trusted, in which case the full history
+        search must be used instead.
+        """
+        try:
+            description = self._tag_queries.run(
+                *utils.Git.describe_arguments(_DESCRIBE_MATCH_PATTERNS),
+                head_commit_id_full,
+                head_commit=head_commit_id_full,
+            ).strip()
+        except subprocess.CalledProcessError:
+            # No tag matches the prefilters
+            return None
+
+        tag_name, _, _ = description.rsplit("-", 2)
+        if not self._is_valid_semver(tag_name):
+            # The nearest tag only looked like a version; a valid tag further back may still exist
+            return None
+
+        # An ambiguous commit is left to the full search, which reports it with the appropriate location
+        if len(self._get_valid_semver_tags_on_commit(f"{tag_name}^{{commit}}")) != 1:
+            return None
+
+        # The nearest tag is only the most recently created one if no newer tag is reachable, e.g. through a merged
+        # release branch whose older commit was tagged later
+        if not self._is_newest_reachable_tag(tag_name, head_commit_id_full):
+            return None
+
+        tag_commit_id_full = self._git.resolve(f"refs/tags/{tag_name:s}^{{commit}}")
+        return self._process_tag(tag_name), self._commit_counts.count(tag_commit_id_full, head_commit_id_full)
+
+    def _is_newest_reachable_tag(self, tag_name: str, head_commit_id_full: str) -> bool:
+        """
+        Return true if no other SemVer tag created at the same time as a tag or later is reachable from HEAD.
+
+        Listing tags by creation date needs no history walk; only the tags created since the described one, usually
+        none, are checked for reachability.
+        """
+        try:
+            tags_raw = self._tag_queries.run(
+                "for-each-ref", "--format", "%(creatordate:unix) %(refname:lstrip=2)", "refs/tags"
+            )
+        except subprocess.CalledProcessError:
+            return False
+
+        listed_tags = [line.split(" ", 1) for line in tags_raw.splitlines()]
+        tag_date = next((int(date) for date, name in listed_tags if name == tag_name), None)
+        if tag_date is None:
+            return False
+        # Creation dates have a resolution of one second, so a reachable tag created in the same second may be the
+        # newer one; the full search then picks between them as it would without describe
+        newer_tags = [
+            f"refs/tags/{name:s}"
+            for date, name in listed_tags
+            if int(date) >= tag_date and name != tag_name and self._is_valid_semver(name)
+        ]
+        if not newer_tags:
+            return True
+
+        try:
+            reachable_tags_raw = self._tag_queries.run(
+                "for-each-ref",
+                "--merged",
+                head_commit_id_full,
+                "--format",
+                "%(refname:lstrip=2)",
+                *newer_tags,
+                head_commit=head_commit_id_full,
+            )
+        except subprocess.CalledProcessError:
+            return False
+        return not reachable_tags_raw.strip()
+
     def _find_version_from_history(self, head_commit_id_full: str) -> tuple[str, int] | None:
         """
         Search git history for the most recent, unambiguous SemVer tag on an ancestor commit.
 
+        Ancestry of every tag is resolved by a single `--merged` query, and the commit each tag points at is
+        listed alongside it, so the number of git queries does not grow with the number of tags.
+
         Returns (tag, commits_since) or None if no suitable tag is found.
         """
         try:
-            all_tags_raw = subprocess.check_output(
-                ["git", "for-each-ref", "--sort=-creatordate", "--format", "%(refname:short)", "refs/tags"],
-                stderr=subprocess.PIPE,
-            ).decode()
-            all_tags = [tag for tag in all_tags_raw.strip().split("\n") if tag]
+            merged_tags_raw = self._tag_queries.run(
+                "for-each-ref",
+                "--merged",
+                head_commit_id_full,
+                "--sort=-creatordate",
+                "--format",
+                "%(refname:lstrip=2) %(objectname) %(*objectname)",
+                "refs/tags",
+                head_commit=head_commit_id_full,
+            )
         except subprocess.CalledProcessError:
             return None
 
-        for tag_name in all_tags:
+        tag_commits = {}
+        for line in merged_tags_raw.splitlines():
+            tag_name, object_id, peeled_object_id = line.split(" ")
             if self._is_valid_semver(tag_name):
-                # Check if it's an ancestor
-                is_ancestor_proc = subprocess.run(  # noqa: S603
-                    ["git", "merge-base", "--is-ancestor", tag_name, "HEAD"], capture_output=True, check=False
-                )
-                if is_ancestor_proc.returncode == 0:
-                    # Found a candidate. Now check for ambiguity on that ancestor commit.
-                    tag_commit_id_full = (
-                        subprocess.check_output(["git", "rev-parse", tag_name]).decode().strip()  # noqa: S603
-                    )
-                    valid_semver_tags_on_ancestor = self._get_valid_semver_tags_on_commit(tag_commit_id_full)
-
-                    if len(valid_semver_tags_on_ancestor) > 1:
-                        short_tag_commit_id = (
-                            subprocess.check_output(["git", "rev-parse", "--short=7", tag_name]).decode().strip()  # noqa: S603
-                        )
-                        if tag_commit_id_full == head_commit_id_full:
-                            location_str = f"commit {short_tag_commit_id}"
-                        else:
-                            location_str = f"ancestor commit {short_tag_commit_id}"
-                        msg = (
-                            f"multiple valid SemVer tags on {location_str}: {', '.join(valid_semver_tags_on_ancestor)}"
-                        )
-                        raise VersionCollectError(msg)
+                # Annotated tags are peeled to the commit they reference
+                tag_commits[tag_name] = peeled_object_id or object_id
+        if not tag_commits:
+            return None
+
+        # The most recently created tag is our candidate. Now check for ambiguity on that ancestor commit.
+        tag_name = next(iter(tag_commits))
+        tag_commit_id_full = tag_commits[tag_name]
+        valid_semver_tags_on_ancestor = [tag for tag, commit in tag_commits.items() if commit == tag_commit_id_full]
+        return self._resolve_candidate(tag_name, tag_commit_id_full, valid_semver_tags_on_ancestor, head_commit_id_full)
+
+    def _find_highest_version_from_history(self, head_commit_id_full: str) -> tuple[str, int] | None:
+        """
+        Search git history for the unambiguous SemVer tag with the highest precedence on an ancestor commit.
+
+        Ancestry of every tag is resolved by a single `--merged` query, and the commit each tag points at is
+        listed alongside it, so no per-tag git calls are needed before the winner is known.
+
+        Returns (tag, commits_since) or None if no suitable tag is found.
+        """
+        try:
+            merged_tags_raw = self._tag_queries.run(
+                "for-each-ref",
+                "--merged",
+                head_commit_id_full,
+                "--format",
+                "%(refname:lstrip=2) %(objectname) %(*objectname)",
+                "refs/tags",
+                head_commit=head_commit_id_full,
+            )
+        except subprocess.CalledProcessError:
+            return None
+
+        candidates = []  # (precedence key, tag name, commit id)
+        for line in merged_tags_raw.splitlines():
+            tag_name, object_id, peeled_object_id = line.split(" ")
+            match = SEMVER_PATTERN.match(self._process_tag(tag_name))
+            if match:
+                major, minor, patch, prerelease = match.group(1, 2, 3, 4)
+                key = precedence_key(int(major), int(minor), int(patch), prerelease or "")
+                # Annotated tags are peeled to the commit they reference
+                candidates.append((key, tag_name, peeled_object_id or object_id))
+        if not candidates:
+            return None
+
+        # Highest precedence first; tags of equal precedence are ordered by name for determinism
+        candidates.sort(key=lambda candidate: candidate[1])
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        _, tag_name, tag_commit_id_full = candidates[0]
+        valid_semver_tags_on_ancestor = [name for _, name, commit in candidates if commit == tag_commit_id_full]
+        return self._resolve_candidate(tag_name, tag_commit_id_full, valid_semver_tags_on_ancestor, head_commit_id_full)
+
+    def _find_nearest_version_from_history(self, head_commit_id_full: str) -> tuple[str, int] | None:
+        """
+        Walk git history back from HEAD once and stop at the first commit carrying a SemVer tag.
 
-                    # This is our tag.
-                    count_raw = subprocess.check_output(  # noqa: S603
-                        ["git", "rev-list", "--count", f"{tag_name}..HEAD"]
-                    ).decode()
-                    commits_since_tag = int(count_raw.strip())
+        The commits every tag points at are listed by a single query, so the cost of the walk grows with the distance
+        to the nearest tag rather than with the number of tags. As long as the walk only passed commits with a single
+        parent, its length is the number of commits since the tag; otherwise they are counted separately.
 
-                    processed_tag = self._process_tag(tag_name)
-                    return processed_tag, commits_since_tag
+        Returns (tag, commits_since) or None if no commit reachable from HEAD carries a SemVer tag.
+        """
+        try:
+            tags_raw = self._tag_queries.run(
+                "for-each-ref", "--format", "%(refname:lstrip=2) %(objectname) %(*objectname)", "refs/tags"
+            )
+        except subprocess.CalledProcessError:
+            return None
+
+        tags_by_commit = {}
+        for line in tags_raw.splitlines():
+            tag_name, object_id, peeled_object_id = line.split(" ")
+            if self._is_valid_semver(tag_name):
+                # Annotated tags are peeled to the commit they reference
+                tags_by_commit.setdefault(peeled_object_id or object_id, []).append(tag_name)
+        if not tags_by_commit:
+            return None
+
+        linear = True
+        walk = self._git.stream("rev-list", "--topo-order", "--parents", head_commit_id_full)
+        try:
+            for distance, line in enumerate(walk):
+                commit_id_full, *parents = line.split(" ")
+                tags_on_commit = tags_by_commit.get(commit_id_full)
+                if tags_on_commit is None:
+                    linear = linear and len(parents) == 1
+                    continue
+                if linear and len(tags_on_commit) == 1:
+                    return self._process_tag(tags_on_commit[0]), distance
+                return self._resolve_candidate(
+                    tags_on_commit[0], commit_id_full, sorted(tags_on_commit), head_commit_id_full
+                )
+        except subprocess.CalledProcessError:
+            return None
+        finally:
+            walk.close()
         return None
 
-    def _get_fallback_version(self, commit_id: str) -> VersionData:
-        """Return the fallback version when no valid SemVer tags are found."""
+    def _resolve_candidate(
+        self, tag_name: str, tag_commit_id_full: str, valid_semver_tags_on_commit: list[str], head_commit_id_full: str
+    ) -> tuple[str, int]:
+        """Reject a candidate tag that shares its commit with other SemVer tags, otherwise count commits since it."""
+        if len(valid_semver_tags_on_commit) > 1:
+            short_tag_commit_id = self._git.run("rev-parse", "--short=7", tag_commit_id_full).strip()
+            if tag_commit_id_full == head_commit_id_full:
+                location_str = f"commit {short_tag_commit_id}"
+            else:
+                location_str = f"ancestor commit {short_tag_commit_id}"
+            msg = f"multiple valid SemVer tags on {location_str}: {', '.join(valid_semver_tags_on_commit)}"
+            raise VersionCollectError(msg)
+
+        # This is our tag.
+        commits_since_tag = self._commit_counts.count(tag_commit_id_full, head_commit_id_full)
+
+        processed_tag = self._process_tag(tag_name)
+        return processed_tag, commits_since_tag
+
+    def _get_fallback_version(self, head_commit_id_full: str) -> tuple[str, int]:
+        """Return the fallback tag and commits since it when no valid SemVer tags are found."""
         # Intentional print for user status notification
         print("No valid SemVer tags found in git history. Using '0.0.0-UNTAGGED'.")  # noqa: T201
-        total_number_commits = utils.Git.get_commit_count()
-        return VersionData(
-            tag="0.0.0-UNTAGGED",
-            commit_id=commit_id,
-            branch_name=utils.Git.get_branch_name(),
-            is_dirty=utils.Git.get_is_dirty(),
-            commits_since_tag=total_number_commits,
-        )
+        return "0.0.0-UNTAGGED", self._commit_counts.count(None, head_commit_id_full)
 
     def compute_version(self, repo_path: str) -> VersionData:
-        with utils.change_dir(repo_path):
-            try:
-                if utils.Git.get_commit_count() == 0:
-                    msg = "no commits exist"
+        with utils.Git(repo_path, stats=self.stats, backend=self.backend, deadline=self.deadline) as git:
+            self._git = git
+            self._commit_counts = utils.CommitCountCache(git)
+            self._tag_queries = utils.TagQueryCache(git)
+            revision = self.revision or "HEAD"
+            with self.deadline.stage("head"):
+                try:
+                    commit_id_full = git.resolve(f"{revision:s}^{{commit}}")
+                except subprocess.CalledProcessError as exc:
+                    msg = "not a git repository"
+                    raise VersionCollectError(msg) from exc
+                if commit_id_full is None:
+                    msg = f"revision '{revision:s}' does not name a commit" if self.revision else "no commits exist"
                     raise VersionCollectError(msg)
-            except subprocess.CalledProcessError as exc:
-                msg = "not a git repository"
-                raise VersionCollectError(msg) from exc
-
-            commit_id = utils.Git.get_commit_id()
-            commit_id_full = utils.Git.get_commit_id(short=False)
-
-            # Search history for the most recent, unambiguous SemVer tag.
-            # This handles tags on the current commit as well as on ancestors.
-            tag_info = self._find_version_from_history(commit_id_full)
-            if tag_info:
-                tag, commits_since_tag = tag_info
-                return VersionData(
-                    tag=tag,
-                    commit_id=commit_id,
-                    branch_name=utils.Git.get_branch_name(),
-                    is_dirty=utils.Git.get_is_dirty(),
-                    commits_since_tag=commits_since_tag,
-                )
+                commit_id = git.get_commit_id(revision=revision)
+                branch_name = git.get_branch_name(revision)
 
-            # No valid tags found, use fallback.
-            return self._get_fallback_version(commit_id)
+            with self.deadline.stage("tag"):
+                # Search history for an unambiguous SemVer tag using the selected strategy.
+                # This handles tags on the current commit as well as on ancestors.
+                match self.tag_strategy:
+                    case "highest":
+                        tag_info = self._find_highest_version_from_history(commit_id_full)
+                    case "nearest":
+                        tag_info = self._find_nearest_version_from_history(commit_id_full)
+                    case _:
+                        tag_info = self._find_version_from_description(commit_id_full) if self.use_describe else None
+                        if tag_info is None:
+                            tag_info = self._find_version_from_history(commit_id_full)
+                # No valid tags found, use fallback.
+                tag, commits_since_tag = tag_info or self._get_fallback_version(commit_id_full)
+
+            # A revision other than HEAD is read from the object database, so no working tree could make it dirty
+            is_dirty, is_dirty_unknown = self._get_dirty_state(git) if self.revision is None else (False, False)
+            return VersionData(
+                tag=tag,
+                commit_id=commit_id,
+                branch_name=branch_name,
+                is_dirty=is_dirty,
+                commits_since_tag=commits_since_tag,
+                is_dirty_unknown=is_dirty_unknown,
+                is_dirty_applicable=self.revision is None,
+            )
+
+
+class _History(_VersionCollector):
+    """
+    Versions of all commits of a range, carried forward from parents to children.
+
+    Both tag strategies select the best tag by a fixed ranking of all tags, so the tag of a commit is the best of its
+    own tags and those of its parents. Commits since the tag are the difference between the number of ancestors of
+    the commit and of the tagged commit, as every ancestor of the tagged commit is an ancestor of the commit. The
+    ancestors of a commit are those of its first parent plus the commits only the other parents reach, which are
+    found by walking back from the parents until every remaining commit is reachable from the first one.
+    """
+
+    def __init__(
+        self,
+        *,
+        tag_strategy: str = "creatordate",
+        stats: utils.GitCallStats | None = None,
+        backend: utils.GitBackend | None = None,
+    ) -> None:
+        super().__init__(stats=stats, backend=backend)
+        if tag_strategy not in HISTORY_TAG_STRATEGIES:
+            msg = f"Unknown history tag strategy: {tag_strategy:s}"
+            raise ValueError(msg)
+        self.tag_strategy = tag_strategy
+        # History walked so far, indexed by the position of a commit in the walk
+        self._positions = {}
+        self._short_ids = []
+        self._parents = []
+        self._ancestor_counts = []
+        self._tags_by_commit = {}
+
+    def walk(self, repo_path: str, revision_range: str) -> Iterator[tuple[str, VersionData | VersionCollectError]]:
+        with utils.Git(repo_path, stats=self.stats, backend=self.backend) as git:
+            excluded, has_excluded, included = revision_range.rpartition("..")
+            tips = [self._resolve_commit(git, included or "HEAD")]
+            if has_excluded:
+                tips.append(self._resolve_commit(git, excluded or "HEAD"))
+            ranked_tags, self._tags_by_commit = self._rank_tags(git)
+            commit_ids = self._read_history(git, tips)
+        reachable_from_excluded = self._ancestors(self._positions[tips[1]]) if has_excluded else set()
+
+        rank_by_commit = {}
+        for rank, (_, commit_id_full) in reversed(list(enumerate(ranked_tags))):
+            rank_by_commit[commit_id_full] = rank
+        self._ancestor_counts, best_ranks = [], []
+        for position, commit_id_full in enumerate(commit_ids):
+            commit_parents = self._parents[position]
+            ancestor_count = 1
+            if commit_parents:
+                ancestor_count += self._ancestor_counts[commit_parents[0]]
+            if len(commit_parents) > 1:
+                ancestor_count += self._count_only_reachable_from_others(commit_parents)
+            self._ancestor_counts.append(ancestor_count)
+            candidate_ranks = [best_ranks[parent] for parent in commit_parents if best_ranks[parent] is not None]
+            if commit_id_full in rank_by_commit:
+                candidate_ranks.append(rank_by_commit[commit_id_full])
+            best_ranks.append(min(candidate_ranks, default=None))
+
+            if position not in reachable_from_excluded:
+                best_tag = None if best_ranks[position] is None else ranked_tags[best_ranks[position]]
+                yield commit_id_full, self._version_at(position, best_tag)
+
+    def _read_history(self, git: utils.Git, tips: list[str]) -> list[str]:
+        """Walk the history of tips once, returning the commits with parents listed before their children."""
+        commit_ids, self._short_ids, self._parents, self._positions = [], [], [], {}
+        for line in git.stream("rev-list", "--topo-order", "--reverse", "--abbrev=7", "--format=%H %h %P", *tips):
+            if line.startswith("commit "):
+                continue
+            commit_id_full, short_id, *parent_ids = line.split(" ")
+            self._positions[commit_id_full] = len(commit_ids)
+            commit_ids.append(commit_id_full)
+            self._short_ids.append(short_id)
+            # Parents cut off by a shallow clone are not part of the history
+            self._parents.append([self._positions[parent] for parent in parent_ids if parent in self._positions])
+        return commit_ids
+
+    def _version_at(self, position: int, best_tag: tuple[str, str] | None) -> VersionData | VersionCollectError:
+        if best_tag is None:
+            return VersionData(
+                tag="0.0.0-UNTAGGED",
+                commit_id=self._short_ids[position],
+                branch_name="HEAD",
+                commits_since_tag=self._ancestor_counts[position],
+            )
+        tag_name, tag_commit_id_full = best_tag
+        tag_position = self._positions[tag_commit_id_full]
+        if len(self._tags_by_commit[tag_commit_id_full]) > 1:
+            location = "commit" if tag_position == position else "ancestor commit"
+            tags = ", ".join(self._tags_by_commit[tag_commit_id_full])
+            msg = f"multiple valid SemVer tags on {location:s} {self._short_ids[tag_position]:s}: {tags:s}"
+            return VersionCollectError(msg)
+        # Every ancestor of the tagged commit is an ancestor of this commit
+        return VersionData(
+            tag=self._process_tag(tag_name),
+            commit_id=self._short_ids[position],
+            branch_name="HEAD",
+            commits_since_tag=self._ancestor_counts[position] - self._ancestor_counts[tag_position],
+        )
+
+    def _resolve_commit(self, git: utils.Git, revision: str) -> str:
+        try:
+            commit_id_full = git.resolve(f"{revision:s}^{{commit}}")
+        except subprocess.CalledProcessError as exc:
+            msg = "not a git repository"
+            raise VersionCollectError(msg) from exc
+        if commit_id_full is None:
+            msg = f"'{revision:s}' does not name a commit"
+            raise VersionCollectError(msg)
+        return commit_id_full
+
+    def _rank_tags(self, git: utils.Git) -> tuple[list[tuple[str, str]], dict[str, list[str]]]:
+        """Return the SemVer tags as (tag, commit id) from best to worst, and the SemVer tags on each commit."""
+        tags_raw = git.run(
+            "for-each-ref",
+            "--sort=-creatordate",
+            "--format",
+            "%(refname:lstrip=2) %(objectname) %(*objectname)",
+            "refs/tags",
+        )
+        ranked_tags = []
+        tags_by_commit = {}
+        for line in tags_raw.splitlines():
+            tag_name, object_id, peeled_object_id = line.split(" ")
+            if self._is_valid_semver(tag_name):
+                # Annotated tags are peeled to the commit they reference
+                ranked_tags.append((tag_name, peeled_object_id or object_id))
+                tags_by_commit.setdefault(peeled_object_id or object_id, []).append(tag_name)
+        if self.tag_strategy == "highest":
+            # Highest precedence first; tags of equal precedence are ordered by name, as in the highest strategy
+            ranked_tags.sort(key=lambda tag: tag[0])
+            ranked_tags.sort(key=lambda tag: self._precedence_key(tag[0]), reverse=True)
+        for tags in tags_by_commit.values():
+            tags.sort()
+        return ranked_tags, tags_by_commit
+
+    def _precedence_key(self, tag_name: str) -> tuple:
+        major, minor, patch, prerelease = SEMVER_PATTERN.match(self._process_tag(tag_name)).group(1, 2, 3, 4)
+        return precedence_key(int(major), int(minor), int(patch), prerelease or "")
+
+    def _ancestors(self, position: int) -> set[int]:
+        """Return the positions of a commit and all of its ancestors."""
+        ancestors = {position}
+        pending = [position]
+        while pending:
+            for parent in self._parents[pending.pop()]:
+                if parent not in ancestors:
+                    ancestors.add(parent)
+                    pending.append(parent)
+        return ancestors
+
+    def _count_only_reachable_from_others(self, commit_parents: list[int]) -> int:
+        """
+        Return the number of commits reachable from any but the first of commit_parents, and not from the first.
+
+        Commits are visited from the newest position to the oldest, so all children of a commit within the walk are
+        visited before it and its reachability is final when it is visited. The walk stops as soon as every pending
+        commit is reachable from the first parent.
+        """
+        from_first, from_others = 1, 2
+        reachability = {commit_parents[0]: from_first}
+        for parent in commit_parents[1:]:
+            reachability[parent] = reachability.get(parent, 0) | from_others
+        pending = [-position for position in reachability]
+        heapq.heapify(pending)
+        pending_only_from_others = sum(1 for flags in reachability.values() if flags == from_others)
+        count = 0
+        while pending_only_from_others:
+            position = -heapq.heappop(pending)
+            flags = reachability[position]
+            if flags == from_others:
+                pending_only_from_others -= 1
+                count += 1
+            for parent in self._parents[position]:
+                parent_flags = reachability.get(parent)
+                if parent_flags is None:
+                    reachability[parent] = flags
+                    heapq.heappush(pending, -parent)
+                    pending_only_from_others += flags == from_others
+                elif parent_flags | flags != parent_flags:
+                    pending_only_from_others -= parent_flags == from_others
+                    reachability[parent] = parent_flags | flags
+        return count
 
 
 class _File(_VersionCollector):
@@ -155,14 +721,21 @@ class _File(_VersionCollector):
         with open(file_path) as input_file:
             tag = self._process_tag(input_file.readline().strip())
             if tag:
-                with utils.change_dir(Path(file_path).parent):
+                with utils.Git(
+                    Path(file_path).parent, stats=self.stats, backend=self.backend, deadline=self.deadline
+                ) as git:
                     # While the tag comes from a file, we assume all projects use git
                     try:
+                        with self.deadline.stage("head"):
+                            commit_id = git.get_commit_id()
+                            branch_name = git.get_branch_name()
+                        is_dirty, is_dirty_unknown = self._get_dirty_state(git)
                         return VersionData(
                             tag=tag,
-                            commit_id=utils.Git.get_commit_id(),
-                            branch_name=utils.Git.get_branch_name(),
-                            is_dirty=utils.Git.get_is_dirty(),
+                            commit_id=commit_id,
+                            branch_name=branch_name,
+                            is_dirty=is_dirty,
+                            is_dirty_unknown=is_dirty_unknown,
                         )
                     except subprocess.CalledProcessError as exc:
                         msg = "input file not in git repo"
@@ -170,3 +743,189 @@ class _File(_VersionCollector):
             else:
                 msg = "empty file"
                 raise VersionCollectError(msg)
+
+
+class _Env(_VersionCollector):
+    _FIELDS = ("commit_id", "branch_name", "tag", "build_number")
+    # Build metadata identifiers are restricted to alphanumerics and hyphens
+    _BUILD_NUMBER_PATTERN = re.compile(r"[0-9A-Za-z-]+")
+
+    def __init__(self, *, environ: Mapping[str, str] | None = None) -> None:
+        super().__init__()
+        self.environ = os.environ if environ is None else environ
+
+    def compute_version(self, mapping_source: str) -> VersionData:
+        mapping = self._load_mapping(mapping_source)
+
+        commit_id = self._lookup(mapping.get("commit_id", []))
+        if not commit_id:
+            msg = (
+                f"no commit is set in the environment (checked {', '.join(mapping.get('commit_id', [])) or 'nothing'})"
+            )
+            raise VersionCollectError(msg)
+        tag = self._lookup(mapping.get("tag", []))
+        # Branch and pull request builds have no tag, yet still need a version
+        tag = self._process_tag(tag) if tag else self._get_fallback_tag(mapping)
+
+        # CI checkouts are fresh, and tag builds run on a detached HEAD
+        return VersionData(
+            tag=tag,
+            commit_id=commit_id[:7],
+            branch_name=self._lookup(mapping.get("branch_name", [])) or "HEAD",
+        )
+
+    def _get_fallback_tag(self, mapping: dict[str, list[str]]) -> str:
+        """Return the tag of an untagged build, carrying the build number of the CI run as build metadata if known."""
+        build_number = self._lookup(mapping.get("build_number", []))
+        if not build_number:
+            # Intentional print for user status notification
+            print("No tag is set in the CI environment. Using '0.0.0-UNTAGGED'.")  # noqa: T201
+            return "0.0.0-UNTAGGED"
+        if not self._BUILD_NUMBER_PATTERN.fullmatch(build_number):
+            msg = f"build number '{build_number:s}' is not a valid build metadata identifier"
+            raise VersionCollectError(msg)
+        # Intentional print for user status notification
+        print(f"No tag is set in the CI environment. Using '0.0.0-UNTAGGED' of build {build_number:s}.")  # noqa: T201
+        return f"0.0.0-UNTAGGED+build.{build_number:s}"
+
+    def _load_mapping(self, mapping_source: str) -> dict[str, list[str]]:
+        if mapping_source == "auto":
+            for provider, marker in _CI_PROVIDER_MARKERS.items():
+                if self.environ.get(marker):
+                    return CI_ENVIRONMENT_MAPPINGS[provider]
+            msg = f"no supported CI provider detected ({', '.join(_CI_PROVIDER_MARKERS.values())} are unset)"
+            raise VersionCollectError(msg)
+        if mapping_source in CI_ENVIRONMENT_MAPPINGS:
+            return CI_ENVIRONMENT_MAPPINGS[mapping_source]
+
+        try:
+            with open(mapping_source) as mapping_file:
+                mapping = json.load(mapping_file)
+        except (OSError, json.JSONDecodeError) as exc:
+            msg = f"environment mapping '{mapping_source:s}' is neither a CI provider nor a readable JSON file"
+            raise VersionCollectError(msg) from exc
+
+        if not isinstance(mapping, dict) or not set(mapping).issubset(self._FIELDS):
+            msg = f"environment mapping must be an object with keys from: {', '.join(self._FIELDS)}"
+            raise VersionCollectError(msg)
+        # A single variable may be given as a plain string
+        return {field: [variables] if isinstance(variables, str) else variables for field, variables in mapping.items()}
+
+    def _lookup(self, entries: list[str]) -> str:
+        """Return the value of the first set variable in entries, or an empty string if none are set."""
+        for entry in entries:
+            variable, has_prefix, prefix = entry.partition(":")
+            value = self.environ.get(variable, "")
+            if has_prefix:
+                if not value.startswith(prefix):
+                    continue
+                value = value[len(prefix) :]
+            if value:
+                return value
+        return ""
+
+
+class _Archive(_VersionCollector):
+    # Output of `git describe` when not on the tag itself: <tag>-<commits_since_tag>-g<commit_hash_abbrev>
+    _DESCRIPTION_REGEX = re.compile(r"^(?P<tag>.+)-(?P<commits_since_tag>\d+)-g[0-9a-f]+$")
+
+    def compute_version(self, archival_file_path: str) -> VersionData:
+        with open(archival_file_path) as archival_file:
+            fields = {}
+            for line in archival_file:
+                key, _, value = line.partition(":")
+                fields[key.strip()] = value.strip()
+
+        commit_id = fields.get("node", "")
+        if not commit_id or "$Format" in commit_id:
+            msg = "archival file was not expanded by git archive (is the export-subst attribute set?)"
+            raise VersionCollectError(msg)
+
+        # Decorations of the archived commit, e.g. "HEAD -> main, tag: v1.2.3, origin/main"
+        ref_names = [name.strip() for name in fields.get("ref-names", "").split(",") if name.strip()]
+        branch_name = "HEAD"
+        tags_on_commit = []
+        for name in ref_names:
+            if name.startswith("HEAD -> "):
+                branch_name = name.removeprefix("HEAD -> ")
+            elif name.startswith("tag: "):
+                tags_on_commit.append(name.removeprefix("tag: "))
+        valid_semver_tags_on_commit = [tag for tag in tags_on_commit if self._is_valid_semver(tag)]
+        if len(valid_semver_tags_on_commit) > 1:
+            msg = f"multiple valid SemVer tags on commit {commit_id[:7]}: {', '.join(valid_semver_tags_on_commit)}"
+            raise VersionCollectError(msg)
+
+        tag, commits_since_tag = self._parse_description(fields.get("describe-name", ""))
+        if not tag and valid_semver_tags_on_commit:
+            # Older git versions cannot expand %(describe), but a tag on the archived commit is still listed
+            tag, commits_since_tag = self._process_tag(valid_semver_tags_on_commit[0]), 0
+        if not tag:
+            # Intentional print for user status notification
+            print("No valid SemVer tags found in git archive metadata. Using '0.0.0-UNTAGGED'.")  # noqa: T201
+            tag, commits_since_tag = "0.0.0-UNTAGGED", 0
+
+        # Exported sources cannot carry uncommitted changes
+        return VersionData(
+            tag=tag,
+            commit_id=commit_id[:7],
+            branch_name=branch_name,
+            commits_since_tag=commits_since_tag,
+        )
+
+    def _parse_description(self, description: str) -> tuple[str, int]:
+        """Return the SemVer tag and commits since it from describe output, or an empty tag if there is none."""
+        if not description or "$Format" in description or "%(describe" in description:
+            return "", 0
+        match = self._DESCRIPTION_REGEX.match(description)
+        if match:
+            tag_name, commits_since_tag = match.group("tag"), int(match.group("commits_since_tag"))
+        else:
+            # Describe omits the suffix when the archived commit is tagged
+            tag_name, commits_since_tag = description, 0
+        if not self._is_valid_semver(tag_name):
+            return "", 0
+        return self._process_tag(tag_name), commits_since_tag
+
+
+class _Frozen(_VersionCollector):
+    FORMAT = 1
+    # Inputs that fully determine VersionData; everything else is derived from them
+    FIELDS = ("tag", "commit_id", "branch_name", "is_dirty", "commits_since_tag")
+    # Fields that take their default when absent
+    OPTIONAL_FIELDS = (("is_dirty_unknown", False), ("is_dirty_applicable", True), ("content_fingerprint", ""))
+
+    @staticmethod
+    def checksum(fields: dict) -> str:
+        canonical = json.dumps(fields, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def compute_version(self, record_path: str) -> VersionData:
+        try:
+            with open(record_path) as record_file:
+                record = json.load(record_file)
+        except (OSError, json.JSONDecodeError) as exc:
+            msg = f"frozen version record {record_path!s} is not readable"
+            raise VersionCollectError(msg) from exc
+
+        if not isinstance(record, dict) or record.get("format") != self.FORMAT:
+            msg = f"frozen version record {record_path!s} has an unsupported format"
+            raise VersionCollectError(msg)
+        fields = record.get("version")
+        if not isinstance(fields, dict) or not set(self.FIELDS) <= set(fields) <= {
+            *self.FIELDS,
+            *dict(self.OPTIONAL_FIELDS),
+        }:
+            msg = f"frozen version record {record_path!s} is incomplete"
+            raise VersionCollectError(msg)
+        if record.get("sha256") != self.checksum(fields):
+            msg = f"frozen version record {record_path!s} does not match its checksum"
+            raise VersionCollectError(msg)
+
+        return VersionData(
+            tag=fields["tag"],
+            commit_id=fields["commit_id"],
+            branch_name=fields["branch_name"],
+            is_dirty=fields["is_dirty"],
+            commits_since_tag=fields["commits_since_tag"],
+            **{field: fields.get(field, default) for field, default in self.OPTIONAL_FIELDS},
+        )
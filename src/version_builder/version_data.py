@@ -1,8 +1,7 @@
 import re
+import warnings
 from datetime import datetime, timezone
 
-from version_builder.utils import EqualityByValue
-
 
 class VersionParseError(Exception):
     def __init__(self, root_cause: str, version_input: str) -> None:
@@ -13,65 +12,204 @@ class VersionParseError(Exception):
         return f"Version not parseable because {self.root_cause:s}. Input: {self.version_input:s}"
 
 
-class VersionData(EqualityByValue):
-    # Official SemVer 2.0.0 regex: https://semver.org/#is-there-a-suggested-regular-expression-regex-to-check-a-semver-string
-    _SEMVER_REGEX = r"^(0|[1-9]\d*)\.(0|[1-9]\d*)\.(0|[1-9]\d*)(?:-((?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:\+([0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$"  # noqa: E501
+# Official SemVer 2.0.0 regex: https://semver.org/#is-there-a-suggested-regular-expression-regex-to-check-a-semver-string
+SEMVER_PATTERN = re.compile(
+    r"^(0|[1-9]\d*)\.(0|[1-9]\d*)\.(0|[1-9]\d*)(?:-((?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:\+([0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$"
+)
+
+# A release sorts above every pre-release of the same version (SemVer 2.0.0, item 11.3)
+_RELEASE_KEY = ((2, 0, ""),)
+
+
+# Characters of a content fingerprint shown in build metadata
+CONTENT_FINGERPRINT_LENGTH = 12
+
+_CONTENT_FINGERPRINT_PATTERN = re.compile(r"[0-9a-f]*")
+
+
+def _check_content_fingerprint(content_fingerprint: str) -> None:
+    # Build metadata identifiers are restricted to alphanumerics and hyphens
+    if not _CONTENT_FINGERPRINT_PATTERN.fullmatch(content_fingerprint):
+        msg = f"content fingerprint '{content_fingerprint:s}' is not a lowercase hexadecimal digest"
+        raise ValueError(msg)
+
+
+def precedence_key(major: int, minor: int, patch: int, prerelease: str) -> tuple:
+    """
+    Return a tuple whose natural ordering matches SemVer 2.0.0 precedence.
+
+    Numeric pre-release identifiers compare numerically and sort below alphanumeric ones, which compare in ASCII
+    order. A larger set of identifiers sorts higher when all preceding identifiers are equal. Build metadata does
+    not take part in precedence.
+    """
+    if not prerelease:
+        return (major, minor, patch, _RELEASE_KEY)
+    identifiers = tuple(
+        (0, int(identifier), "") if identifier.isdigit() else (1, 0, identifier) for identifier in prerelease.split(".")
+    )
+    return (major, minor, patch, identifiers)
+
 
-    def __init__(
-        self, tag: str, commit_id: str, branch_name: str, *, is_dirty: bool = False, commits_since_tag: int = 0
+class VersionData:
+    """
+    Immutable version information collected for a single build.
+
+    Instances are hashable and compare equal when all of their inputs are equal. Ordering operators follow SemVer
+    2.0.0 precedence, so versions that differ only in build metadata neither sort before nor after each other.
+    """
+
+    __slots__ = (
+        "base_version",
+        "branch_name",
+        "buildmetadata_from_tag",
+        "cargo_version",
+        "commit_id",
+        "commits_since_tag",
+        "content_fingerprint",
+        "full_build_metadata",
+        "is_development_build",
+        "is_dirty",
+        "is_dirty_applicable",
+        "is_dirty_unknown",
+        "major",
+        "minor",
+        "patch",
+        "precedence_key",
+        "prerelease",
+        "qualified_version",
+        "tag",
+        "time",
+    )
+
+    def __init__(  # noqa: PLR0913 - the inputs every other field is derived from
+        self,
+        tag: str,
+        commit_id: str,
+        branch_name: str,
+        *,
+        is_dirty: bool = False,
+        commits_since_tag: int = 0,
+        is_dirty_unknown: bool = False,
+        is_dirty_applicable: bool = True,
+        content_fingerprint: str = "",
     ) -> None:
-        if not isinstance(tag, str):
-            msg = "tag is not str type"
-            raise TypeError(msg)
-        if not isinstance(commit_id, str):
-            msg = "commit_id is not str type"
-            raise TypeError(msg)
-        if not isinstance(branch_name, str):
-            msg = "branch_name is not str type"
-            raise TypeError(msg)
-        if not isinstance(is_dirty, bool):
-            msg = "is_dirty is not bool type"
-            raise TypeError(msg)
-        if not isinstance(commits_since_tag, int):
-            msg = "commits_since_tag is not int type"
-            raise TypeError(msg)
+        for name, value, expected_type in (
+            ("tag", tag, str),
+            ("commit_id", commit_id, str),
+            ("branch_name", branch_name, str),
+            ("is_dirty", is_dirty, bool),
+            ("is_dirty_unknown", is_dirty_unknown, bool),
+            ("is_dirty_applicable", is_dirty_applicable, bool),
+            ("commits_since_tag", commits_since_tag, int),
+            ("content_fingerprint", content_fingerprint, str),
+        ):
+            if not isinstance(value, expected_type):
+                msg = f"{name:s} is not {expected_type.__name__:s} type"
+                raise TypeError(msg)
+
+        if not is_dirty_applicable and (is_dirty or is_dirty_unknown):
+            msg = "a version without a working tree cannot be dirty"
+            raise ValueError(msg)
+
+        _check_content_fingerprint(content_fingerprint)
 
         if not tag:
             msg = "empty tag input"
             raise VersionParseError(msg, tag)
 
-        match = re.match(self._SEMVER_REGEX, tag)
+        match = SEMVER_PATTERN.match(tag)
         if not match:
             msg = "invalid SemVer 2.0.0 format"
             raise VersionParseError(msg, tag)
 
-        self.tag = tag
-        self.commit_id = commit_id
-        self.branch_name = branch_name
-        self.is_dirty = is_dirty
-        self.commits_since_tag = commits_since_tag
+        major = int(match.group(1))
+        minor = int(match.group(2))
+        patch = int(match.group(3))
+        prerelease = match.group(4) or ""  # Pre-release identifiers (e.g., "alpha.1")
+        buildmetadata_from_tag = match.group(5) or ""  # Build metadata from tag (e.g., "build.123")
 
-        self.major = int(match.group(1))
-        self.minor = int(match.group(2))
-        self.patch = int(match.group(3))
-        self.components = [self.major, self.minor, self.patch]
-        self.prerelease = match.group(4) or ""  # Pre-release identifiers (e.g., "alpha.1")
-        self.buildmetadata_from_tag = match.group(5) or ""  # Build metadata from tag (e.g., "build.123")
+        # Fields are written through object.__setattr__ as the instance is frozen once constructed
+        _set = object.__setattr__
+        _set(self, "tag", tag)
+        _set(self, "commit_id", commit_id)
+        _set(self, "branch_name", branch_name)
+        # A build whose changes could not be checked is treated as dirty, as it may not match its commit
+        _set(self, "is_dirty", is_dirty or is_dirty_unknown)
+        _set(self, "is_dirty_unknown", is_dirty_unknown)
+        # Versions of a revision other than the checked out one have no working tree that could be dirty
+        _set(self, "is_dirty_applicable", is_dirty_applicable)
+        _set(self, "commits_since_tag", commits_since_tag)
+        _set(self, "time", "")
+        _set(self, "cargo_version", "")
+        _set(self, "content_fingerprint", content_fingerprint)
 
-        self.time = ""
+        _set(self, "major", major)
+        _set(self, "minor", minor)
+        _set(self, "patch", patch)
+        _set(self, "prerelease", prerelease)
+        _set(self, "buildmetadata_from_tag", buildmetadata_from_tag)
+        _set(self, "precedence_key", precedence_key(major, minor, patch, prerelease))
         self._set_qualified_version()
-        self.is_development_build = self.is_dirty or (commits_since_tag > 0)
-        self.cargo_version = ""
+        _set(self, "is_development_build", self.is_dirty or (commits_since_tag > 0))
+
+    @property
+    def components(self) -> list[int]:
+        """The major, minor and patch numbers, as a new list on every access."""
+        return [self.major, self.minor, self.patch]
 
     def set_time(self) -> None:
-        self.time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M")
+        """
+        Stamp this version with the current UTC time in place.
+
+        Deprecated: use with_time(), which leaves this version unchanged. Stamping an instance changes its hash, so it
+        must not be stamped while used as a set member or dict key.
+        """
+        warnings.warn("set_time() is deprecated, use with_time() instead", DeprecationWarning, stacklevel=2)
+        object.__setattr__(self, "time", self.with_time().time)
 
     def set_cargo_version(self, cargo_version: str) -> None:
-        self.cargo_version = cargo_version
+        """
+        Set the cargo version of a crate in place.
+
+        Deprecated: use with_cargo_version(), which leaves this version unchanged. Setting it changes the hash of the
+        instance, so it must not be set while the instance is used as a set member or dict key.
+        """
+        warnings.warn(
+            "set_cargo_version() is deprecated, use with_cargo_version() instead", DeprecationWarning, stacklevel=2
+        )
+        object.__setattr__(self, "cargo_version", self.with_cargo_version(cargo_version).cargo_version)
+
+    def with_time(self) -> "VersionData":
+        """Return a copy of this version stamped with the current UTC time."""
+        return self._replace(time=datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M"))
+
+    def with_cargo_version(self, cargo_version: str) -> "VersionData":
+        """Return a copy of this version carrying the cargo version of a crate."""
+        if not isinstance(cargo_version, str):
+            msg = "cargo_version is not str type"
+            raise TypeError(msg)
+        return self._replace(cargo_version=cargo_version)
+
+    def with_content_fingerprint(self, content_fingerprint: str) -> "VersionData":
+        """Return a copy of this version whose build metadata identifies the content of the tree it was built from."""
+        if not isinstance(content_fingerprint, str):
+            msg = "content_fingerprint is not str type"
+            raise TypeError(msg)
+        _check_content_fingerprint(content_fingerprint)
+        copy = self._replace(content_fingerprint=content_fingerprint)
+        copy._set_qualified_version()  # noqa: SLF001 - the copy is still being constructed
+        return copy
+
+    def _replace(self, **changes: str) -> "VersionData":
+        # Only fields that do not feed values derived from the tag may be replaced, which avoids re-parsing it
+        copy = object.__new__(VersionData)
+        for field in self.__slots__:
+            object.__setattr__(copy, field, changes.get(field, getattr(self, field)))
+        return copy
 
     def _set_qualified_version(self) -> None:
-        self.base_version = f"{self.major}.{self.minor}.{self.patch}"
-        version_parts = [self.base_version]
+        base_version = f"{self.major}.{self.minor}.{self.patch}"
+        version_parts = [base_version]
         if self.prerelease:
             version_parts.append(f"-{self.prerelease}")
 
@@ -87,12 +225,81 @@ class VersionData(EqualityByValue):
         else:
             metadata_identifiers.extend(["sha", self.commit_id])
 
-        if self.is_dirty:
+        if self.content_fingerprint:
+            # The start of the fingerprint tells trees apart as reliably as an abbreviated commit id
+            metadata_identifiers.extend(["content", self.content_fingerprint[:CONTENT_FINGERPRINT_LENGTH]])
+
+        if self.is_dirty_unknown:
+            metadata_identifiers.append("dirty-unknown")
+        elif self.is_dirty:
             metadata_identifiers.append("dirty")
 
-        self.full_build_metadata = ".".join(metadata_identifiers)
+        full_build_metadata = ".".join(metadata_identifiers)
+
+        if full_build_metadata:
+            version_parts.append(f"+{full_build_metadata}")
+
+        object.__setattr__(self, "base_version", base_version)
+        object.__setattr__(self, "full_build_metadata", full_build_metadata)
+        object.__setattr__(self, "qualified_version", "".join(version_parts))
+
+    def _identity(self) -> tuple:
+        # Every other field is derived from these, so they fully determine equality
+        return (
+            self.tag,
+            self.commit_id,
+            self.branch_name,
+            self.is_dirty,
+            self.is_dirty_unknown,
+            self.is_dirty_applicable,
+            self.content_fingerprint,
+            self.commits_since_tag,
+            self.time,
+            self.cargo_version,
+        )
+
+    def __setattr__(self, name: str, value: object) -> None:
+        msg = f"cannot assign to field '{name:s}' of immutable VersionData"
+        raise AttributeError(msg)
+
+    def __delattr__(self, name: str) -> None:
+        msg = f"cannot delete field '{name:s}' of immutable VersionData"
+        raise AttributeError(msg)
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __setstate__(self, state: tuple) -> None:
+        for field, value in zip(self.__slots__, state, strict=True):
+            object.__setattr__(self, field, value)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, VersionData):
+            return self._identity() == other._identity()
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._identity())
+
+    def __lt__(self, other: object) -> bool:
+        if isinstance(other, VersionData):
+            return self.precedence_key < other.precedence_key
+        return NotImplemented
+
+    def __le__(self, other: object) -> bool:
+        if isinstance(other, VersionData):
+            return self.precedence_key <= other.precedence_key
+        return NotImplemented
+
+    def __gt__(self, other: object) -> bool:
+        if isinstance(other, VersionData):
+            return self.precedence_key > other.precedence_key
+        return NotImplemented
 
-        if self.full_build_metadata:
-            version_parts.append(f"+{self.full_build_metadata}")
+    def __ge__(self, other: object) -> bool:
+        if isinstance(other, VersionData):
+            return self.precedence_key >= other.precedence_key
+        return NotImplemented
 
-        self.qualified_version = "".join(version_parts)
+    def __repr__(self) -> str:
+        return f"VersionData({self.qualified_version!r}, branch_name={self.branch_name!r})"
@@ -0,0 +1,146 @@
+import ctypes
+import errno
+import os
+import select
+import struct
+from collections.abc import Iterator
+from pathlib import Path
+
+# Flags from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = os.O_CLOEXEC
+
+# Git replaces files by renaming a lock file over them, so entries are watched through their directory
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class RefWatcher:
+    """
+    Wait for changes to what a version is derived from: HEAD, refs, packed-refs and the index of a repository.
+
+    Changes are observed with inotify, so waiting costs no CPU time. Writes of git lock files are ignored, as git
+    renames them over the final file once it is complete. Only available on Linux.
+    """
+
+    def __init__(
+        self, git_dir: str | Path, common_dir: str | Path, *, extra_files: tuple[str | Path, ...] = ()
+    ) -> None:
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this platform")
+        self._libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._fd = self._libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self._stop_read, self._stop_write = os.pipe()
+        self._stopped = False
+        # Watch descriptor -> (directory, names of interest or None for every entry, whether subdirectories are watched)
+        self._watches = {}
+
+        git_dir = Path(git_dir)
+        common_dir = Path(common_dir)
+        self._add_watch(git_dir, names={"HEAD", "index"})
+        self._add_watch(common_dir, names={"packed-refs"})
+        self._add_tree_watch(common_dir / "refs")
+        for extra_file in extra_files:
+            extra_path = Path(extra_file).absolute()
+            self._add_watch(extra_path.parent, names={extra_path.name})
+
+    def __enter__(self) -> "RefWatcher":  # noqa: PYI034 - typing.Self requires Python 3.11
+        return self
+
+    def __exit__(self, *_exc_info: object) -> None:
+        self.close()
+
+    def changes(self, debounce: float = 0.2) -> Iterator[None]:
+        """
+        Yield once for every burst of changes, after no further change was seen for debounce seconds.
+
+        A single git operation such as a commit touches several files; debouncing reports it once. The iterator ends
+        when stop() is called.
+        """
+        while self._wait(timeout=None):
+            while self._wait(timeout=debounce):
+                pass
+            if self._stopped:
+                return
+            yield
+
+    def stop(self) -> None:
+        """End the iteration of changes(), also when called from another thread or a signal handler."""
+        self._stopped = True
+        os.write(self._stop_write, b"\0")
+
+    def close(self) -> None:
+        if self._fd < 0:
+            return
+        for fd in (self._fd, self._stop_read, self._stop_write):
+            os.close(fd)
+        self._fd = -1
+
+    def _wait(self, timeout: float | None) -> bool:
+        """Block until a relevant change is seen and return True, or return False on timeout or stop."""
+        while not self._stopped:
+            readable, _, _ = select.select([self._fd, self._stop_read], [], [], timeout)
+            if not readable or self._stopped:
+                return False
+            if self._read_events():
+                return True
+        return False
+
+    def _read_events(self) -> bool:
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        relevant = False
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, name_length = _EVENT_HEADER.unpack_from(buffer, offset)
+            offset += _EVENT_HEADER.size
+            name = buffer[offset : offset + name_length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += name_length
+            if mask & _IN_Q_OVERFLOW:
+                # Events were lost, so a change cannot be ruled out
+                relevant = True
+                continue
+            if wd not in self._watches:
+                continue
+            directory, names, recursive = self._watches[wd]
+            if recursive and mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                # Refs may be created below a new directory, e.g. the first "feature/..." branch
+                self._add_tree_watch(directory / name)
+                relevant = True
+            elif not name.endswith(".lock") and (names is None or name in names):
+                relevant = True
+        return relevant
+
+    def _add_tree_watch(self, directory: Path) -> None:
+        for subdirectory, _, _ in os.walk(directory):
+            self._add_watch(Path(subdirectory), names=None, recursive=True)
+
+    def _add_watch(self, directory: Path, *, names: set[str] | None, recursive: bool = False) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), _WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code == errno.ENOENT:
+                # A directory removed before it could be watched cannot hold refs
+                return
+            raise OSError(code, os.strerror(code), str(directory))
+        if wd in self._watches:
+            # The directory is already watched, e.g. the git directory is also the common directory
+            _, known_names, _ = self._watches[wd]
+            names = None if names is None or known_names is None else names | known_names
+        self._watches[wd] = (directory, names, recursive)
@@ -0,0 +1,7 @@
+#include "plxsversion/version.h"
+#include <stdio.h>
+
+int main() {
+    printf("Version: %s\n", plxsversion_version());
+    return 0;
+}
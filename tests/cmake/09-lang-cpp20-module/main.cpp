@@ -0,0 +1,8 @@
+#include <iostream>
+
+import plxsversion;
+
+int main() {
+    std::cout << "Version: " << plxsversion::VERSION << std::endl;
+    return 0;
+}